@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+
+from style_codec.batch import findInputFiles, convertFiles
+import argparse
+
+parser = argparse.ArgumentParser(description='Batch STY/PAD <-> YML Converter')
+parser.add_argument('inputs', type=str, nargs='+', help='input files, directories or glob patterns')
+parser.add_argument('-o', '--output', type=str, required=True, help='output directory')
+parser.add_argument('-j', '--jobs', type=int, default=None, help='number of worker processes (default: number of CPUs)')
+parser.add_argument('-v', '--verbose', action='store_true', help='prints each converted file')
+
+args = parser.parse_args()
+
+if __name__ == '__main__':
+    files = findInputFiles(args.inputs)
+
+    try:
+        converted, failures, totalSize, duration = convertFiles(files, args.output, workers=args.jobs, verbose=args.verbose)
+    except ValueError as e:
+        print('Error: {}'.format(e))
+        exit(1)
+
+    print('Converted {} of {} files in {:.2f} s ({:.1f} files/s, {:.2f} MB/s)'.format(
+        converted, len(files), duration, converted / duration if duration else 0, totalSize / 1e6 / duration if duration else 0))
+
+    if failures:
+        print('{} files failed'.format(len(failures)))
+        exit(1)
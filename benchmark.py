@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+from style_codec.benchmark import profiles, runBenchmarks, saveResults, loadResults, compareResults, measureImportTime, importTimeBudget
+import argparse
+
+parser = argparse.ArgumentParser(description='Style Codec Benchmark Suite')
+parser.add_argument('-p', '--profile', type=str, action='append', choices=list(profiles.keys()), help='synthetic style profile to run (repeatable, default: all)')
+parser.add_argument('-b', '--benchmark', type=str, action='append', help='benchmark to run, e.g. parse or fromYml (repeatable, default: all)')
+parser.add_argument('-n', '--repeat', type=int, default=5, help='number of repetitions, the best one is reported')
+parser.add_argument('-o', '--output', type=str, help='saves the results as JSON')
+parser.add_argument('-c', '--compare', type=str, nargs=2, metavar=('BASE', 'NEW'), help='compares two result files instead of running the benchmarks')
+parser.add_argument('-t', '--threshold', type=float, default=10.0, help='slowdown in percent reported as regression (default: 10)')
+parser.add_argument('-i', '--import-time', action='store_true', help='measures the import time of style_codec instead of running the benchmarks')
+parser.add_argument('--import-budget', type=float, default=importTimeBudget * 1000, help='import time in ms reported as regression (default: {:.0f})'.format(importTimeBudget * 1000))
+
+args = parser.parse_args()
+
+if __name__ == '__main__':
+    if args.compare:
+        comparison = compareResults(loadResults(args.compare[0]), loadResults(args.compare[1]), args.threshold)
+
+        for name, baseSeconds, newSeconds, change, regression in comparison:
+            print('{:<28} {:10.2f} ms {:10.2f} ms {:+8.1f} %{}'.format(name, baseSeconds * 1000, newSeconds * 1000, change, '  REGRESSION' if regression else ''))
+
+        regressions = [entry for entry in comparison if entry[4]]
+        if regressions:
+            print('{} of {} benchmarks regressed by more than {} %'.format(len(regressions), len(comparison), args.threshold))
+            exit(1)
+
+    elif args.import_time:
+        seconds, imports = measureImportTime(repeat=args.repeat)
+
+        for name, selfSeconds, cumulative in imports[:15]:
+            print('{:<40} {:10.2f} ms {:10.2f} ms self'.format(name, cumulative * 1000, selfSeconds * 1000))
+
+        print('import style_codec: {:.2f} ms (budget {:.2f} ms)'.format(seconds * 1000, args.import_budget))
+        if seconds * 1000 > args.import_budget:
+            print('Import time exceeds the budget')
+            exit(1)
+
+    else:
+        results = runBenchmarks(args.profile, args.benchmark, args.repeat)
+        if args.output:
+            saveResults(results, args.output)
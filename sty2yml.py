@@ -6,8 +6,17 @@ import argparse
 parser = argparse.ArgumentParser(description='STY -> YML Converter')
 parser.add_argument('input', type=str, help='input style')
 parser.add_argument('output', type=str, help='output yaml')
+parser.add_argument('--split', action='store_true', help='writes a directory with a YAML file per track section channel, only rewriting changed files')
+parser.add_argument('--cache', action='store_true', help='keeps parsed styles in the parse cache (~/.cache/style_codec), so converting them again skips parsing')
+parser.add_argument('--profile', type=str, default=None, help='records stage timings and counters to the file')
+parser.add_argument('--profile-format', type=str, choices=profileFormats, default='json', help='format of the profile: json or cprofile (pstats dump)')
 
 args = parser.parse_args()
+parseCache.enabled = args.cache
 
-style = RawStyle.fromSty(args.input)
-style.saveAsYml(args.output)
+with profileTo(args.profile, args.profile_format):
+    style = RawStyle.fromSty(args.input)
+    if args.split:
+        style.saveAsYmlDir(args.output)
+    else:
+        style.saveAsYml(args.output)
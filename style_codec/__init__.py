@@ -1,15 +1,43 @@
 import time
-import rtmidi
+import importlib
 from construct import Container
 import json
+import os
 import re
 import math
 
-from .codecs import styleCodec, multiPadCodec, midiEventCodec, beatResolution as beats, TrackSplitAdapter, sectionMarkers, csegEntriesCodec
-from .yamlex import yaml
+from .codecs import styleCodec, multiPadCodec, beatResolution as beats, TrackSplitAdapter, sectionMarkers, csegEntriesCodec, casmSectionCodec, otsSectionCodec
+from .columns import EventColumns, CompactChannels, peekEvents, NOTE_ON, NOTE_OFF
+from .transpose import transpositions, transpositionNotes, Transposition, getTransposition
+from .lazy import LazyTrackSections, scanStyle
+from .mapped import mapFile, parseStyle, parsePad
+from .midi import encodeMessage
+from .stream import iterEvents, iterSectionEvents, TrackWriter, writeTrack
+from .cache import ParseCache, parseCache
+from .binary import dumpBinary, loadBinary, BinaryFormatError
+from .splityaml import loadSplitYaml, saveSplitYaml, SplitYamlError
+from .incremental import ChunkCache
+from .profiling import Profiler, profiler, profileTo, profileFormats
 
 from pprint import pprint
 
+
+# Loaded on first access, converting files does not need the playback machinery (rtmidi, asyncio, threading) and
+# reading or writing style files does not need YAML
+_lazyAttributes = {
+    'TranspositionCache': 'playback', 'PlaybackBuffer': 'playback', 'Scheduler': 'playback',
+    'RecordingMidiOut': 'playback', 'LoopStats': 'playback',
+    'PlaybackEngine': 'engine',
+    'yaml': 'yamlex', 'loadYaml': 'yamlex', 'dumpYaml': 'yamlex',
+    'midiEventCodec': 'codecs'
+}
+
+
+def __getattr__(name):
+    if name in _lazyAttributes:
+        return getattr(importlib.import_module('.' + _lazyAttributes[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 getChannelId = TrackSplitAdapter.getChannelId
 
 allTrackSections = ['Prologue', 'SInt', 'Main A', 'Main B', 'Main C', 'Main D', 'Fill In AA', 'Fill In BB',
@@ -24,38 +52,6 @@ allTrackSectionsWithNotes = ['Main A', 'Main B', 'Main C', 'Main D', 'Fill In AA
 allChannels = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15]
 
 
-transpositions = {
-    'chord': {
-        ('Maj7', 'Maj7'): [0, None, None, None, 0, None, None, 0, None, None, None, 0],
-        ('Maj7', 'Maj'): [0, None, None, None, 0, None, None, 0, None, None, None, None],
-        ('min7(11)', 'Maj7'): [0, None, None, +1, None, +2, None, 0, None, None, +1, None],
-        ('min7(11)', 'Maj'): [0, None, None, +1, None, +2, None, 0, None, None, None, None],
-        ('Maj7', 'min'): [0, None, None, None, -1, None, None, 0, None, None, None, None],
-    },
-    'melody': {
-        ('Maj7', 'Maj7'): [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        ('Maj7', 'Maj'): [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        ('Maj', 'Maj7'): [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        ('Maj7', 'min'): [0, 0, 0, 0, -1, 0, 0, 0, 0, 0, 0, 0],
-    }
-}
-
-transpositionNotes = {
-    'a': 0,
-    'a#': 1,
-    'b': 2,
-    'c': 3,
-    'c#': 4,
-    'd': 5,
-    'd#': 6,
-    'e': 7,
-    'f': 8,
-    'f#': 9,
-    'g': 10,
-    'g#': 11
-}
-
-
 def clone(obj):
     if isinstance(obj, dict):
         newDict = Container()
@@ -69,6 +65,13 @@ def clone(obj):
         return obj
 
 
+def cloneEvents(events):
+    if isinstance(events, EventColumns):
+        return events.toEvents()
+    else:
+        return clone(events)
+
+
 def getEmptyMultipad(cm='1111', rp='1111'):
     return {
         'section': 'midi',
@@ -274,6 +277,72 @@ def getOTSEvents(right1=None, right2=None, right3=None, left=None):
     return events
 
 
+@profiler.timed('read')
+def _readFile(fn, mapped):
+    if mapped:
+        data = mapFile(fn)
+    else:
+        with open(fn, 'rb') as f:
+            data = f.read()
+    profiler.count('bytes-read', len(data))
+    return data
+
+
+@profiler.timed('read')
+def _readTextFile(fn):
+    with open(fn, 'r') as f:
+        text = f.read()
+    profiler.count('bytes-read', os.path.getsize(fn))
+    return text
+
+
+@profiler.timed('write')
+def _writeFile(fn, data):
+    with open(fn, 'w' if isinstance(data, str) else 'wb') as f:
+        f.write(data)
+    profiler.count('bytes-written', os.path.getsize(fn))
+
+
+@profiler.timed('build')
+def _build(codec, data):
+    return codec.build(data)
+
+
+def _loadYamlFile(fn):
+    from .yamlex import loadYaml
+    return loadYaml(_readTextFile(fn))
+
+
+def _dumpYaml(data):
+    from .yamlex import dumpYaml
+    return dumpYaml(data)
+
+
+def _loadJsonFile(fn):
+    return json.loads(_readTextFile(fn))
+
+
+def _loadBinaryFile(fn):
+    return loadBinary(_readFile(fn, False))
+
+
+def _parseStyleFile(fn, mapped, cached):
+    return _parseStyleData(_readFile(fn, mapped), mapped, cached)
+
+
+def _parseStyleData(data, mapped, cached):
+    parse = parseStyle if mapped else styleCodec.parse
+    with profiler.stage('parse'):
+        return parseCache.parse(data, 'style', parse) if cached else parse(data)
+
+
+def _parsePadFile(fn, mapped, cached):
+    data = _readFile(fn, mapped)
+    parse = parsePad if mapped else multiPadCodec.parse
+    with profiler.stage('parse'):
+        return parseCache.parse(data, 'pad', parse) if cached else parse(data)
+
+
 class RawMultiPad(object):
     def __init__(self, data = None, cm='1111', rp='1111'):
         if data is None:
@@ -282,30 +351,37 @@ class RawMultiPad(object):
             self._data = data
 
     @classmethod
-    def fromPad(cls, fn):
-        with open(fn, 'rb') as f:
-            data = f.read()
-        return MultiPad(data = multiPadCodec.parse(data))
+    def fromPad(cls, fn, mapped=False, cached=True):
+        return RawMultiPad(data = _parsePadFile(fn, mapped, cached))
 
 
     @classmethod
     def fromYml(cls, fn):
-        with open(fn, 'r') as f:
-            data = yaml.safe_load(f)
-        return MultiPad(data = data)
+        data = _loadYamlFile(fn)
+        return RawMultiPad(data = data)
+
+
+    @classmethod
+    def fromJson(cls, fn):
+        return RawMultiPad(data = _loadJsonFile(fn))
+
+
+    @classmethod
+    def fromBin(cls, fn):
+        return RawMultiPad(data = _loadBinaryFile(fn))
 
 
     def saveAsPad(self, fn):
-        with open(fn, 'wb') as f:
-            f.write(multiPadCodec.build(self._data))
+        _writeFile(fn, _build(multiPadCodec, self._data))
 
     def saveAsYml(self, fn):
-        with open(fn, 'w') as f:
-            f.write(yaml.safe_dump(self._data, width=65536))
+        _writeFile(fn, _dumpYaml(self._data))
 
     def saveAsJson(self, fn):
-        with open(fn, 'w') as f:
-            f.write(json.dumps(self._data, indent=2))
+        _writeFile(fn, json.dumps(self._data, indent=2))
+
+    def saveAsBin(self, fn):
+        _writeFile(fn, dumpBinary(self._data))
 
 
 class MultiPad(object):
@@ -410,33 +486,41 @@ class MultiPad(object):
 
 
     @classmethod
-    def fromPad(cls, fn):
-        with open(fn, 'rb') as f:
-            data = f.read()
-        return MultiPad(data = multiPadCodec.parse(data))
+    def fromPad(cls, fn, mapped=False, cached=True):
+        return MultiPad(data = _parsePadFile(fn, mapped, cached))
 
 
     @classmethod
     def fromYml(cls, fn):
-        with open(fn, 'r') as f:
-            data = yaml.safe_load(f)
+        data = _loadYamlFile(fn)
         return MultiPad(data = data)
 
 
+    @classmethod
+    def fromJson(cls, fn):
+        return MultiPad(data = _loadJsonFile(fn))
+
+
+    @classmethod
+    def fromBin(cls, fn):
+        return MultiPad(data = _loadBinaryFile(fn))
+
+
     def saveAsPad(self, fn):
         self._implodeAll()
-        with open(fn, 'wb') as f:
-            f.write(multiPadCodec.build(self._data))
+        _writeFile(fn, _build(multiPadCodec, self._data))
 
     def saveAsYml(self, fn):
         self._implodeAll()
-        with open(fn, 'w') as f:
-            f.write(yaml.safe_dump(self._data, width=65536))
+        _writeFile(fn, _dumpYaml(self._data))
 
     def saveAsJson(self, fn):
         self._implodeAll()
-        with open(fn, 'w') as f:
-            f.write(json.dumps(self._data, indent=2))
+        _writeFile(fn, json.dumps(self._data, indent=2))
+
+    def saveAsBin(self, fn):
+        self._implodeAll()
+        _writeFile(fn, dumpBinary(self._data))
 
 
 
@@ -448,40 +532,62 @@ class RawStyle(object):
             self._style = style
 
     @classmethod
-    def fromSty(cls, fn):
-        with open(fn, 'rb') as f:
-            data = f.read()
-        return RawStyle(style = styleCodec.parse(data))
+    def fromSty(cls, fn, mapped=False, cached=True):
+        return RawStyle(style = _parseStyleFile(fn, mapped, cached))
 
 
     @classmethod
     def fromYml(cls, fn):
-        with open(fn, 'r') as f:
-            data = yaml.safe_load(f)
+        data = _loadYamlFile(fn)
         return RawStyle(style = data)
 
 
+    @classmethod
+    def fromYmlDir(cls, directory):
+        return RawStyle(style = loadSplitYaml(directory))
+
+
+    @classmethod
+    def fromJson(cls, fn):
+        return RawStyle(style = _loadJsonFile(fn))
+
+
+    @classmethod
+    def fromBin(cls, fn):
+        return RawStyle(style = _loadBinaryFile(fn))
+
+
     def saveAsSty(self, fn):
-        with open(fn, 'wb') as f:
-            f.write(styleCodec.build(self._style))
+        _writeFile(fn, _build(styleCodec, self._style))
 
     def saveAsYml(self, fn):
-        with open(fn, 'w') as f:
-            f.write(yaml.safe_dump(self._style, width=65536))
+        _writeFile(fn, _dumpYaml(self._style))
+
+    def saveAsYmlDir(self, directory):
+        # Returns the number of written and skipped files
+        return saveSplitYaml(self._style, directory)
 
     def saveAsJson(self, fn):
-        with open(fn, 'w') as f:
-            f.write(json.dumps(self._style, indent=2))
+        _writeFile(fn, json.dumps(self._style, indent=2))
+
+    def saveAsBin(self, fn):
+        _writeFile(fn, dumpBinary(self._style))
 
 
 
 class Style(object):
-    def __init__(self, name = '', tempo=100, style = None):
+    def __init__(self, name = '', tempo=100, style = None, compact=False):
+        # With compact=True, the events of the track section channels are kept in EventColumns
+        self.compact = compact
+
         if style is None:
             self._style = getEmptyStyle(name, tempo)
         else:
             self._style = style
 
+        # Set by fromSty, saveAsSty reuses the bytes of the unchanged parts of the file
+        self._chunkCache = None
+
         self._explodeAll()
         self._upgradeCASM()
 
@@ -500,10 +606,12 @@ class Style(object):
         ]
 
 
-    def _explodeCASM(self):
+    @profiler.timed('casm-explode')
+    def _explodeCASM(self, style=None):
+        # style: the parsed sections to read, self._style by default
         channelsPerPart = {}
 
-        for sect in self._style:
+        for sect in self._style if style is None else style:
             if sect['section'] == 'casm':
                 for cseg in sect['csegs']:
                     sdec = next(entry for entry in cseg['entries'] if entry['type'] == 'sdec')
@@ -520,6 +628,7 @@ class Style(object):
         return channelsPerPart
 
 
+    @profiler.timed('casm-implode')
     def _implodeCASM(self, channelsPerPart):
         csegs = {}
 
@@ -558,17 +667,22 @@ class Style(object):
         return sect
 
 
+    @profiler.timed('track-sections-explode')
     def _explodeTrackSections(self):
         trackSections = {}
 
         for sect in self._style:
             if sect['section'] == 'midi':
                 for trackSect in sect['track-sections']:
+                    if self.compact:
+                        trackSect['channels'] = CompactChannels.fromChannels(trackSect['channels'])
+
                     trackSections[trackSect['name']] = trackSect
 
         return trackSections
 
 
+    @profiler.timed('track-sections-implode')
     def _implodeTrackSections(self, trackSections):
         sect = {
             'section': 'midi',
@@ -582,10 +696,10 @@ class Style(object):
         return sect
 
 
-    def _explodeOTS(self):
+    def _explodeOTS(self, style=None):
         ots = []
 
-        for sect in self._style:
+        for sect in self._style if style is None else style:
             if sect['section'] == 'ots':
                 ots.extend(sect['tracks'])
 
@@ -601,6 +715,7 @@ class Style(object):
         return sect
 
 
+    @profiler.timed('casm-upgrade')
     def _upgradeCASM(self, channels=allChannels, trackSections=allTrackSections):
         for name in trackSections:
             if name in self.casm:
@@ -638,6 +753,7 @@ class Style(object):
                             raise Exception('CNTT -> CTB2 upgrade is not supported.')
 
 
+    @profiler.timed('transpose')
     def _transposeEvents(self, events, nttRule, fromKey, fromChord, toKey, toChord):
         if nttRule != 'bypass':
             if nttRule not in transpositions:
@@ -651,36 +767,41 @@ class Style(object):
             transTable = transpositions[nttRule][(fromChord, toChord)]
             transBase = transpositionNotes[toKey] - transpositionNotes[fromKey]
 
-            newEvents = []
-            for event in events:
-                if event['command'] == 'on' or event['command'] == 'off':
-                    chordTrans = transTable[event['note'] % 12]
-                    if chordTrans is not None:
-                        event['note'] += transBase + chordTrans
-                        newEvents.append(event)
+            transposition = getTransposition(transTable, transBase)
 
-                else:
-                    newEvents.append(event)
+            if isinstance(events, EventColumns):
+                return transposition.transposeColumns(events)
 
-            return newEvents
+            return transposition.transposeEvents(events)
 
         else:
             return events
 
 
     def _createTrackSection(self, trackSection, length):
+        channels = {
+            'common': getTrackSectionCommon(trackSection)
+        }
+
         self.trackSections[trackSection] = {
             'name': trackSection,
             'length': length,
-            'channels': {
-                'common': getTrackSectionCommon(trackSection)
-            }
+            'channels': CompactChannels.fromChannels(channels) if self.compact else channels
         }
 
         self.casm[trackSection] = {}
 
 
     def _loopEvents(self, events, loopLength, targetLength):
+        if self.compact and not isinstance(events, EventColumns):
+            columns = EventColumns.fromEvents(events)
+            if columns is not None:
+                events = columns
+
+        if isinstance(events, EventColumns):
+            outEvents = events.loop(loopLength, targetLength)
+            return outEvents if self.compact else outEvents.toEvents()
+
         outEvents = []
         timeOffset = 0
         while True:
@@ -702,35 +823,67 @@ class Style(object):
 
 
     @classmethod
-    def fromSty(cls, fn):
-        with open(fn, 'rb') as f:
-            data = f.read()
-        return Style(style = styleCodec.parse(data))
+    def fromSty(cls, fn, compact=False, lazy=False, mapped=False, cached=True, incremental=False):
+        # A lazy style keeps the file data, when mapped the file stays mapped as long as the style is referenced.
+        # Lazy styles do not use the parse cache. An incremental style keeps the bytes of the chunks and track
+        # sections of the file and a copy of their events, saveAsSty encodes only the parts modified since.
+        if lazy:
+            return LazyStyle(_readFile(fn, mapped), compact = compact)
+
+        data = _readFile(fn, mapped)
+        style = Style(style = _parseStyleData(data, mapped, cached), compact = compact)
+        if incremental:
+            style._chunkCache = ChunkCache.fromStyle(data, style)
+        return style
 
 
     @classmethod
-    def fromYml(cls, fn):
-        with open(fn, 'r') as f:
-            data = yaml.safe_load(f)
-        return Style(style = data)
+    def fromYml(cls, fn, compact=False):
+        data = _loadYamlFile(fn)
+        return Style(style = data, compact = compact)
+
+
+    @classmethod
+    def fromYmlDir(cls, directory, compact=False):
+        return Style(style = loadSplitYaml(directory), compact = compact)
+
+
+    @classmethod
+    def fromJson(cls, fn, compact=False):
+        return Style(style = _loadJsonFile(fn), compact = compact)
+
+
+    @classmethod
+    def fromBin(cls, fn, compact=False):
+        return Style(style = _loadBinaryFile(fn), compact = compact)
 
 
     def saveAsSty(self, fn):
-        self._implodeAll()
-        with open(fn, 'wb') as f:
-            f.write(styleCodec.build(self._style))
+        data = self._chunkCache.build(self) if self._chunkCache is not None else None
+        if data is None:
+            self._implodeAll()
+            data = _build(styleCodec, self._style)
+        _writeFile(fn, data)
 
 
     def saveAsYml(self, fn):
         self._implodeAll()
-        with open(fn, 'w') as f:
-            f.write(yaml.safe_dump(self._style, width=65536))
+        _writeFile(fn, _dumpYaml(self._style))
+
+
+    def saveAsYmlDir(self, directory):
+        self._implodeAll()
+        return saveSplitYaml(self._style, directory)
 
 
     def saveAsJson(self, fn):
         self._implodeAll()
-        with open(fn, 'w') as f:
-            f.write(json.dumps(self._style, indent=2))
+        _writeFile(fn, json.dumps(self._style, indent=2))
+
+
+    def saveAsBin(self, fn):
+        self._implodeAll()
+        _writeFile(fn, dumpBinary(self._style))
 
 
     def deleteTrackSections(self, trackSections):
@@ -758,7 +911,7 @@ class Style(object):
 
         for name in trackSections:
             if name in self.trackSections:
-                self.trackSections[name]['channels'][newChannelName] = self.trackSections[name]['channels'][oldChannelName]
+                self.trackSections[name]['channels'][newChannelName] = peekEvents(self.trackSections[name]['channels'], oldChannelName)
                 del self.trackSections[name]['channels'][oldChannelName]
 
             if name in self.casm:
@@ -803,7 +956,7 @@ class Style(object):
                             print(f'Warning: The length of target track section "{toTrackSection}" is different. You have to check the resulting style and manually correct the respective midi channel.')
 
                     self.trackSections[toTrackSection]['channels'][toChannelName] = \
-                        self._loopEvents(other.trackSections[fromTrackSection]['channels'][fromChannelName], other.trackSections[fromTrackSection]['length'], targetLength)
+                        self._loopEvents(peekEvents(other.trackSections[fromTrackSection]['channels'], fromChannelName), other.trackSections[fromTrackSection]['length'], targetLength)
 
                 if fromTrackSection in other.casm and fromChannel in other.casm[fromTrackSection]:
                     if toTrackSection not in self.casm:
@@ -911,7 +1064,7 @@ class Style(object):
 
                 nttRule = ctb2Part['ntt']['rule']
 
-                self.trackSections[name]['channels'][channelId] = self._transposeEvents(self.trackSections[name]['channels'][channelId], nttRule, fromKey, fromChord, toKey, toChord)
+                self.trackSections[name]['channels'][channelId] = self._transposeEvents(peekEvents(self.trackSections[name]['channels'], channelId), nttRule, fromKey, fromChord, toKey, toChord)
 
                 self.casm[name][channel]['source-chord-type'] = toChord
                 self.casm[name][channel]['source-chord-key'] = toKey
@@ -934,8 +1087,25 @@ class Style(object):
             channelId = getChannelId(channel)
 
             if channelId in ts['channels']:
+                events = peekEvents(ts['channels'], channelId)
+
+                if isinstance(events, EventColumns):
+                    newEvents = events.derive()
+                    times, commands, channels, data1, data2 = events.times, events.commands, events.channels, events.data1, events.data2
+
+                    for idx in range(len(times)):
+                        if times[idx] < offset:
+                            newEvents.appendRow(times[idx], commands[idx], channels[idx], data1[idx], data2[idx])
+
+                        if commands[idx] == NOTE_ON and times[idx] >= fromTime and times[idx] < sourceLength:
+                            newEvents.appendRow(times[idx] + offset, NOTE_ON, -1, data1[idx], data2[idx])
+                            newEvents.appendRow(length + mutePos, NOTE_OFF, -1, data1[idx], 0)
+
+                    ts['channels'][channelId] = newEvents.sortedByTime()
+                    continue
+
                 newEvents = []
-                for event in ts['channels'][channelId]:
+                for event in events:
                     if event['time'] < offset:
                         newEvents.append(event)
 
@@ -998,94 +1168,151 @@ class Style(object):
         self.ots.append(getOTSEvents(right1=right1, right2=right2, right3=right3, left=left))
 
 
-    def play(self, channels=allChannels, trackSections=['Main A'], tempo=120, midiPort=0, key='c', chord='Maj7'):
-        channels.insert(0, None)
+    @profiler.timed('playback-events')
+    def getPlaybackEvents(self, trackSections, channels=allChannels, key='c', chord='Maj7', eot=True, transpose=True):
+        # Events of the given track sections and channels merged into a single stream with delta times
+        channels = [None] + list(channels)
 
-        def getEvents(trackSections, eot=True, transpose=True):
-            sectionTime = 0
-            events = []
+        sectionTime = 0
+        events = []
 
-            for name in trackSections:
-                section = self.trackSections[name]
+        for name in trackSections:
+            section = self.trackSections[name]
 
-                for channel in channels:
-                    channelId = getChannelId(channel)
+            for channel in channels:
+                channelId = getChannelId(channel)
 
-                    if channelId in section['channels']:
-                        inEvents = clone(section['channels'][channelId])
+                if channelId in section['channels']:
+                    inEvents = peekEvents(section['channels'], channelId)
+                    if not isinstance(inEvents, EventColumns):
+                        inEvents = clone(inEvents)
 
-                        if channel is None or not transpose:
-                            pass
-                        elif name not in self.casm or channel not in self.casm[name] or self.casm[name][channel]['type'] != 'ctb2':
-                            print(
-                                f'Warning: Skipping transposition of channel {channel} in track section "{name}" because ctb2 entry was not found in CASM')
-                        else:
-                            fromChord = self.casm[name][channel]['source-chord-type']
-                            fromKey = self.casm[name][channel]['source-chord-key']
+                    if channel is None or not transpose:
+                        pass
+                    elif name not in self.casm or channel not in self.casm[name] or self.casm[name][channel]['type'] != 'ctb2':
+                        print(
+                            f'Warning: Skipping transposition of channel {channel} in track section "{name}" because ctb2 entry was not found in CASM')
+                    else:
+                        fromChord = self.casm[name][channel]['source-chord-type']
+                        fromKey = self.casm[name][channel]['source-chord-key']
 
-                            ctb2 = self.casm[name][channel]
-                            ctb2Part = ctb2['middle']
+                        ctb2 = self.casm[name][channel]
+                        ctb2Part = ctb2['middle']
 
-                            nttRule = ctb2Part['ntt']['rule']
+                        nttRule = ctb2Part['ntt']['rule']
 
-                            inEvents = self._transposeEvents(inEvents, nttRule, fromKey, fromChord, key, chord)
+                        inEvents = self._transposeEvents(inEvents, nttRule, fromKey, fromChord, key, chord)
 
-                        for event in inEvents:
-                            if channel != None:
-                                event['channel'] = channel
+                    if isinstance(inEvents, EventColumns):
+                        inEvents = inEvents.toEvents()
 
-                            event['time'] += sectionTime
-                            events.append(event)
+                    for event in inEvents:
+                        if channel != None:
+                            event['channel'] = channel
 
-                sectionTime += section['length']
+                        event['time'] += sectionTime
+                        events.append(event)
 
-            events.sort(key=lambda event: event['time'])
+            sectionTime += section['length']
 
-            globalTime = 0
-            for event in events:
-                event['time'] -= globalTime
-                globalTime += event['time']
+        events.sort(key=lambda event: event['time'])
 
-            if eot:
-                events.append({
-                    'time': sectionTime - globalTime,
-                    'command': 'meta-eot'
-                })
+        globalTime = 0
+        for event in events:
+            event['time'] -= globalTime
+            globalTime += event['time']
 
-            return events
+        if eot:
+            events.append({
+                'time': sectionTime - globalTime,
+                'command': 'meta-eot'
+            })
 
-        def playEvents(events):
-            for event in events:
-                tm = event['time']
-                if tm > 0:
-                    time.sleep(tm * (60 / tempo / beats))
+        return events
 
-                if event['command'][0:4] != 'meta':
-                    data = midiEventCodec.build(event)
-                    midiout.send_message(data)
 
-        initEvents = getEvents(trackSections=['Prologue', 'SInt'], eot=False, transpose=False)
-        loopEvents = getEvents(trackSections=trackSections)
+    @profiler.timed('compile-playback')
+    def compilePlayback(self, trackSections, channels=allChannels, key='c', chord='Maj7', eot=True, transpose=True):
+        from .playback import PlaybackBuffer
+        return PlaybackBuffer.fromEvents(self.getPlaybackEvents(trackSections, channels, key, chord, eot, transpose))
 
-        midiout = rtmidi.MidiOut()
-        midiout.open_port(midiPort)
 
-        playEvents(initEvents)
+    def play(self, channels=allChannels, trackSections=['Main A'], tempo=120, midiPort=0, key='c', chord='Maj7', midiOut=None, loops=None):
+        # Plays the track sections in a loop until interrupted (or loops times). All events are encoded upfront and
+        # scheduled against absolute deadlines. Returns the lateness statistics of the loops.
+        initBuffer = self.compilePlayback(['Prologue', 'SInt'], channels, eot=False, transpose=False)
+        loopBuffer = self.compilePlayback(trackSections, channels, key, chord)
+
+        from .playback import Scheduler
+
+        if midiOut is None:
+            import rtmidi
+            midiOut = rtmidi.MidiOut()
+            midiOut.open_port(midiPort)
+
+        scheduler = Scheduler(midiOut, tempo)
+        scheduler.play(initBuffer)
 
         try:
-            while True:
-                playEvents(loopEvents)
+            loop = 0
+            while loops is None or loop < loops:
+                scheduler.play(loopBuffer)
+                loop += 1
         except KeyboardInterrupt:
             pass
 
         for channel in channels:
-            if channel is not None:
-                event = {
-                    'command': 'cc-all-notes-off',
-                    'channel': channel
-                }
+            midiOut.send_message(encodeMessage({
+                'command': 'cc-all-notes-off',
+                'channel': channel
+            }))
+
+        return scheduler.loopStats[1:]
+
+
+    def saveAsMidi(self, fn, channels=allChannels, trackSections=['Main A'], tempo=120, key='c', chord='Maj7', loops=1):
+        # Exports what play() would play in loops passes as a standard MIDI file
+        buffer = self.compilePlayback(['Prologue', 'SInt'], channels, eot=False, transpose=False)
+        buffer.extend(self.compilePlayback(trackSections, channels, key, chord).repeat(loops))
+        buffer.saveAsMidi(fn, tempo)
+
+
+
+class LazyStyle(Style):
+    # Style decoding the track sections, CASM and OTS of the style file data on first access
+    def __init__(self, data, compact=False):
+        self.compact = compact
+        self._data = data
+        self._chunks = scanStyle(data)
+        self._chunkCache = None
+        self._casm = None
+        self._ots = None
+
+        self.trackSections = LazyTrackSections(data, self._chunks, compact)
+
+
+    def _parseChunks(self, section, codec):
+        return [codec.parse(self._data[start:end]) for chunkSection, start, end in self._chunks if chunkSection == section]
+
+
+    @property
+    def casm(self):
+        if self._casm is None:
+            self._casm = self._explodeCASM(self._parseChunks('casm', casmSectionCodec))
+            self._upgradeCASM()
+        return self._casm
+
+    @casm.setter
+    def casm(self, casm):
+        self._casm = casm
+
 
-                data = midiEventCodec.build(event)
-                midiout.send_message(data)
+    @property
+    def ots(self):
+        if self._ots is None:
+            self._ots = self._explodeOTS(self._parseChunks('ots', otsSectionCodec))
+        return self._ots
 
-        del midiout
+    @ots.setter
+    def ots(self, ots):
+        self._ots = ots
@@ -0,0 +1,175 @@
+import os
+import glob
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import RawStyle, RawMultiPad
+
+
+styleExtensions = {'.sty', '.prs', '.bcs', '.sst'}
+padExtensions = {'.pad'}
+ymlExtensions = {'.yml', '.yaml'}
+inputExtensions = styleExtensions | padExtensions | ymlExtensions
+
+
+def _isInputFile(fn):
+    return os.path.splitext(fn)[1].lower() in inputExtensions
+
+
+def _globBase(pattern):
+    # Directory part of the pattern before the first wildcard, used as the root of the output tree
+    parts = []
+    for part in os.path.normpath(pattern).split(os.sep):
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    return os.sep.join(parts)
+
+
+def findInputFiles(inputs):
+    # Returns (path, relative path in the output tree) for all files given as files, directories or glob patterns
+    files = []
+
+    for inp in inputs:
+        if os.path.isdir(inp):
+            for root, dirs, fns in os.walk(inp):
+                dirs.sort()
+                for fn in sorted(fns):
+                    if _isInputFile(fn):
+                        path = os.path.join(root, fn)
+                        files.append((path, os.path.relpath(path, inp)))
+
+        elif glob.has_magic(inp):
+            base = _globBase(inp)
+            for path in sorted(glob.glob(inp, recursive=True)):
+                if os.path.isfile(path) and _isInputFile(path):
+                    files.append((path, os.path.relpath(path, base or '.')))
+
+        else:
+            files.append((inp, os.path.basename(inp)))
+
+    uniqueFiles = []
+    seen = set()
+    for path, relPath in files:
+        if os.path.abspath(path) not in seen:
+            seen.add(os.path.abspath(path))
+            uniqueFiles.append((path, relPath))
+
+    return uniqueFiles
+
+
+def getOutputBase(outDir, relPath):
+    # Styles and multi pads keep their extension (XXXXX.prs -> XXXXX.prs.yml), so files with the same name but of
+    # different kinds do not overwrite each other. YAML files lose theirs (XXXXX.prs.yml -> XXXXX.prs).
+    if os.path.splitext(relPath)[1].lower() in ymlExtensions:
+        relPath = os.path.splitext(relPath)[0]
+    return os.path.join(outDir, relPath)
+
+
+def _outputFileNames(outBase, ext):
+    # All file names convertFile may write for the input, YAML files are converted to styles or multi pads
+    if ext not in ymlExtensions:
+        return [outBase + '.yml']
+    return [_withExtension(outBase, styleExtensions, '.sty'), _withExtension(outBase, padExtensions, '.pad')]
+
+
+def _withExtension(outBase, extensions, default):
+    return outBase if os.path.splitext(outBase)[1].lower() in extensions else outBase + default
+
+
+def findOutputCollisions(files, outDir):
+    # Returns the lists of inputs of the (path, relative path) pairs that would be converted to the same file
+    inputsByOutput = {}
+    for path, relPath in files:
+        ext = os.path.splitext(path)[1].lower()
+        for outFn in _outputFileNames(getOutputBase(outDir, relPath), ext):
+            inputsByOutput.setdefault(os.path.normcase(outFn), []).append(path)
+
+    collisions = []
+    for paths in inputsByOutput.values():
+        if len(paths) > 1 and paths not in collisions:
+            collisions.append(paths)
+    return collisions
+
+
+def convertFile(inFn, outBase):
+    # Converts a single file and returns (output file name, input size). The output file name is derived from outBase
+    # and the kind of the input: .sty/.prs/.pad -> outBase.yml and .yml -> outBase.sty or outBase.pad, unless outBase
+    # already ends with a style or multi pad extension (see getOutputBase).
+    ext = os.path.splitext(inFn)[1].lower()
+    size = os.path.getsize(inFn)
+
+    outDir = os.path.dirname(outBase)
+    if outDir:
+        os.makedirs(outDir, exist_ok=True)
+
+    if ext in styleExtensions:
+        outFn = outBase + '.yml'
+        style = RawStyle.fromSty(inFn, mapped=True, cached=False)
+        if not style._style:
+            raise Exception('No style sections found')
+        style.saveAsYml(outFn)
+
+    elif ext in padExtensions:
+        outFn = outBase + '.yml'
+        RawMultiPad.fromPad(inFn, mapped=True, cached=False).saveAsYml(outFn)
+
+    elif ext in ymlExtensions:
+        from .yamlex import loadYaml
+        with open(inFn, 'r') as f:
+            data = loadYaml(f)
+
+        # Multi pads are stored as a single dict, styles as a list of sections
+        if isinstance(data, dict):
+            outFn = _withExtension(outBase, padExtensions, '.pad')
+            RawMultiPad(data = data).saveAsPad(outFn)
+        else:
+            outFn = _withExtension(outBase, styleExtensions, '.sty')
+            RawStyle(style = data).saveAsSty(outFn)
+
+    else:
+        raise Exception(f'Unsupported file type "{ext}"')
+
+    return outFn, size
+
+
+def _convertJob(inFn, outBase):
+    try:
+        outFn, size = convertFile(inFn, outBase)
+        return inFn, outFn, size, None
+    except Exception as e:
+        return inFn, None, 0, f'{type(e).__name__}: {e}'
+
+
+def convertFiles(files, outDir, workers=None, verbose=False):
+    # Converts the (path, relative path) pairs returned by findInputFiles in a process pool. Failures are reported
+    # and collected without aborting the batch. Returns (number of converted files, failures, input bytes, seconds).
+    # Raises ValueError before converting anything if two inputs would be converted to the same file.
+    collisions = findOutputCollisions(files, outDir)
+    if collisions:
+        raise ValueError('Several inputs would be converted to the same file: ' + '; '.join(', '.join(paths) for paths in collisions))
+
+    converted = 0
+    failures = []
+    totalSize = 0
+    startTime = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_convertJob, path, getOutputBase(outDir, relPath))
+            for path, relPath in files
+        ]
+
+        for future in as_completed(futures):
+            inFn, outFn, size, error = future.result()
+
+            if error is None:
+                converted += 1
+                totalSize += size
+                if verbose:
+                    print(f'{inFn} -> {outFn}')
+            else:
+                failures.append((inFn, error))
+                print(f'Error: Converting "{inFn}" failed: {error}')
+
+    return converted, failures, totalSize, time.perf_counter() - startTime
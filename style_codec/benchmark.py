@@ -0,0 +1,288 @@
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from . import Style, RawStyle, clone, cloneEvents, allTrackSectionsWithNotes, getChannelId
+from .codecs import styleCodec, beatResolution
+from .columns import EventColumns, peekEvents
+from .incremental import ChunkCache
+from .transpose import transpositions, transpositionNotes, transposeEventsReference, getTransposition
+
+
+# Benchmark suite of the parse, build, YAML, binary, incremental save, explode/implode, transposition and playback
+# preparation paths, run on synthetic styles. Every benchmark reports the best of the repetitions, the events processed
+# per second and the peak memory allocated by one run (measured separately, tracemalloc slows down the code). Results
+# are saved as JSON and two result files can be compared to flag regressions.
+
+# Synthetic style profiles: notes per beat and channel, beats per track section, number of track sections with
+# notes, size of a sysex event in every track section and number of OTS settings
+profiles = {
+    'small': {'density': 2, 'noOfBeats': 8, 'sections': 2, 'sysexSize': 16, 'ots': 1},
+    'medium': {'density': 4, 'noOfBeats': 16, 'sections': 4, 'sysexSize': 16, 'ots': 4},
+    'dense': {'density': 16, 'noOfBeats': 16, 'sections': 4, 'sysexSize': 16, 'ots': 4},
+    'sections': {'density': 4, 'noOfBeats': 16, 'sections': len(allTrackSectionsWithNotes), 'sysexSize': 16, 'ots': 4},
+    'sysex': {'density': 2, 'noOfBeats': 16, 'sections': 4, 'sysexSize': 4096, 'ots': 4},
+    'ots': {'density': 2, 'noOfBeats': 8, 'sections': 2, 'sysexSize': 16, 'ots': 64}
+}
+
+
+def getSyntheticStyle(density=4, noOfBeats=16, sections=4, sysexSize=16, ots=4, seed=0):
+    # All 16 channels playing density notes per beat with a controller change after every note
+    random.seed(seed)
+    style = Style(name='Benchmark', tempo=120)
+    trackSections = allTrackSectionsWithNotes[:sections]
+
+    for name in trackSections:
+        style.createTrackSection(name, noOfBeats)
+        style.trackSections[name]['channels'][getChannelId()].append(
+            {'time': 0, 'command': 'sysex', 'data': [0x43] + [random.randint(0, 127) for _ in range(sysexSize - 1)]})
+
+    for channel in range(16):
+        style.setupChannel(channel, f'Channel {channel}', bankMsb=0, bankLsb=0, program=channel, ntt='chord' if channel % 2 else 'melody')
+
+        events = []
+        step = beatResolution // density
+        for time in range(0, noOfBeats * beatResolution, step):
+            note = random.randint(36, 95)
+            events.append({'time': time, 'command': 'on', 'note': note, 'velocity': random.randint(1, 127)})
+            events.append({'time': time + step // 2, 'command': 'cc-volume', 'value': random.randint(0, 127)})
+            events.append({'time': time + step - 1, 'command': 'off', 'note': note, 'velocity': 0})
+
+        style.setEvents(channel, noOfBeats, events, trackSections=trackSections)
+
+    for idx in range(ots):
+        voice = {'enabled': True, 'program': idx % 128}
+        style.addOTS(right1=voice, right2=voice, right3=voice, left=voice)
+
+    style._implodeAll()
+    return style
+
+
+def countEvents(structure):
+    count = 0
+    for section in structure:
+        if section['section'] == 'midi':
+            for trackSection in section['track-sections']:
+                count += sum(len(events) for events in trackSection['channels'].values())
+        elif section['section'] == 'ots':
+            count += sum(len(track) for track in section['tracks'])
+    return count
+
+
+class BenchmarkCase(object):
+    # setup() returns the input of run(), its cost is not measured
+    def __init__(self, name, setup, run, events):
+        self.name = name
+        self.setup = setup
+        self.run = run
+        self.events = events
+
+
+def getCases(style, tmpDir, key='e', chord='min'):
+    structure = style._style
+    data = styleCodec.build(structure)
+    events = countEvents(structure)
+    ymlFn = os.path.join(tmpDir, 'benchmark.yml')
+    RawStyle(style=structure).saveAsYml(ymlFn)
+    binFn = os.path.join(tmpDir, 'benchmark.bin')
+    RawStyle(style=structure).saveAsBin(binFn)
+    styFn = os.path.join(tmpDir, 'benchmark.sty')
+    style = Style(style=clone(structure))
+
+    trackSections = [name for name in style.trackSections if name in allTrackSectionsWithNotes]
+    transposeInputs = [(name, channel) for name in trackSections for channel in range(16) if channel in style.casm[name]]
+    noteEvents = sum(len(peekEvents(style.trackSections[name]['channels'], getChannelId(channel))) for name, channel in transposeInputs)
+
+    def getTransposeEvents():
+        return [(cloneEvents(peekEvents(style.trackSections[name]['channels'], getChannelId(channel))), style.casm[name][channel])
+                for name, channel in transposeInputs]
+
+    def transpose(inputs):
+        for events, ctb2 in inputs:
+            style._transposeEvents(events, ctb2['middle']['ntt']['rule'], ctb2['source-chord-key'], ctb2['source-chord-type'], key, chord)
+
+    # The event by event reference and the batched transposition of lists and of EventColumns, on the channels with
+    # a transposition table
+    transposeTables = []
+    for name, channel in transposeInputs:
+        ctb2 = style.casm[name][channel]
+        table = transpositions.get(ctb2['middle']['ntt']['rule'], {}).get((ctb2['source-chord-type'], chord))
+        if table is not None:
+            events = peekEvents(style.trackSections[name]['channels'], getChannelId(channel))
+            transBase = transpositionNotes[key] - transpositionNotes[ctb2['source-chord-key']]
+            transposeTables.append((events, EventColumns.fromEvents(events), table, transBase))
+    tableEvents = sum(len(events) for events, _, _, _ in transposeTables)
+
+    def getTableEvents():
+        return [(cloneEvents(events), table, transBase) for events, _, table, transBase in transposeTables]
+
+    def transposeReference(inputs):
+        for events, table, transBase in inputs:
+            transposeEventsReference(events, table, transBase)
+
+    def transposeBatched(inputs):
+        for events, table, transBase in inputs:
+            getTransposition(table, transBase).transposeEvents(events)
+
+    def transposeColumns(inputs):
+        for columns, table, transBase in inputs:
+            getTransposition(table, transBase).transposeColumns(columns)
+
+    return [
+        BenchmarkCase('parse', lambda: data, styleCodec.parse, events),
+        BenchmarkCase('build', lambda: structure, styleCodec.build, events),
+        BenchmarkCase('saveAsYml', lambda: RawStyle(style=structure), lambda raw: raw.saveAsYml(ymlFn), events),
+        BenchmarkCase('fromYml', lambda: ymlFn, RawStyle.fromYml, events),
+        BenchmarkCase('saveAsBin', lambda: RawStyle(style=structure), lambda raw: raw.saveAsBin(binFn), events),
+        BenchmarkCase('fromBin', lambda: binFn, RawStyle.fromBin, events),
+        BenchmarkCase('saveAsSty', lambda: Style(style=clone(structure)), lambda target: target.saveAsSty(styFn), events),
+        BenchmarkCase('saveAsStyIncremental', lambda: _incrementalStyle(data, structure), lambda target: target.saveAsSty(styFn), events),
+        BenchmarkCase('explodeAll', lambda: _explodableStyle(structure), lambda target: target._explodeAll(), events),
+        BenchmarkCase('implodeAll', lambda: Style(style=clone(structure)), lambda target: target._implodeAll(), events),
+        BenchmarkCase('transposeEvents', getTransposeEvents, transpose, noteEvents),
+        BenchmarkCase('transposeReference', getTableEvents, transposeReference, tableEvents),
+        BenchmarkCase('transposeBatched', getTableEvents, transposeBatched, tableEvents),
+        BenchmarkCase('transposeColumns', lambda: [(columns, table, transBase) for _, columns, table, transBase in transposeTables], transposeColumns, tableEvents),
+        BenchmarkCase('playbackEvents', lambda: None, lambda _: style.getPlaybackEvents(trackSections, key=key, chord=chord), noteEvents)
+    ]
+
+
+def _explodableStyle(structure):
+    # A style whose _explodeAll has not run yet
+    target = Style.__new__(Style)
+    target.compact = False
+    target._style = clone(structure)
+    return target
+
+
+def _incrementalStyle(data, structure):
+    # A style as loaded by Style.fromSty, with one track section modified since
+    target = Style(style=clone(structure))
+    target._chunkCache = ChunkCache.fromStyle(data, target)
+    # Without its snapshot the track section is encoded anew, like a modified one
+    name = next(name for name in target.trackSections if name in allTrackSectionsWithNotes)
+    del target._chunkCache.trackSections[name]
+    return target
+
+
+def measure(case, repeat=5):
+    durations = []
+    for _ in range(repeat):
+        inputs = case.setup()
+        gc.collect()
+        start = time.perf_counter()
+        case.run(inputs)
+        durations.append(time.perf_counter() - start)
+
+    inputs = case.setup()
+    gc.collect()
+    tracemalloc.start()
+    case.run(inputs)
+    peakMemory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    seconds = min(durations)
+    return {
+        'seconds': seconds,
+        'events': case.events,
+        'eventsPerSecond': case.events / seconds if seconds else 0.0,
+        'peakMemory': peakMemory
+    }
+
+
+def runBenchmarks(profileNames=None, caseNames=None, repeat=5, verbose=True):
+    # Returns the results keyed by "profile/case"
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmpDir:
+        for profileName in (profileNames or profiles.keys()):
+            style = getSyntheticStyle(**profiles[profileName])
+
+            for case in getCases(style, tmpDir):
+                if caseNames and case.name not in caseNames:
+                    continue
+
+                result = measure(case, repeat)
+                results[f'{profileName}/{case.name}'] = result
+                if verbose:
+                    print(formatResult(f'{profileName}/{case.name}', result))
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'results': results
+    }
+
+
+def formatResult(name, result):
+    return '{:<28} {:10.2f} ms {:10.3f} Mevents/s {:10.1f} KB peak'.format(
+        name, result['seconds'] * 1000, result['eventsPerSecond'] / 1e6, result['peakMemory'] / 1024)
+
+
+def saveResults(results, fn):
+    with open(fn, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+def loadResults(fn):
+    with open(fn, 'r') as f:
+        return json.load(f)
+
+
+def compareResults(base, new, threshold=10.0):
+    # Returns (name, base seconds, new seconds, change in percent, regression) for the benchmarks in both runs. A
+    # benchmark regresses when it got slower by more than threshold percent.
+    comparison = []
+
+    for name, newResult in new['results'].items():
+        if name not in base['results']:
+            continue
+
+        baseSeconds = base['results'][name]['seconds']
+        newSeconds = newResult['seconds']
+        change = (newSeconds - baseSeconds) / baseSeconds * 100 if baseSeconds else 0.0
+        comparison.append((name, baseSeconds, newSeconds, change, change > threshold))
+
+    return comparison
+
+
+# Budget in seconds of "import style_codec", keeps the playback machinery, YAML and the reference codecs out of the
+# startup of the conversion tools
+importTimeBudget = 0.075
+
+
+def parseImportTime(output):
+    # (name, self seconds, cumulative seconds) of every module in the output of python -X importtime
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+
+        selfTime, cumulative, name = line[len('import time:'):].split('|')
+        imports.append((name.strip(), int(selfTime) / 1e6, int(cumulative) / 1e6))
+    return imports
+
+
+def measureImportTime(module='style_codec', repeat=5):
+    # Imports the module in a fresh interpreter repeat times, returns the best cumulative import time in seconds and
+    # the modules imported by that run, slowest first
+    cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    best = None
+
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=cwd, capture_output=True, text=True, check=True)
+        imports = parseImportTime(result.stderr)
+        seconds = next(cumulative for name, _, cumulative in reversed(imports) if name == module)
+
+        if best is None or seconds < best[0]:
+            best = (seconds, sorted(imports, key=lambda entry: -entry[2]))
+
+    return best
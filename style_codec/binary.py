@@ -0,0 +1,271 @@
+from array import array
+import struct
+import sys
+
+from .columns import EventColumns, CompactChannels, OTHER, commandNames, commandFields
+from .profiling import profiler
+
+
+# Compact binary serialization of styles and multi pads, used to pass them between tools without the cost of YAML.
+# Loading yields the same structure as loading the YAML representation (dicts and lists).
+#
+# File:   magic, version (uint16), string table, root value
+# String: uint32 count, uint32 byte lengths, UTF-8 data. All dict keys and string values are references to the table.
+# Value:  one byte tag followed by the data of the value. Event lists are stored as EventColumns: fixed width columns
+#         of time (int32), command code, channel, data1 (uint8 each) and data2 (int32), followed by the side table of
+#         the payloads of the sysex/meta events. Lists of bytes (sysex data) are stored as raw bytes.
+#
+# All numbers are little endian.
+
+magic = b'SCBN'
+
+# Has to be increased whenever the layout changes, files of other versions are rejected
+binaryVersion = 1
+
+NONE, TRUE, FALSE, INT, FLOAT, STRING, LIST, DICT, BYTES, EVENTS = range(10)
+
+_uint32 = struct.Struct('<I')
+_int64 = struct.Struct('<q')
+_float64 = struct.Struct('<d')
+_header = struct.Struct('<4sH')
+
+_swap = sys.byteorder != 'little'
+
+
+class BinaryFormatError(Exception):
+    pass
+
+
+def _copyValue(value):
+    if isinstance(value, dict):
+        return {key: _copyValue(val) for key, val in value.items()}
+    elif isinstance(value, list):
+        return [_copyValue(x) for x in value]
+    else:
+        return value
+
+
+def _column(typecode, values):
+    column = array(typecode, values)
+    if _swap:
+        column.byteswap()
+    return column.tobytes()
+
+
+class _Encoder(object):
+    def __init__(self):
+        self.out = bytearray()
+        self.strings = {}
+
+    def string(self, value):
+        idx = self.strings.get(value)
+        if idx is None:
+            idx = self.strings[value] = len(self.strings)
+        return idx
+
+    def value(self, value):
+        out = self.out
+
+        if value is None:
+            out.append(NONE)
+        elif value is True:
+            out.append(TRUE)
+        elif value is False:
+            out.append(FALSE)
+        elif isinstance(value, int):
+            out.append(INT)
+            out += _int64.pack(value)
+        elif isinstance(value, float):
+            out.append(FLOAT)
+            out += _float64.pack(value)
+        elif isinstance(value, str):
+            out.append(STRING)
+            out += _uint32.pack(self.string(value))
+        elif isinstance(value, EventColumns):
+            self.columns(value)
+        elif isinstance(value, CompactChannels):
+            self.dict(value.peekItems(), len(value))
+        elif isinstance(value, dict):
+            self.dict(value.items(), len(value))
+        elif isinstance(value, list):
+            self.list(value)
+        else:
+            raise BinaryFormatError(f'Unsupported value of type {type(value).__name__}')
+
+    def dict(self, items, count):
+        out = self.out
+        out.append(DICT)
+        out += _uint32.pack(count)
+        for key, value in items:
+            if not isinstance(key, str):
+                raise BinaryFormatError(f'Unsupported key {key!r}')
+            out += _uint32.pack(self.string(key))
+            self.value(value)
+
+    def list(self, value):
+        if value and isinstance(value[0], dict) and 'time' in value[0]:
+            columns = EventColumns.fromEvents(value)
+            if columns is not None:
+                return self.columns(columns)
+
+        elif value and all(type(x) is int and 0 <= x < 256 for x in value):
+            self.out.append(BYTES)
+            self.out += _uint32.pack(len(value))
+            self.out += bytes(value)
+            return
+
+        self.values(value)
+
+    def values(self, value):
+        self.out.append(LIST)
+        self.out += _uint32.pack(len(value))
+        for x in value:
+            self.value(x)
+
+    def columns(self, columns):
+        out = self.out
+        try:
+            data = [_column('i', columns.times), _column('B', columns.commands), _column('b', columns.channels),
+                    _column('B', columns.data1), _column('i', columns.data2)]
+        except OverflowError:
+            # Times beyond the int32 range, stored as a list of events
+            return self.values(columns.toEvents())
+
+        out.append(EVENTS)
+        out += _uint32.pack(len(columns))
+        for column in data:
+            out += column
+
+        # The keys and values of the sysex/meta events following time
+        out += _uint32.pack(len(columns.payloads))
+        for payload in columns.payloads:
+            self.dict(payload, len(payload))
+
+    def stringTable(self):
+        data = [value.encode('utf8') for value in self.strings]
+        return _uint32.pack(len(data)) + _column('I', map(len, data)) + b''.join(data)
+
+
+class _Decoder(object):
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+        magicValue, version = self.unpack(_header)
+        if magicValue != magic:
+            raise BinaryFormatError('Not a binary style file')
+        if version != binaryVersion:
+            raise BinaryFormatError(f'Unsupported binary format version {version}, expected {binaryVersion}')
+
+        count = self.uint32()
+        lengths = self.column('I', count)
+        self.strings = []
+        for length in lengths:
+            self.strings.append(str(data[self.pos:self.pos + length], 'utf8'))
+            self.pos += length
+
+    def unpack(self, fmt):
+        if self.pos + fmt.size > len(self.data):
+            raise BinaryFormatError('Unexpected end of data')
+        values = fmt.unpack_from(self.data, self.pos)
+        self.pos += fmt.size
+        return values
+
+    def uint32(self):
+        return self.unpack(_uint32)[0]
+
+    def column(self, typecode, count):
+        column = array(typecode)
+        size = column.itemsize * count
+        if self.pos + size > len(self.data):
+            raise BinaryFormatError('Unexpected end of data')
+        column.frombytes(self.data[self.pos:self.pos + size])
+        self.pos += size
+        if _swap:
+            column.byteswap()
+        return column
+
+    def value(self):
+        if self.pos >= len(self.data):
+            raise BinaryFormatError('Unexpected end of data')
+        tag = self.data[self.pos]
+        self.pos += 1
+
+        if tag == DICT:
+            strings = self.strings
+            value = {}
+            for _ in range(self.uint32()):
+                key = strings[self.uint32()]
+                value[key] = self.value()
+            return value
+        elif tag == LIST:
+            return [self.value() for _ in range(self.uint32())]
+        elif tag == EVENTS:
+            return self.events()
+        elif tag == STRING:
+            return self.strings[self.uint32()]
+        elif tag == INT:
+            return self.unpack(_int64)[0]
+        elif tag == BYTES:
+            return list(self.column('B', self.uint32()))
+        elif tag == FLOAT:
+            return self.unpack(_float64)[0]
+        elif tag == NONE:
+            return None
+        elif tag == TRUE:
+            return True
+        elif tag == FALSE:
+            return False
+        else:
+            raise BinaryFormatError(f'Unknown tag {tag} at offset {self.pos - 1}')
+
+    def events(self):
+        count = self.uint32()
+        times = self.column('i', count)
+        commands = self.column('B', count)
+        channels = self.column('b', count)
+        data1 = self.column('B', count)
+        data2 = self.column('i', count)
+        payloads = [self.value() for _ in range(self.uint32())]
+
+        events = []
+        append = events.append
+        used = set()
+        for time, code, channel, value1, value2 in zip(times, commands, channels, data1, data2):
+            if code == OTHER:
+                # Payloads shared by several events (looped columns) are copied, like EventColumns.event does
+                event = {'time': time}
+                event.update(payloads[value2] if value2 not in used else _copyValue(payloads[value2]))
+                used.add(value2)
+            else:
+                command = commandNames[code]
+                field1, field2 = commandFields[command]
+                event = {'time': time, 'command': command}
+                if channel >= 0:
+                    event['channel'] = channel
+                if field1 is not None:
+                    event[field1] = value1
+                if field2 is not None:
+                    event[field2] = value2
+            append(event)
+
+        return events
+
+
+@profiler.timed('binary-dump')
+def dumpBinary(data):
+    encoder = _Encoder()
+    encoder.value(data)
+    return _header.pack(magic, binaryVersion) + encoder.stringTable() + encoder.out
+
+
+@profiler.timed('binary-load')
+def loadBinary(data):
+    try:
+        decoder = _Decoder(data)
+        value = decoder.value()
+    except (IndexError, UnicodeDecodeError) as e:
+        raise BinaryFormatError(f'Corrupt data: {e}')
+    if decoder.pos != len(data):
+        raise BinaryFormatError('Unexpected data after the end')
+    return value
@@ -0,0 +1,172 @@
+import hashlib
+import os
+import pickle
+
+from .profiling import profiler
+
+
+# On-disk cache of parsed style and multi pad files. The entries are keyed by the SHA-256 of the file content, the
+# kind of file and codecVersion, and hold the parsed structure as a pickle, so opening the same file again skips the
+# construct parsing. The modification time of an entry is updated on every hit and the least recently used entries
+# are evicted when the cache grows beyond maxSize bytes. The size is counted while writing and only recomputed from the
+# directory every refreshInterval writes (other processes may write to it as well) and when evicting, which removes
+# entries down to evictTo of maxSize so that the directory is not scanned on every write.
+#
+# The default cache is disabled unless STYLE_CODEC_CACHE=1 is set or a tool enables it (--cache),
+# STYLE_CODEC_CACHE_DIR moves it.
+
+# Has to be increased whenever a change of the codecs changes the parsed structure
+codecVersion = 1
+
+defaultDirectory = os.path.join(os.path.expanduser('~'), '.cache', 'style_codec')
+defaultMaxSize = 256 * 1024 * 1024
+
+refreshInterval = 100
+evictTo = 0.9
+
+
+class ParseCache(object):
+    def __init__(self, directory=None, maxSize=defaultMaxSize, enabled=True):
+        self.directory = directory or os.environ.get('STYLE_CODEC_CACHE_DIR') or defaultDirectory
+        self.maxSize = maxSize
+        self.enabled = enabled
+
+        self.hits = 0
+        self.misses = 0
+
+        # Bytes in the cache directory, None until counted
+        self._size = None
+        self._puts = 0
+
+    def key(self, data, kind):
+        digest = hashlib.sha256(f'{kind}:{codecVersion}:'.encode())
+        digest.update(data)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.pickle')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                obj = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Truncated or incompatible entry
+            self._remove(path)
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return obj
+
+    def put(self, key, obj):
+        import tempfile
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Written to a temporary file first, so concurrent readers never see a partial entry
+        fd, tmpPath = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
+                written = f.tell()
+            os.replace(tmpPath, path)
+        except BaseException:
+            self._remove(tmpPath)
+            raise
+
+        self._puts += 1
+        if self._size is None or self._puts % refreshInterval == 0:
+            self._size = self.size()
+        else:
+            self._size += written
+
+        if self._size > self.maxSize:
+            self.evict()
+
+    def parse(self, data, kind, parse):
+        # Returns parse(data), from the cache if possible
+        if not self.enabled:
+            return parse(data)
+
+        key = self.key(data, kind)
+        obj = self.get(key)
+        if obj is not None:
+            self.hits += 1
+            profiler.count('parse-cache-hits')
+            return obj
+
+        self.misses += 1
+        profiler.count('parse-cache-misses')
+        obj = parse(data)
+        try:
+            self.put(key, obj)
+        except OSError:
+            # A cache that cannot be written must not break loading
+            pass
+        return obj
+
+    def _entries(self):
+        # (mtime, size, path) of all entries
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+
+        for subdir in os.scandir(self.directory):
+            if subdir.is_dir():
+                for entry in os.scandir(subdir.path):
+                    if entry.name.endswith('.pickle'):
+                        try:
+                            st = entry.stat()
+                        except OSError:
+                            continue
+                        entries.append((st.st_mtime_ns, st.st_size, entry.path))
+
+        return entries
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+
+        if total > self.maxSize:
+            for _, size, path in sorted(entries):
+                if total <= self.maxSize * evictTo:
+                    break
+                self._remove(path)
+                total -= size
+
+        self._size = total
+
+    def clear(self):
+        for _, _, path in self._entries():
+            self._remove(path)
+        self._size = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        entries = self._entries()
+        return {
+            'entries': len(entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hitRate': self.hits / lookups if lookups else 0.0,
+            'size': sum(size for _, size, _ in entries)
+        }
+
+
+parseCache = ParseCache(enabled=os.environ.get('STYLE_CODEC_CACHE', '0') == '1')
@@ -1,33 +1,66 @@
 from construct import *
 import io
+from itertools import islice
+import operator
+import warnings
+
+from .midi import decodeEvents, encodeTrack, encodeVariableLength
+from .columns import peekEvents, EventColumns
+from .profiling import profiler
 
 from pprint import pprint
 
 beatResolution = 1920
 
-class LastOrStreamByte(Subconstruct):
-    # This class attribute holds the last command. Note that this is wrong because if there was some more complex
-    # backtracking in the rules, this would not obey the rollback. Instead, the last should be remembered
-    # in the context of the encapsulating FullRange. However, for our simple case here it is sufficient.
-    lastByte = None
+class RunningStatusScope(Subconstruct):
+    # Holds the running status for all events parsed by the subcon (i.e. for one MTrk). Keeping it in the context
+    # instead of a global makes parsing re-entrant, so that several tracks/files can be parsed at once.
+    def _parse(self, stream, context, path):
+        context = Container(_ = context, runningStatus = None, statusStream = io.BytesIO(bytes(1)))
+        return self.subcon._parse(stream, context, path)
+
+    def _build(self, obj, stream, context, path):
+        return self.subcon._build(obj, stream, context, path)
+
+    def _sizeof(self, context, path):
+        return self.subcon._sizeof(context, path)
+
+def getRunningStatusScope(context):
+    while context is not None:
+        if 'runningStatus' in context:
+            return context
+        context = context.get('_')
+    return None
+
 
+statusBytes = [bytes([value]) for value in range(256)]
+
+class LastOrStreamByte(Subconstruct):
+    # The last command is remembered in the enclosing RunningStatusScope. Note that if there was some more complex
+    # backtracking in the rules, this would not obey the rollback. However, for our simple case here it is sufficient.
     def __init__(self, subcon):
         super(LastOrStreamByte, self).__init__(subcon)
 
     def _parse(self, stream, context, path):
         fallback = stream.tell()
         value = stream.read(1)[0]
+        scope = getRunningStatusScope(context)
 
         if value & 0x80 == 0x00:
-            value = LastOrStreamByte.lastByte
+            if scope is None or scope.runningStatus is None:
+                raise FieldError("running status used without a preceding status byte")
+            value = scope.runningStatus
             stream.seek(fallback)
-        else:
-            LastOrStreamByte.lastByte = value
+        elif scope is not None:
+            scope.runningStatus = value
 
-        with io.BytesIO(bytes([value])) as valStream:
-            result = self.subcon._parse(valStream, context, path)
+        # The status byte is parsed from a one byte stream, reused within the scope
+        valStream = scope.statusStream if scope is not None else io.BytesIO(bytes(1))
+        valStream.seek(0)
+        valStream.write(statusBytes[value])
+        valStream.seek(0)
 
-        return result
+        return self.subcon._parse(valStream, context, path)
 
     def _build(self, obj, stream, context, path):
         self.subcon._build(obj, stream, context, path)
@@ -52,27 +85,29 @@ class Type(Construct):
     def _sizeof(self, context, path):
         return 0
 
-class VariableLengthUIntAdapter(Adapter):
-    def _encode(self, obj, context):
-        data = []
+class VariableLengthCodec(Construct):
+    # Variable length quantity, read byte by byte from the stream and written with encodeVariableLength
+    def _parse(self, stream, context, path):
+        value = 0
         while True:
-            val = obj & 0x7f
-            obj = obj >> 7
+            data = stream.read(1)
+            if not data:
+                raise FieldError("could not read enough bytes, expected 1, found 0")
+            byte = data[0]
+            value = (value << 7) | (byte & 0x7f)
+            if byte < 0x80:
+                return value
 
-            data.insert(0, val | 0x80)
-
-            if obj == 0:
-                lastIdx = len(data) - 1
-                data[lastIdx] &= 0x7f
-                return data
+    def _build(self, obj, stream, context, path):
+        out = bytearray()
+        encodeVariableLength(out, obj)
+        stream.write(out)
+        return obj
 
-    def _decode(self, obj, context):
-        time = 0
-        for idx in range(len(obj)):
-            time = (time << 7) + (obj[idx] & 0x7f)
-        return time
+    def _sizeof(self, context, path):
+        raise SizeofError("VariableLengthCodec has no fixed size")
 
-variableLengthCodec = VariableLengthUIntAdapter(RepeatUntil(lambda obj, lst, ctx: obj < 0x80, Byte))
+variableLengthCodec = VariableLengthCodec()
 
 
 def FullRange(codec):
@@ -92,6 +127,8 @@ class OffsetIntAdapter(Adapter):
         return obj + self.offset
 
 
+getTime = operator.itemgetter('time')
+
 sectionMarkers = {'SInt', 'Main A', 'Main B', 'Main C', 'Main D', 'Fill In AA', 'Fill In BB', 'Fill In CC', 'Fill In DD', 'Intro A', 'Intro B', 'Intro C', 'Ending A', 'Ending B', 'Ending C', 'Fill In BA'}
 class TrackSplitAdapter(Adapter):
     def getChannelId(no = None):
@@ -100,7 +137,12 @@ class TrackSplitAdapter(Adapter):
         else:
             return 'channel' + str(no)
 
+    @profiler.timed('track-merge')
     def _encode(self, obj, context):
+        # The channels are time ordered, so the concatenated channels consist of presorted runs, which the stable sort
+        # merges in linear time per run (common before channel 0..15 at equal times). Events parsed by construct are
+        # Containers, which dict() copies through their Python level keys(), copying the items of the underlying dict
+        # is more than twice as fast.
         channelNos = [None, 0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15]
 
         events = []
@@ -111,29 +153,40 @@ class TrackSplitAdapter(Adapter):
                 channelId = TrackSplitAdapter.getChannelId(channelNo)
 
                 if channelId in section['channels']:
-                    channelEvents = section['channels'][channelId]
-
-                    for event in channelEvents:
-                        event = dict(event)
-
-                        if channelNo is not None:
+                    channelEvents = peekEvents(section['channels'], channelId)
+
+                    times = channelEvents.times.tolist() if isinstance(channelEvents, EventColumns) else list(map(getTime, channelEvents))
+                    if any(map(operator.gt, times, islice(times, 1, None))):
+                        warnings.warn(f'The events of channel "{channelId}" in track section "{section["name"]}" are not ordered by time. They are reordered in the output.')
+
+                    if isinstance(channelEvents, list) and channelEvents and type(channelEvents[0]) is dict:
+                        copies = map(dict, channelEvents)
+                    else:
+                        copies = map(dict, map(dict.items, channelEvents))
+
+                    if channelNo is None:
+                        for event, time in zip(copies, times):
+                            event['time'] = time + sectionStartTime
+                            events.append(event)
+                    else:
+                        for event, time in zip(copies, times):
+                            event['time'] = time + sectionStartTime
                             event['channel'] = channelNo
-
-                        event['time'] = event['time'] + sectionStartTime
-
-                        events.append(event)
+                            events.append(event)
 
             sectionStartTime += section['length']
 
-        events.sort(key = lambda event: event['time'])
+        events.sort(key = getTime)
 
         globalTime = 0
         for event in events:
-            event['time'] -= globalTime
-            globalTime += event['time']
+            time = event['time']
+            event['time'] = time - globalTime
+            globalTime = time
 
         return events
 
+    @profiler.timed('track-split')
     def _decode(self, obj, context):
         channels = Container()
 
@@ -185,216 +238,48 @@ class TrackSplitAdapter(Adapter):
         return sections
 
 
-midiNoteOffCodec = Struct(
-    StreamCommand(
-        Const(BitsInteger(4), 0x08),
-        "command" / Type("off"),
-        "channel" / BitsInteger(4)
-    ),
-    "note" / Byte,
-    "velocity" / Byte
-)
-
-midiNoteOnCodec = Struct(
-    StreamCommand(
-        Const(BitsInteger(4), 0x09),
-        "command" / Type("on"),
-        "channel" / BitsInteger(4)
-    ),
-    "note" / Byte,
-    "velocity" / Byte
-)
-
-midiKeyPressCodec = Struct(
-    StreamCommand(
-        Const(BitsInteger(4), 0x0a),
-        "command" / Type("press"),
-        "channel" / BitsInteger(4)
-    ),
-    "key" / Byte,
-    "velocity" / Byte
-)
-
-midiCCCodec = Struct(
-    StreamCommand(
-        Const(BitsInteger(4), 0x0b),
-        "command" / Type("cc"),
-        "channel" / BitsInteger(4)
-    ),
-    "controller" / Byte,
-    "value" / Byte
-)
-
-def buildMidiCCValueCodec(command, controller, valueCodec = Byte):
-    return Struct(
-        StreamCommand(
-            Const(BitsInteger(4), 0x0b),
-            "command" / Type(command),
-            "channel" / BitsInteger(4)
-        ),
-        Const(Byte, controller),
-        "value" / Byte
-    )
-
-midiCCVolumeCodec = buildMidiCCValueCodec("cc-volume", 7)
-midiCCBankSelectMSBCodec = buildMidiCCValueCodec("cc-bank-select-msb", 0)
-midiCCBankSelectLSBCodec = buildMidiCCValueCodec("cc-bank-select-lsb", 32)
-midiCCReverbLevelCodec = buildMidiCCValueCodec("cc-reverb-level", 91)
-midiCCChorusLevelCodec = buildMidiCCValueCodec("cc-chorus-level", 93)
-midiCCPanCodec = buildMidiCCValueCodec("cc-pan", 10)
-
-def buildMidiCCCommandCodec(command, controller, value):
-    return Struct(
-        StreamCommand(
-            Const(BitsInteger(4), 0x0b),
-            "command" / Type(command),
-            "channel" / BitsInteger(4)
-        ),
-        Const(Byte, controller),
-        Const(Byte, value)
-    )
+class MidiTrackCodec(Construct):
+    # Equivalent of referencecodecs.referenceMidiTrackCodec using the table driven decoder and the direct encoder in midi.py.
+    # The decoder keeps the running status in a local variable per track, so it is re-entrant as well.
+    @profiler.timed('midi-decode')
+    def _parse(self, stream, context, path):
+        header = stream.read(8)
+        if len(header) != 8:
+            raise FieldError("could not read enough bytes, expected 8, found %d" % len(header))
+        if header[0:4] != b"MTrk":
+            raise ConstError("parsing expected %r but parsed %r" % (b"MTrk", header[0:4]))
 
-midiCCAllNotesOffCodec = buildMidiCCCommandCodec("cc-all-notes-off", 123, 0)
+        length = int.from_bytes(header[4:8], 'big')
+        data = stream.read(length)
+        if len(data) != length:
+            raise FieldError("could not read enough bytes, expected %d, found %d" % (length, len(data)))
 
-midiProgramChangeCodec = Struct(
-    StreamCommand(
-        Const(BitsInteger(4), 0x0c),
-        "command" / Type("pc"),
-        "channel" / BitsInteger(4)
-    ),
-    "program" / Byte
-)
+        return decodeEvents(data)
 
-midiPitchWheelChangeCodec = Struct(
-    StreamCommand(
-        Const(BitsInteger(4), 0x0e),
-        "command" / Type("pitch"),
-        "channel" / BitsInteger(4)
-    ),
-    "value" / Int16ul
-)
+    @profiler.timed('midi-encode')
+    def _build(self, obj, stream, context, path):
+        stream.write(encodeTrack(obj))
+        return obj
 
-midiSysexCodec = Struct(
-    StreamCommand(Const(BitsInteger(8), 0xf0)),
-    "command" / Type("sysex"),
-    "data" / PrefixedArray(OffsetIntAdapter(variableLengthCodec, -1), Byte),
-    Const(Byte, 0xf7)
-)
+    def _sizeof(self, context, path):
+        raise SizeofError("MidiTrackCodec has no fixed size")
 
-def buildMetaFixedLenCodec(id, command, length, valueCodec):
-    return Struct(
-        StreamCommand(Const(BitsInteger(8), 0xff)),
-        Const(Byte, id),
-        "command" / Type(command),
-        Const(Byte, length),
-        "value" / valueCodec
-    )
 
-def buildMetaTextCodec(id, command):
+def buildMidiSectionCodec(trackCodec):
     return Struct(
-        StreamCommand(Const(BitsInteger(8), 0xff)),
-        Const(Byte, id),
-        "command" / Type(command),
-        "value" / PascalString(variableLengthCodec, encoding="utf8")
+        Const(b"MThd"),
+        "section" / Type("midi"),
+        Const(Int32ub, 6),
+        Const(Int16ub, 0), # file-format
+        Const(Int16ub, 1), # nr-of-tracks
+        Const(Int16ub, beatResolution),
+        "track-sections" / TrackSplitAdapter(trackCodec)
+        #"track" / trackCodec
     )
 
-midiMetaSequenceCodec = buildMetaFixedLenCodec(0x00, "meta-sequence", 2, Int16ub)
-midiMetaTextCodec = buildMetaTextCodec(0x01, "meta-text")
-midiMetaCopyrightCodec = buildMetaTextCodec(0x02, "meta-copyright")
-midiMetaTrackNameCodec = buildMetaTextCodec(0x03, "meta-track")
-midiMetaTrackInstrumentNameCodec = buildMetaTextCodec(0x04, "meta-instrument")
-midiMetaLyricCodec = buildMetaTextCodec(0x05, "meta-lyric")
-midiMetaMarkerCodec = buildMetaTextCodec(0x06, "meta-marker")
-midiMetaCueCodec = buildMetaTextCodec(0x07, "meta-cue")
-midiMetaChannelPrefixCodec = buildMetaFixedLenCodec(0x20, "meta-channel-prefix", 1, Byte)
-midiMetaPortCodec = buildMetaFixedLenCodec(0x21, "meta-port", 1, Byte)
-midiMetaTempoCodec = buildMetaFixedLenCodec(0x51, "meta-tempo", 3, Int24ub)
-midiMetaSMPTEOffsetCodec = buildMetaFixedLenCodec(0x54, "meta-smpte-offset", 5, Byte[5])
-
-midiMetaEOTCodec = Struct(
-    StreamCommand(Const(BitsInteger(8), 0xff)),
-    Const(Byte, 0x2f),
-    "command" / Type("meta-eot"),
-    Const(Byte, 0)
-)
-
-midiMetaTimeSigCodec = Struct(
-    StreamCommand(Const(BitsInteger(8), 0xff)),
-    Const(Byte, 0x58),
-    "command" / Type("meta-time"),
-    Const(Byte, 4),
-    "num" / Byte,
-    "denom" / Byte,
-    Const(Byte, 24),
-    Const(Byte, 8)
-)
-
-midiMetaKeySigCodec = Struct(
-    StreamCommand(Const(BitsInteger(8), 0xff)),
-    Const(Byte, 0x59),
-    "command" / Type("meta-key"),
-    Const(Byte, 2),
-    "key" / Int8sl,
-    "mode" / Enum(Byte, major=0, minor=1)
-)
+midiTrackCodec = MidiTrackCodec()
+midiSectionCodec = buildMidiSectionCodec(midiTrackCodec)
 
-midiGenericMetaCodec = Struct(
-    StreamCommand(Const(BitsInteger(8), 0xff)),
-    "command" / Type("meta"),
-    "id" / Byte,
-    "data" / PrefixedArray(variableLengthCodec, Byte),
-)
-
-midiEventCodec = Select(
-    midiNoteOnCodec,
-    midiNoteOffCodec,
-    midiKeyPressCodec,
-    midiCCVolumeCodec,
-    midiCCBankSelectMSBCodec,
-    midiCCBankSelectLSBCodec,
-    midiCCReverbLevelCodec,
-    midiCCChorusLevelCodec,
-    midiCCPanCodec,
-    midiCCAllNotesOffCodec,
-    midiCCCodec,
-    midiProgramChangeCodec,
-    midiPitchWheelChangeCodec,
-    midiSysexCodec,
-    midiMetaSequenceCodec,
-    midiMetaTextCodec,
-    midiMetaCopyrightCodec,
-    midiMetaTrackNameCodec,
-    midiMetaTrackInstrumentNameCodec,
-    midiMetaLyricCodec,
-    midiMetaMarkerCodec,
-    midiMetaCueCodec,
-    midiMetaChannelPrefixCodec,
-    midiMetaPortCodec,
-    midiMetaEOTCodec,
-    midiMetaTempoCodec,
-    midiMetaSMPTEOffsetCodec,
-    midiMetaTimeSigCodec,
-    midiMetaKeySigCodec,
-    midiGenericMetaCodec
-)
-
-timestampedMidiEventCodec = Struct(
-    "time" / variableLengthCodec,
-    "data" / Embedded(midiEventCodec)
-)
-
-midiTrackCodec = FocusedSeq(1, Const(b"MTrk"), Prefixed(Int32ub, FullRange(timestampedMidiEventCodec)))
-
-midiSectionCodec = Struct(
-    Const(b"MThd"),
-    "section" / Type("midi"),
-    Const(Int32ub, 6),
-    Const(Int16ub, 0), # file-format
-    Const(Int16ub, 1), # nr-of-tracks
-    Const(Int16ub, beatResolution),
-    "track-sections" / TrackSplitAdapter(midiTrackCodec)
-    #"track" / midiTrackCodec
-)
 
 
 sdecCodec = Struct(
@@ -644,11 +529,14 @@ casmSectionCodec = Struct(
 )
 
 
-otsSectionCodec = Struct(
-    Const(b"OTSc"),
-    "section" / Type("ots"),
-    "tracks" / Prefixed(Int32ub, FullRange(midiTrackCodec))
-)
+def buildOtsSectionCodec(trackCodec):
+    return Struct(
+        Const(b"OTSc"),
+        "section" / Type("ots"),
+        "tracks" / Prefixed(Int32ub, FullRange(trackCodec))
+    )
+
+otsSectionCodec = buildOtsSectionCodec(midiTrackCodec)
 
 
 mdbRecord = Struct(
@@ -673,13 +561,25 @@ mdbSectionCodec = Struct(
 
 styleCodec = FullRange(Select(midiSectionCodec, casmSectionCodec, otsSectionCodec, mdbSectionCodec))
 
-multiPadCodec = Struct(
-    Const(b"MThd"),
-    "section" / Type("midi"),
-    Const(Int32ub, 6),
-    Const(Int16ub, 1), # file-format
-    Const(Int16ub, 5), # nr-of-tracks
-    Const(Int16ub, beatResolution),
-    "tracks" / FullRange(midiTrackCodec)
-)
+def buildMultiPadCodec(trackCodec):
+    return Struct(
+        Const(b"MThd"),
+        "section" / Type("midi"),
+        Const(Int32ub, 6),
+        Const(Int16ub, 1), # file-format
+        Const(Int16ub, 5), # nr-of-tracks
+        Const(Int16ub, beatResolution),
+        "tracks" / FullRange(trackCodec)
+    )
+
+multiPadCodec = buildMultiPadCodec(midiTrackCodec)
+
 
+def __getattr__(name):
+    # The reference codecs decoding each event via construct are only used to verify the fast codecs, they are built
+    # on first access
+    if name.startswith('midi') and name.endswith('Codec') or name in ('timestampedMidiEventCodec', 'referenceMidiTrackCodec',
+            'referenceMidiSectionCodec', 'referenceOtsSectionCodec', 'referenceStyleCodec', 'referenceMultiPadCodec'):
+        from . import referencecodecs
+        return getattr(referencecodecs, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
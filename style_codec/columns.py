@@ -0,0 +1,229 @@
+from array import array
+from itertools import compress
+import sys
+
+from construct import Container
+
+
+# Compact, array backed storage for the events of a track section channel. Channel messages are stored in parallel
+# columns (time, command code, channel, data1, data2). All other events (sysex, meta) use the command code OTHER and
+# keep their fields in a side table of payloads, data2 holding the index of the payload.
+
+OTHER = 0
+
+commandFields = {
+    'on': ('note', 'velocity'),
+    'off': ('note', 'velocity'),
+    'press': ('key', 'velocity'),
+    'cc': ('controller', 'value'),
+    'pc': ('program', None),
+    'pitch': (None, 'value'),
+    'cc-volume': (None, 'value'),
+    'cc-bank-select-msb': (None, 'value'),
+    'cc-bank-select-lsb': (None, 'value'),
+    'cc-reverb-level': (None, 'value'),
+    'cc-chorus-level': (None, 'value'),
+    'cc-pan': (None, 'value'),
+    'cc-all-notes-off': (None, None)
+}
+
+commandNames = [None] + list(commandFields.keys())
+commandCodes = {command: code for code, command in enumerate(commandNames) if command is not None}
+
+# Key order of the events that can be stored in the columns, without and with the channel key
+commandKeys = {}
+for command, fields in commandFields.items():
+    dataKeys = tuple(field for field in fields if field is not None)
+    commandKeys[command] = (('time', 'command') + dataKeys, ('time', 'command', 'channel') + dataKeys)
+
+NOTE_ON = commandCodes['on']
+NOTE_OFF = commandCodes['off']
+
+
+def _copyValue(value):
+    if isinstance(value, dict):
+        return Container((key, _copyValue(val)) for key, val in value.items())
+    elif isinstance(value, list):
+        return [_copyValue(x) for x in value]
+    else:
+        return value
+
+
+class EventColumns(object):
+    __slots__ = ['times', 'commands', 'channels', 'data1', 'data2', 'payloads']
+
+    def __init__(self, payloads=None):
+        self.times = array('q')
+        self.commands = array('B')
+        self.channels = array('b')
+        self.data1 = array('B')
+        self.data2 = array('l')
+        self.payloads = [] if payloads is None else payloads
+
+    @classmethod
+    def fromEvents(cls, events):
+        # Returns None if some of the events cannot be represented exactly (unusual keys or values out of range)
+        columns = cls()
+
+        try:
+            for event in events:
+                columns.appendEvent(event)
+        except (KeyError, IndexError, AttributeError, TypeError, OverflowError, ValueError):
+            return None
+
+        return columns
+
+    def appendEvent(self, event):
+        keys = tuple(event.keys())
+        command = event['command']
+
+        if command in commandKeys and keys in commandKeys[command]:
+            field1, field2 = commandFields[command]
+            self.times.append(event['time'])
+            self.commands.append(commandCodes[command])
+            self.channels.append(event['channel'] if 'channel' in event else -1)
+            self.data1.append(event[field1] if field1 is not None else 0)
+            self.data2.append(event[field2] if field2 is not None else 0)
+
+        elif keys[0] == 'time':
+            self.times.append(event['time'])
+            self.commands.append(OTHER)
+            self.channels.append(-1)
+            self.data1.append(0)
+            self.data2.append(len(self.payloads))
+            self.payloads.append(tuple((key, _copyValue(event[key])) for key in keys[1:]))
+
+        else:
+            raise ValueError('Unsupported event %r' % (event,))
+
+    def appendRow(self, time, command, channel=-1, data1=0, data2=0):
+        self.times.append(time)
+        self.commands.append(command)
+        self.channels.append(channel)
+        self.data1.append(data1)
+        self.data2.append(data2)
+
+    def event(self, idx):
+        code = self.commands[idx]
+
+        if code == OTHER:
+            event = Container(time=self.times[idx])
+            for key, value in self.payloads[self.data2[idx]]:
+                event[key] = _copyValue(value)
+            return event
+
+        command = commandNames[code]
+        field1, field2 = commandFields[command]
+
+        event = Container(time=self.times[idx], command=command)
+        if self.channels[idx] >= 0:
+            event['channel'] = self.channels[idx]
+        if field1 is not None:
+            event[field1] = self.data1[idx]
+        if field2 is not None:
+            event[field2] = self.data2[idx]
+        return event
+
+    def toEvents(self):
+        return [self.event(idx) for idx in range(len(self.times))]
+
+    def __len__(self):
+        return len(self.times)
+
+    def __iter__(self):
+        for idx in range(len(self.times)):
+            yield self.event(idx)
+
+    def derive(self):
+        # New columns sharing the payload table. Payloads are never mutated, events get copies of them.
+        return EventColumns(payloads=self.payloads)
+
+    def take(self, indices):
+        out = self.derive()
+        out.times = array('q', map(self.times.__getitem__, indices))
+        out.commands = array('B', map(self.commands.__getitem__, indices))
+        out.channels = array('b', map(self.channels.__getitem__, indices))
+        out.data1 = array('B', map(self.data1.__getitem__, indices))
+        out.data2 = array('l', map(self.data2.__getitem__, indices))
+        return out
+
+    def compress(self, mask):
+        out = self.derive()
+        out.times = array('q', compress(self.times, mask))
+        out.commands = array('B', compress(self.commands, mask))
+        out.channels = array('b', compress(self.channels, mask))
+        out.data1 = array('B', compress(self.data1, mask))
+        out.data2 = array('l', compress(self.data2, mask))
+        return out
+
+    def extendRows(self, other, start, stop, timeOffset=0):
+        # Appends rows of other, which has to share the payload table
+        if timeOffset:
+            self.times.extend([time + timeOffset for time in other.times[start:stop]])
+        else:
+            self.times.extend(other.times[start:stop])
+        self.commands.extend(other.commands[start:stop])
+        self.channels.extend(other.channels[start:stop])
+        self.data1.extend(other.data1[start:stop])
+        self.data2.extend(other.data2[start:stop])
+
+    def sortedByTime(self):
+        # Stable, like list.sort
+        times = self.times
+        return self.take(sorted(range(len(times)), key=times.__getitem__))
+
+    def loop(self, loopLength, targetLength):
+        # Same semantics as Style._loopEvents
+        out = self.derive()
+        count = len(self.times)
+        timeOffset = 0
+
+        while count:
+            limit = targetLength - timeOffset
+            stop = next((idx for idx, time in enumerate(self.times) if time >= limit), count)
+            out.extendRows(self, 0, stop, timeOffset)
+
+            if stop < count:
+                break
+
+            timeOffset += loopLength
+
+        return out
+
+    def memorySize(self):
+        size = sum(column.itemsize * len(column) for column in (self.times, self.commands, self.channels, self.data1, self.data2))
+        return size + sys.getsizeof(self.payloads) + sum(sys.getsizeof(payload) for payload in self.payloads)
+
+
+class CompactChannels(Container):
+    # Channels of a track section keeping their events as EventColumns. A channel is converted to a list of event
+    # dicts when it is accessed, so that it can be modified like in a regular style. Internal code that knows how
+    # to work with the columns uses peek() instead.
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        if isinstance(value, EventColumns):
+            value = value.toEvents()
+            dict.__setitem__(self, key, value)
+        return value
+
+    def peek(self, key):
+        return dict.__getitem__(self, key)
+
+    def peekItems(self):
+        return ((key, dict.__getitem__(self, key)) for key in self.keys())
+
+    @classmethod
+    def fromChannels(cls, channels):
+        compactChannels = cls()
+
+        for channelId, events in channels.items():
+            columns = EventColumns.fromEvents(events)
+            compactChannels[channelId] = columns if columns is not None else events
+
+        return compactChannels
+
+
+def peekEvents(channels, channelId):
+    if isinstance(channels, CompactChannels):
+        return channels.peek(channelId)
+    return channels[channelId]
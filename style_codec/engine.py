@@ -0,0 +1,266 @@
+import asyncio
+from bisect import bisect_left
+from collections import namedtuple
+import math
+import time
+
+from .codecs import beatResolution
+from .playback import TranspositionCache, LoopStats, allChannels
+
+
+# Asyncio playback engine driven by a command queue. Commands (switch section, tempo, key/chord, mute, stop) are
+# applied at the next beat or bar boundary of the current track section, or immediately with at='now'. The engine
+# waits for the next event deadline and for new commands at the same time, so a command never waits for a long
+# pause in the music. Notes sounding when the section, key/chord or mute state changes are turned off, so nothing
+# hangs, and all notes are turned off when playback ends for any reason (stop, an exception or cancellation of the
+# task). The commands may be posted from other threads (e.g. a MIDI input callback).
+
+Command = namedtuple('Command', ['name', 'args', 'at'])
+
+boundaries = ('now', 'beat', 'bar')
+
+
+class PlaybackEngine(object):
+    def __init__(self, style, channels=allChannels, trackSection='Main A', tempo=120, key='c', chord='Maj7', midiOut=None, midiPort=0, beatsPerBar=4, cache=None, clock=time.perf_counter_ns):
+        self.style = style
+        self.channels = list(channels)
+        self.cache = TranspositionCache(style, self.channels, compiled=True) if cache is None else cache
+        self.midiOut = midiOut
+        self.midiPort = midiPort
+        self.beatsPerBar = beatsPerBar
+        self.clock = clock
+
+        self.trackSection = trackSection
+        self.tempo = tempo
+        self.key = key
+        self.chord = chord
+        self.muted = set()
+
+        self.running = False
+        self.loop = None
+        self.commands = None
+        self.pending = []
+        self.activeNotes = set()
+        self.passStats = []
+
+    # Commands
+
+    def post(self, name, *args, at='now'):
+        if at not in boundaries:
+            raise ValueError(f'Unknown boundary "{at}", expected one of {boundaries}')
+
+        command = Command(name, args, at)
+        if self.commands is None:
+            self.pending.append((None, command))
+        else:
+            self.loop.call_soon_threadsafe(self.commands.put_nowait, command)
+
+    def switchSection(self, trackSection, at='bar'):
+        # Validated here, so an invalid section raises in the caller rather than stopping the playback task
+        if trackSection not in self.style.trackSections:
+            raise KeyError(f'Track section "{trackSection}" not found')
+        if self.cache.get(trackSection, self.key, self.chord).length <= 0:
+            raise ValueError(f'Track section "{trackSection}" is empty')
+        self.post('section', trackSection, at=at)
+
+    def setTempo(self, tempo, at='beat'):
+        self.post('tempo', tempo, at=at)
+
+    def setChord(self, key, chord, at='beat'):
+        self.post('chord', key, chord, at=at)
+
+    def mute(self, channel, at='now'):
+        self.post('mute', channel, at=at)
+
+    def unmute(self, channel, at='now'):
+        self.post('unmute', channel, at=at)
+
+    def stop(self, at='now'):
+        self.post('stop', at=at)
+
+    # Timing
+
+    def _deadline(self, tick):
+        return self.originNs + round((tick - self.originTick) * self.nsPerTick)
+
+    def _currentTick(self):
+        return self.originTick + (self.clock() - self.originNs) / self.nsPerTick
+
+    def _nextBoundary(self, at):
+        # First boundary at or after both the current position and the current time
+        tick = max(self.position, self._currentTick())
+        if at == 'now':
+            return max(self.position, math.ceil(tick))
+
+        unit = beatResolution if at == 'beat' else beatResolution * self.beatsPerBar
+        offset = tick - self.sectionStart
+        return self.sectionStart + int(-(-offset // unit)) * unit if offset > 0 else self.position
+
+    async def _wait(self, deadline):
+        # Returns a new command if one arrives before the deadline, None otherwise
+        timeout = (deadline - self.clock()) / 1e9
+
+        if timeout <= 0:
+            try:
+                return self.commands.get_nowait()
+            except asyncio.QueueEmpty:
+                return None
+
+        try:
+            return await asyncio.wait_for(self.commands.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    # Output
+
+    def _send(self, message):
+        status = message[0]
+
+        if status < 0xf0:
+            channel = status & 0x0f
+            if channel in self.muted:
+                return False
+
+            if status & 0xf0 == 0x90 and message[2] > 0:
+                self.activeNotes.add((channel, message[1]))
+            elif status & 0xf0 == 0x80 or status & 0xf0 == 0x90:
+                self.activeNotes.discard((channel, message[1]))
+
+        self.midiOut.send_message(message)
+        return True
+
+    def _notesOff(self, channels=None):
+        for channel, note in sorted(self.activeNotes):
+            if channels is None or channel in channels:
+                self.midiOut.send_message(bytes((0x80 | channel, note, 0)))
+                self.activeNotes.discard((channel, note))
+
+    def _recordPass(self):
+        count = self.passCount
+        self.passStats.append(LoopStats(count, self.passMaxLateness, self.passTotalLateness / count if count else 0.0))
+        self.passCount = self.passMaxLateness = self.passTotalLateness = 0
+
+    def _getBuffer(self):
+        buffer = self.cache.get(self.trackSection, self.key, self.chord)
+        if buffer.length <= 0:
+            raise ValueError(f'Track section "{self.trackSection}" is empty')
+        return buffer
+
+    # Commands are applied at the position, returns the index of the next message in the (possibly new) buffer
+
+    def _apply(self, command, buffer, idx):
+        name, args = command.name, command.args
+
+        if name == 'section':
+            self._notesOff()
+            self._recordPass()
+            self.trackSection = args[0]
+            self.sectionStart = self.position
+            return self._getBuffer(), 0
+
+        if name == 'chord':
+            self._notesOff()
+            self.key, self.chord = args
+            buffer = self._getBuffer()
+            return buffer, bisect_left(buffer.messages, (self.position - self.sectionStart,))
+
+        if name == 'tempo':
+            self.originNs = self._deadline(self.position)
+            self.originTick = self.position
+            self.tempo = args[0]
+            self.nsPerTick = 60e9 / self.tempo / beatResolution
+
+        elif name == 'mute':
+            self.muted.add(args[0])
+            self._notesOff([args[0]])
+
+        elif name == 'unmute':
+            self.muted.discard(args[0])
+
+        elif name == 'stop':
+            self.running = False
+
+        else:
+            raise ValueError(f'Unknown command "{name}"')
+
+        return buffer, idx
+
+    async def run(self, init=True):
+        # Plays until stopped, returns the lateness statistics of the played section passes
+        if self.midiOut is None:
+            import rtmidi
+            self.midiOut = rtmidi.MidiOut()
+            self.midiOut.open_port(self.midiPort)
+
+        self.loop = asyncio.get_running_loop()
+        self.commands = asyncio.Queue()
+        self.running = True
+
+        self.nsPerTick = 60e9 / self.tempo / beatResolution
+        self.originNs = self.clock()
+        self.originTick = 0
+        self.position = 0
+        self.passCount = self.passMaxLateness = self.passTotalLateness = 0
+
+        try:
+            if init:
+                initBuffer = self.style.compilePlayback(['Prologue', 'SInt'], self.channels, eot=False, transpose=False)
+                for tick, message in initBuffer.messages:
+                    await asyncio.sleep(max(0, (self._deadline(tick) - self.clock()) / 1e9))
+                    self.midiOut.send_message(message)
+                self.position = initBuffer.length
+
+            self.sectionStart = self.position
+            buffer = self._getBuffer()
+            idx = 0
+
+            pending = [(self._nextBoundary(command.at), command) for _, command in self.pending]
+            self.pending = []
+
+            while self.running:
+                sectionEnd = self.sectionStart + buffer.length
+                targetTick = self.sectionStart + buffer.messages[idx][0] if idx < len(buffer.messages) else sectionEnd
+                if pending:
+                    targetTick = min(targetTick, min(boundary for boundary, _ in pending))
+
+                deadline = self._deadline(targetTick)
+                command = await self._wait(deadline)
+                if command is not None:
+                    pending.append((self._nextBoundary(command.at), command))
+                    continue
+
+                lateness = self.clock() - deadline
+                self.position = targetTick
+
+                due = [command for boundary, command in pending if boundary <= self.position]
+                pending = [(boundary, command) for boundary, command in pending if boundary > self.position]
+                for command in due:
+                    buffer, idx = self._apply(command, buffer, idx)
+                    if not self.running:
+                        break
+
+                if not self.running:
+                    break
+
+                if idx == len(buffer.messages) and self.position >= self.sectionStart + buffer.length:
+                    self._recordPass()
+                    self.sectionStart += buffer.length
+                    idx = 0
+                    continue
+
+                while idx < len(buffer.messages) and self.sectionStart + buffer.messages[idx][0] <= self.position:
+                    if self._send(buffer.messages[idx][1]):
+                        self.passCount += 1
+                        self.passMaxLateness = max(self.passMaxLateness, lateness)
+                        self.passTotalLateness += lateness
+                    idx += 1
+        finally:
+            # Also when the task is cancelled or a command fails, so no notes are left sounding
+            self.running = False
+            self._notesOff()
+            for channel in self.channels:
+                self.midiOut.send_message(bytes((0xb0 | channel, 123, 0)))
+            self._recordPass()
+            self.commands = None
+
+        return self.passStats
@@ -0,0 +1,212 @@
+from .codecs import TrackSplitAdapter, midiTrackCodec, casmSectionCodec, otsSectionCodec
+from .columns import EventColumns, peekEvents, _copyValue
+from .lazy import scanStyle, scanTrackSections, midiHeader
+from .midi import decodeVariableLength, encodeVariableLength, encodeEvents
+from .profiling import profiler
+
+
+# Incremental building of style files loaded from style files. The bytes of the CASM and OTS chunks and of the event
+# span of every track section are kept together with a snapshot of the data decoded from them. Building compares the
+# data with the snapshots and encodes only what changed, whether it was changed through the Style API or by editing
+# the structures directly, everything else is copied. The track sections are independent within the MTrk chunk (the
+# decoder does not carry running status across the markers), only the delta time of the first event of a span
+# depends on the preceding sections and is written anew.
+#
+# Comparing is much cheaper than encoding: the events are compared with dict.__eq__ (construct Containers compare in
+# Python), EventColumns by identity and the bytes of their columns as they are replaced rather than modified.
+
+_trackSplitAdapter = TrackSplitAdapter(midiTrackCodec)
+
+
+def _columnsSnapshot(columns):
+    return (columns, columns.times.tobytes(), columns.commands.tobytes(), columns.channels.tobytes(),
+            columns.data1.tobytes(), columns.data2.tobytes(), len(columns.payloads))
+
+
+def _snapshotEvents(events):
+    if isinstance(events, EventColumns):
+        return _columnsSnapshot(events)
+
+    # Nested values (sysex and meta data, SMPTE offsets) are copied as well, they may be modified in place
+    copies = list(map(dict, map(dict.items, events)))
+    for copy in copies:
+        for key, value in copy.items():
+            if isinstance(value, (list, dict)):
+                copy[key] = _copyValue(value)
+    return copies
+
+
+def _sameEvents(events, snapshot):
+    if isinstance(snapshot, tuple):
+        return events is snapshot[0] and _columnsSnapshot(events) == snapshot
+    return isinstance(events, list) and len(events) == len(snapshot) and all(map(dict.__eq__, events, snapshot))
+
+
+def _snapshotTrackSection(trackSection):
+    channels = trackSection['channels']
+    return trackSection['name'], trackSection['length'], [(channelId, _snapshotEvents(peekEvents(channels, channelId))) for channelId in channels.keys()]
+
+
+def _sameTrackSection(trackSection, snapshot):
+    name, length, channelSnapshots = snapshot
+    channels = trackSection['channels']
+
+    if trackSection['name'] != name or trackSection['length'] != length or len(channels) != len(channelSnapshots):
+        return False
+
+    for channelId, eventsSnapshot in channelSnapshots:
+        if channelId not in channels or not _sameEvents(peekEvents(channels, channelId), eventsSnapshot):
+            return False
+    return True
+
+
+def _lastTime(trackSection):
+    channels = trackSection['channels']
+    lastTime = None
+
+    for channelId in channels.keys():
+        events = peekEvents(channels, channelId)
+        if len(events):
+            time = events.times[-1] if isinstance(events, EventColumns) else events[-1]['time']
+            lastTime = time if lastTime is None else max(lastTime, time)
+
+    return lastTime
+
+
+class _Span(object):
+    # Encoded events of a track section without the delta time of the first one, firstTime and lastTime are relative
+    # to the start of the section
+    __slots__ = ['body', 'firstTime', 'lastTime']
+
+    def __init__(self, body, firstTime, lastTime):
+        self.body = body
+        self.firstTime = firstTime
+        self.lastTime = lastTime
+
+
+class ChunkCache(object):
+    def __init__(self):
+        self.spans = {}
+        self.trackSections = {}
+        self.casm = None
+        self.casmSnapshot = None
+        self.ots = None
+        self.otsSnapshot = None
+
+    @classmethod
+    @profiler.timed('chunk-cache')
+    def fromStyle(cls, data, style):
+        # style has to be constructed from data. Sections present more than once are merged by the style, they are
+        # always encoded anew.
+        cache = cls()
+        chunks = scanStyle(data)
+        sections = [section for section, _, _ in chunks]
+
+        for section, start, end in chunks:
+            if sections.count(section) > 1:
+                continue
+
+            if section == 'midi':
+                # Of track sections present more than once the style keeps the last one
+                for name, spanStart, spanStop, _ in scanTrackSections(data, start, end):
+                    if name not in style.trackSections:
+                        continue
+
+                    trackSection = style.trackSections[name]
+                    lastTime = _lastTime(trackSection)
+
+                    if lastTime is not None and lastTime > trackSection['length']:
+                        # The last section of a file with events after the end of track, it is encoded anew
+                        cache.spans.pop(name, None)
+                        cache.trackSections.pop(name, None)
+                        continue
+
+                    if spanStart == spanStop or lastTime is None:
+                        cache.spans[name] = _Span(b'', 0, None)
+                    else:
+                        firstTime, bodyStart = decodeVariableLength(data, spanStart)
+                        # The first event of all sections but the prologue is the marker at time 0
+                        cache.spans[name] = _Span(bytes(data[bodyStart:spanStop]), firstTime if name == 'Prologue' else 0, lastTime)
+                    cache.trackSections[name] = _snapshotTrackSection(trackSection)
+
+            elif section == 'casm':
+                # Taken before _upgradeCASM, so an upgraded CASM is encoded anew
+                cache.casm = bytes(data[start:end])
+                cache.casmSnapshot = style._explodeCASM()
+
+            elif section == 'ots':
+                cache.ots = bytes(data[start:end])
+                cache.otsSnapshot = [_snapshotEvents(track) for track in style.ots]
+
+        return cache
+
+    def _encodeSpan(self, trackSection):
+        # Returns None if the events do not lie within the track section, they would be merged with the events of the
+        # neighbouring sections
+        events = _trackSplitAdapter._encode([trackSection], None)
+        if not events:
+            return _Span(b'', 0, None)
+
+        firstTime = events[0]['time']
+        lastTime = sum(event['time'] for event in events)
+        if firstTime < 0 or lastTime > trackSection['length']:
+            return None
+
+        out = encodeEvents(events)
+        profiler.countEvents('encoded', events)
+        bodyStart = decodeVariableLength(out, 0)[1]
+        return _Span(bytes(out[bodyStart:]), firstTime, lastTime)
+
+    def _buildMidi(self, trackSections):
+        out = bytearray(midiHeader + b'MTrk\0\0\0\0')
+        sectionStart = 0
+        lastTime = 0
+
+        for trackSection in trackSections:
+            name = trackSection['name']
+            snapshot = self.trackSections.get(name)
+
+            if snapshot is not None and _sameTrackSection(trackSection, snapshot):
+                span = self.spans[name]
+                profiler.count('reused-track-sections')
+            else:
+                span = self._encodeSpan(trackSection)
+                if span is None:
+                    return None
+                self.spans[name] = span
+                self.trackSections[name] = _snapshotTrackSection(trackSection)
+
+            if span.body:
+                encodeVariableLength(out, sectionStart + span.firstTime - lastTime)
+                out += span.body
+                lastTime = sectionStart + span.lastTime
+
+            sectionStart += trackSection['length']
+
+        out[18:22] = (len(out) - 22).to_bytes(4, 'big')
+        return out
+
+    def _buildCasm(self, style):
+        if self.casm is not None and style.casm == self.casmSnapshot:
+            profiler.count('reused-chunks')
+        else:
+            self.casm = casmSectionCodec.build(style._implodeCASM(style.casm))
+            self.casmSnapshot = _copyValue(style.casm)
+        return self.casm
+
+    def _buildOts(self, style):
+        ots = style.ots
+        if self.ots is not None and len(ots) == len(self.otsSnapshot) and all(map(_sameEvents, ots, self.otsSnapshot)):
+            profiler.count('reused-chunks')
+        else:
+            self.ots = otsSectionCodec.build(style._implodeOTS(ots))
+            self.otsSnapshot = [_snapshotEvents(track) for track in ots]
+        return self.ots
+
+    @profiler.timed('incremental-build')
+    def build(self, style):
+        # Returns the style file data, or None if it has to be built by styleCodec
+        midi = self._buildMidi(style._implodeTrackSections(style.trackSections)['track-sections'])
+        if midi is None:
+            return None
+        return bytes(midi) + self._buildCasm(style) + self._buildOts(style)
@@ -0,0 +1,280 @@
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .batch import findInputFiles, styleExtensions
+from .codecs import casmSectionCodec, mdbSectionCodec
+from .lazy import scanStyle, scanTrackSections
+from .mapped import mapFile, parseTracks
+from .midi import iterDecodeEvents
+
+
+# Persistent metadata index of a style library in a SQLite database. Files are keyed by path, size and mtime, a
+# refresh only extracts new and changed files (in a process pool) and drops the deleted ones. The extraction works
+# on the memory mapped file and decodes only the Prologue and SInt track sections, the CASM, OTS and MDB chunks.
+
+schema = '''
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    name TEXT,
+    tempo REAL,
+    timeNum INTEGER,
+    timeDenom INTEGER,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS sections (
+    path TEXT NOT NULL,
+    name TEXT NOT NULL,
+    length INTEGER
+);
+CREATE TABLE IF NOT EXISTS voices (
+    path TEXT NOT NULL,
+    source TEXT NOT NULL,
+    slot INTEGER NOT NULL,
+    channel INTEGER NOT NULL,
+    bankMsb INTEGER,
+    bankLsb INTEGER,
+    program INTEGER
+);
+CREATE TABLE IF NOT EXISTS nttRules (
+    path TEXT NOT NULL,
+    section TEXT NOT NULL,
+    channel INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    rule TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS mdb (
+    path TEXT NOT NULL,
+    song TEXT,
+    genre TEXT,
+    keyword1 TEXT,
+    keyword2 TEXT,
+    tempo INTEGER,
+    timeNum INTEGER,
+    timeDenom INTEGER
+);
+CREATE INDEX IF NOT EXISTS sectionsPath ON sections (path);
+CREATE INDEX IF NOT EXISTS sectionsName ON sections (name);
+CREATE INDEX IF NOT EXISTS voicesPath ON voices (path);
+CREATE INDEX IF NOT EXISTS voicesProgram ON voices (bankMsb, bankLsb, program);
+CREATE INDEX IF NOT EXISTS nttRulesPath ON nttRules (path);
+CREATE INDEX IF NOT EXISTS mdbPath ON mdb (path);
+'''
+
+childTables = ['sections', 'voices', 'nttRules', 'mdb']
+
+
+def _channelVoices(events):
+    # Last bank select / program change state of each channel, in channel order
+    state = {}
+
+    for event in events:
+        if 'channel' not in event:
+            continue
+
+        voice = state.setdefault(event.channel, [None, None, None])
+        if event.command == 'cc-bank-select-msb':
+            voice[0] = event.value
+        elif event.command == 'cc-bank-select-lsb':
+            voice[1] = event.value
+        elif event.command == 'pc':
+            voice[2] = event.program
+
+    return [(channel, *voice) for channel, voice in sorted(state.items()) if voice[2] is not None]
+
+
+def _nttRule(entry):
+    if entry['type'] == 'ctab':
+        return entry['ntt']
+    if entry['type'] == 'ctb2':
+        return entry['middle']['ntt']['rule']
+    return entry['ntt']['rule']
+
+
+def extractMetadata(fn):
+    # Returns the metadata of a style file as a dict with the rows of the child tables (without the path)
+    data = mapFile(fn)
+    meta = {'name': None, 'tempo': None, 'timeNum': None, 'timeDenom': None, 'sections': [], 'voices': [], 'nttRules': [], 'mdb': []}
+
+    chunks = scanStyle(data)
+    if not chunks:
+        raise Exception('No style sections found')
+
+    for section, start, end in chunks:
+        if section == 'midi':
+            for name, sectionStart, sectionStop, length in scanTrackSections(data, start, end):
+                meta['sections'].append((name, length))
+
+                if name == 'Prologue':
+                    for event in iterDecodeEvents(data[sectionStart:sectionStop]):
+                        if event.command == 'meta-tempo' and meta['tempo'] is None:
+                            meta['tempo'] = round(60e6 / event.value, 2) if event.value else None
+                        elif event.command == 'meta-time' and meta['timeNum'] is None:
+                            meta['timeNum'], meta['timeDenom'] = event.num, 2 ** event.denom
+                        elif event.command == 'meta-track' and meta['name'] is None:
+                            meta['name'] = event.value
+
+                elif name == 'SInt':
+                    meta['voices'] = [('sint', 0, *voice) for voice in _channelVoices(iterDecodeEvents(data[sectionStart:sectionStop]))]
+
+        elif section == 'ots':
+            for slot, track in enumerate(parseTracks(data, start + 8, end)):
+                meta['voices'].extend(('ots', slot, *voice) for voice in _channelVoices(track))
+
+        elif section == 'casm':
+            for cseg in casmSectionCodec.parse(bytes(data[start:end]))['csegs']:
+                sdec = next(entry for entry in cseg['entries'] if entry['type'] == 'sdec')
+                for part in sdec['name'].split(','):
+                    for entry in cseg['entries']:
+                        if entry['type'] in ['ctb2', 'ctab', 'cntt']:
+                            meta['nttRules'].append((part, entry['source-channel'], entry['type'], _nttRule(entry)))
+
+        else:
+            for record in mdbSectionCodec.parse(bytes(data[start:end]))['records']:
+                meta['mdb'].append((record['song'], record['genre'], record['keyword1'], record['keyword2'],
+                                    record['tempo'], record['time-num'], record['time-denom']))
+
+    return meta
+
+
+def _extractJob(path):
+    try:
+        return path, extractMetadata(path), None
+    except Exception as e:
+        return path, None, f'{type(e).__name__}: {e}'
+
+
+class StyleIndex(object):
+    def __init__(self, fn):
+        self.fn = fn
+        self.db = sqlite3.connect(fn)
+        self.db.executescript(schema)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def _delete(self, paths):
+        for table in ['files'] + childTables:
+            self.db.executemany(f'DELETE FROM {table} WHERE path = ?', ((path,) for path in paths))
+
+    def _insert(self, path, size, mtime, meta, error):
+        if meta is None:
+            self.db.execute('INSERT INTO files (path, size, mtime, error) VALUES (?, ?, ?, ?)', (path, size, mtime, error))
+            return
+
+        self.db.execute('INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?, NULL)',
+                        (path, size, mtime, meta['name'], meta['tempo'], meta['timeNum'], meta['timeDenom']))
+        self.db.executemany('INSERT INTO sections VALUES (?, ?, ?)', ((path, *row) for row in meta['sections']))
+        self.db.executemany('INSERT INTO voices VALUES (?, ?, ?, ?, ?, ?, ?)', ((path, *row) for row in meta['voices']))
+        self.db.executemany('INSERT INTO nttRules VALUES (?, ?, ?, ?, ?)', ((path, *row) for row in meta['nttRules']))
+        self.db.executemany('INSERT INTO mdb VALUES (?, ?, ?, ?, ?, ?, ?, ?)', ((path, *row) for row in meta['mdb']))
+
+    def refresh(self, inputs, workers=None, verbose=False):
+        # Indexes the style files found in the inputs (files, directories or glob patterns, see findInputFiles).
+        # Unchanged files are skipped, indexed files that no longer exist are removed. Returns (number of indexed
+        # files, number of unchanged files, number of removed files, failures, seconds).
+        startTime = time.perf_counter()
+
+        known = {path: (size, mtime) for path, size, mtime in self.db.execute('SELECT path, size, mtime FROM files')}
+        changed = {}
+        unchanged = 0
+
+        for path, _ in findInputFiles(inputs):
+            if os.path.splitext(path)[1].lower() not in styleExtensions:
+                continue
+
+            path = os.path.abspath(path)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+
+            if known.get(path) == (st.st_size, st.st_mtime_ns):
+                unchanged += 1
+            else:
+                changed[path] = (st.st_size, st.st_mtime_ns)
+
+        removed = [path for path in known if path not in changed and not os.path.exists(path)]
+        failures = []
+
+        with self.db:
+            self._delete(removed)
+            self._delete(changed)
+
+            if changed:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    chunkSize = max(1, len(changed) // (4 * (workers or os.cpu_count() or 1)))
+                    for path, meta, error in executor.map(_extractJob, list(changed), chunksize=chunkSize):
+                        if error is not None:
+                            failures.append((path, error))
+                            print(f'Error: Indexing "{path}" failed: {error}')
+                        elif verbose:
+                            print(path)
+
+                        self._insert(path, *changed[path], meta, error)
+
+        return len(changed) - len(failures), unchanged, len(removed), failures, time.perf_counter() - startTime
+
+    def query(self, tempo=None, timeSignature=None, sections=(), voice=None, nttRule=None, text=None):
+        # Returns (path, name, tempo, time signature) of the files matching all given criteria. tempo is a
+        # (min, max) pair, timeSignature a (num, denom) pair, voice a (bankMsb, bankLsb, program) triple with None
+        # matching any value, text a substring of the name or of the MDB song, genre and keywords.
+        conditions = ['error IS NULL']
+        params = []
+
+        if tempo is not None:
+            conditions.append('tempo BETWEEN ? AND ?')
+            params.extend(tempo)
+
+        if timeSignature is not None:
+            conditions.append('timeNum = ? AND timeDenom = ?')
+            params.extend(timeSignature)
+
+        for section in sections:
+            conditions.append('path IN (SELECT path FROM sections WHERE name = ?)')
+            params.append(section)
+
+        if voice is not None:
+            voiceConditions = [f'{column} = ?' for column, value in zip(['bankMsb', 'bankLsb', 'program'], voice) if value is not None]
+            conditions.append('path IN (SELECT path FROM voices WHERE {})'.format(' AND '.join(voiceConditions) or '1'))
+            params.extend(value for value in voice if value is not None)
+
+        if nttRule is not None:
+            conditions.append('path IN (SELECT path FROM nttRules WHERE rule = ?)')
+            params.append(nttRule)
+
+        if text is not None:
+            pattern = f'%{text}%'
+            conditions.append('(name LIKE ? OR path IN (SELECT path FROM mdb WHERE song LIKE ? OR genre LIKE ? OR keyword1 LIKE ? OR keyword2 LIKE ?))')
+            params.extend([pattern] * 5)
+
+        sql = 'SELECT path, name, tempo, timeNum, timeDenom FROM files WHERE {} ORDER BY path'.format(' AND '.join(conditions))
+        return [(path, name, tempo, (num, denom)) for path, name, tempo, num, denom in self.db.execute(sql, params)]
+
+    def describe(self, path):
+        # All indexed metadata of a file as a dict, None if the file is not indexed
+        path = os.path.abspath(path)
+        row = self.db.execute('SELECT name, tempo, timeNum, timeDenom, error FROM files WHERE path = ?', (path,)).fetchone()
+        if row is None:
+            return None
+
+        info = dict(zip(['name', 'tempo', 'timeNum', 'timeDenom', 'error'], row))
+        for table in childTables:
+            info[table] = [row[1:] for row in self.db.execute(f'SELECT * FROM {table} WHERE path = ?', (path,))]
+
+        return info
+
+    def stats(self):
+        return {
+            'files': self.db.execute('SELECT COUNT(*) FROM files WHERE error IS NULL').fetchone()[0],
+            'errors': self.db.execute('SELECT COUNT(*) FROM files WHERE error IS NOT NULL').fetchone()[0]
+        }
@@ -0,0 +1,141 @@
+from construct import Container
+
+from .codecs import TrackSplitAdapter, sectionMarkers, beatResolution
+from .columns import CompactChannels
+from .midi import decodeEvents, scanMarkers
+from .profiling import profiler
+
+
+# Support for loading styles lazily. scanStyle only walks the chunk headers of the file and the events of the MTrk
+# chunk (without building them) to find the track section boundaries. The sections are decoded on first access.
+# The results are the same as parsing the whole file with styleCodec.
+
+chunkSections = {
+    b'CASM': 'casm',
+    b'OTSc': 'ots',
+    b'FNRc': 'mdb'
+}
+
+midiHeader = b'MThd' + (6).to_bytes(4, 'big') + (0).to_bytes(2, 'big') + (1).to_bytes(2, 'big') + beatResolution.to_bytes(2, 'big')
+
+
+def _chunkEnd(data, pos):
+    if pos + 8 > len(data):
+        return None
+    end = pos + 8 + int.from_bytes(data[pos + 4:pos + 8], 'big')
+    return end if end <= len(data) else None
+
+
+def scanStyle(data):
+    # Returns (section, start, end) of the chunks styleCodec would parse. For the midi section start and end
+    # delimit the MTrk data, for the other sections the whole chunk including its header.
+    chunks = []
+    pos = 0
+
+    while pos < len(data):
+        chunkId = bytes(data[pos:pos + 4])
+
+        if chunkId == b'MThd':
+            if bytes(data[pos:pos + 14]) != midiHeader or bytes(data[pos + 14:pos + 18]) != b'MTrk':
+                break
+            end = _chunkEnd(data, pos + 14)
+            if end is None:
+                break
+            chunks.append(('midi', pos + 22, end))
+
+        elif chunkId in chunkSections:
+            end = _chunkEnd(data, pos)
+            if end is None:
+                break
+            chunks.append((chunkSections[chunkId], pos, end))
+
+        else:
+            break
+
+        pos = end
+
+    return chunks
+
+
+def scanTrackSections(data, start, end):
+    # Returns (name, start, stop, length) of the track sections in the MTrk data, split like TrackSplitAdapter does
+    stop, markers = scanMarkers(data[start:end])
+    markers = [marker for marker in markers if marker[2] == 'meta-eot' or marker[3] in sectionMarkers]
+
+    sections = []
+    name, sectionPos, sectionTime = 'Prologue', 0, 0
+
+    for pos, time, command, value in markers:
+        sections.append((name, start + sectionPos, start + pos, time - sectionTime))
+        name = value if command == 'meta-marker' else 'Epilogue'
+        sectionPos, sectionTime = pos, time
+
+    sections.append((name, start + sectionPos, start + stop, 0))
+    return sections
+
+
+@profiler.timed('track-section-decode')
+def decodeTrackSection(data, name, start, stop, length):
+    # The first event of all sections but the prologue is the marker, which starts the section at time 0
+    channels = Container()
+    sectionTime = 0
+
+    for idx, event in enumerate(decodeEvents(data[start:stop])):
+        if idx > 0 or name == 'Prologue':
+            sectionTime += event.time
+        event.time = sectionTime
+
+        if 'channel' in event:
+            channelId = TrackSplitAdapter.getChannelId(event.channel)
+            del event.channel
+        else:
+            channelId = TrackSplitAdapter.getChannelId()
+
+        if channelId not in channels:
+            channels[channelId] = []
+        channels[channelId].append(event)
+
+    return Container(name=name, length=length, channels=channels)
+
+
+class PendingTrackSection(object):
+    __slots__ = ['data', 'name', 'start', 'stop', 'length']
+
+    def __init__(self, data, name, start, stop, length):
+        self.data = data
+        self.name = name
+        self.start = start
+        self.stop = stop
+        self.length = length
+
+    def decode(self, compact=False):
+        section = decodeTrackSection(self.data, self.name, self.start, self.stop, self.length)
+        if compact:
+            section['channels'] = CompactChannels.fromChannels(section['channels'])
+        return section
+
+
+class LazyTrackSections(Container):
+    # Track sections of a LazyStyle, decoded on first access like CompactChannels converts its channels. Sections
+    # appearing more than once keep the position of the first and the content of the last, like in a Style.
+    def __init__(self, data=None, chunks=(), compact=False):
+        Container.__init__(self)
+        self.__dict__['compact'] = compact
+
+        for section, start, end in chunks:
+            if section == 'midi':
+                for name, sectionStart, sectionStop, length in scanTrackSections(data, start, end):
+                    self[name] = PendingTrackSection(data, name, sectionStart, sectionStop, length)
+
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        if isinstance(value, PendingTrackSection):
+            value = value.decode(self.__dict__['compact'])
+            dict.__setitem__(self, key, value)
+        return value
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def isDecoded(self, key):
+        return not isinstance(dict.__getitem__(self, key), PendingTrackSection)
@@ -0,0 +1,67 @@
+import mmap
+import os
+
+from construct import Container, ListContainer
+
+from .codecs import casmSectionCodec, mdbSectionCodec, multiPadCodec, beatResolution
+from .lazy import scanStyle, scanTrackSections, decodeTrackSection
+from .midi import decodeEvents
+
+
+# Reading of style and pad files through a read-only memory map. The chunks and the events are walked directly over
+# the mapped buffer, payloads are only copied into the decoded events. The parse functions return the same results
+# as styleCodec.parse and multiPadCodec.parse, only the small CASM and FNRc chunks go through construct.
+
+padHeader = b'MThd' + (6).to_bytes(4, 'big') + (1).to_bytes(2, 'big') + (5).to_bytes(2, 'big') + beatResolution.to_bytes(2, 'big')
+
+
+def mapFile(fn):
+    # The mapping stays valid as long as the returned memoryview (or a slice of it) is referenced
+    with open(fn, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return memoryview(b'')
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def parseTracks(data, pos, end):
+    # Like FullRange(midiTrackCodec), stops at the first chunk that is not a complete MTrk
+    tracks = ListContainer()
+
+    while pos + 8 <= end and bytes(data[pos:pos + 4]) == b'MTrk':
+        trackEnd = pos + 8 + int.from_bytes(data[pos + 4:pos + 8], 'big')
+        if trackEnd > end:
+            break
+
+        tracks.append(decodeEvents(data[pos + 8:trackEnd]))
+        pos = trackEnd
+
+    return tracks
+
+
+def parseStyle(data):
+    sections = ListContainer()
+
+    for section, start, end in scanStyle(data):
+        if section == 'midi':
+            trackSections = [decodeTrackSection(data, name, sectionStart, sectionStop, length)
+                             for name, sectionStart, sectionStop, length in scanTrackSections(data, start, end)]
+            sections.append(Container([('section', 'midi'), ('track-sections', trackSections)]))
+
+        elif section == 'ots':
+            sections.append(Container([('section', 'ots'), ('tracks', parseTracks(data, start + 8, end))]))
+
+        elif section == 'casm':
+            sections.append(casmSectionCodec.parse(bytes(data[start:end])))
+
+        else:
+            sections.append(mdbSectionCodec.parse(bytes(data[start:end])))
+
+    return sections
+
+
+def parsePad(data):
+    if bytes(data[0:14]) != padHeader:
+        # Let construct report the error
+        return multiPadCodec.parse(bytes(data))
+
+    return Container([('section', 'midi'), ('tracks', parseTracks(data, 14, len(data)))])
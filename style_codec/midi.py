@@ -0,0 +1,465 @@
+from construct import Container, ListContainer
+
+from .profiling import profiler
+
+
+# Fast path for decoding the events of a MTrk chunk. The decoders below dispatch on the status byte (and on the
+# meta id / CC controller number) via lookup tables instead of trying the alternatives of midiEventCodec one by one.
+# They produce the very same containers as the construct codecs in codecs.py, which are kept as the reference
+# implementation.
+
+class MidiDecodeError(Exception):
+    pass
+
+
+def decodeVariableLength(data, pos):
+    # Returns the value of the variable length quantity at pos and the position after it. Delta times are mostly a
+    # single byte, so that case returns right away.
+    byte = data[pos]
+    if byte < 0x80:
+        return byte, pos + 1
+
+    value = byte & 0x7f
+    while True:
+        pos += 1
+        byte = data[pos]
+        value = (value << 7) | (byte & 0x7f)
+        if byte < 0x80:
+            return value, pos + 1
+
+
+def _take(data, pos, length):
+    end = pos + length
+    if length < 0 or end > len(data):
+        raise MidiDecodeError('unexpected end of track')
+    return data[pos:end], end
+
+
+def _decodeNoteOff(data, pos, status, time):
+    return Container(time=time, command='off', channel=status & 0x0f, note=data[pos], velocity=data[pos + 1]), pos + 2
+
+def _decodeNoteOn(data, pos, status, time):
+    return Container(time=time, command='on', channel=status & 0x0f, note=data[pos], velocity=data[pos + 1]), pos + 2
+
+def _decodeKeyPress(data, pos, status, time):
+    return Container(time=time, command='press', channel=status & 0x0f, key=data[pos], velocity=data[pos + 1]), pos + 2
+
+def _decodeProgramChange(data, pos, status, time):
+    return Container(time=time, command='pc', channel=status & 0x0f, program=data[pos]), pos + 1
+
+def _decodePitchWheelChange(data, pos, status, time):
+    return Container(time=time, command='pitch', channel=status & 0x0f, value=data[pos] | (data[pos + 1] << 8)), pos + 2
+
+
+ccValueCommands = {
+    7: 'cc-volume',
+    0: 'cc-bank-select-msb',
+    32: 'cc-bank-select-lsb',
+    91: 'cc-reverb-level',
+    93: 'cc-chorus-level',
+    10: 'cc-pan'
+}
+
+ccCommands = {
+    (123, 0): 'cc-all-notes-off'
+}
+
+def _decodeCC(data, pos, status, time):
+    controller = data[pos]
+    value = data[pos + 1]
+
+    if controller in ccValueCommands:
+        return Container(time=time, command=ccValueCommands[controller], channel=status & 0x0f, value=value), pos + 2
+
+    if (controller, value) in ccCommands:
+        return Container(time=time, command=ccCommands[(controller, value)], channel=status & 0x0f), pos + 2
+
+    return Container(time=time, command='cc', channel=status & 0x0f, controller=controller, value=value), pos + 2
+
+
+def _decodeSysex(data, pos, status, time):
+    length, pos = decodeVariableLength(data, pos)
+    payload, pos = _take(data, pos, length - 1)
+
+    if data[pos] != 0xf7:
+        raise MidiDecodeError('sysex not terminated by 0xf7')
+
+    return Container(time=time, command='sysex', data=ListContainer(payload)), pos + 1
+
+
+metaTextCommands = {
+    0x01: 'meta-text',
+    0x02: 'meta-copyright',
+    0x03: 'meta-track',
+    0x04: 'meta-instrument',
+    0x05: 'meta-lyric',
+    0x06: 'meta-marker',
+    0x07: 'meta-cue'
+}
+
+def _decodeMetaText(command):
+    def decode(data, pos, time):
+        length, pos = decodeVariableLength(data, pos)
+        value, pos = _take(data, pos, length)
+        return Container(time=time, command=command, value=bytes(value).decode('utf8')), pos
+    return decode
+
+def _decodeMetaFixedLen(command, length, decodeValue):
+    def decode(data, pos, time):
+        if data[pos] != length:
+            return None
+        value, pos = _take(data, pos + 1, length)
+        return Container(time=time, command=command, value=decodeValue(value)), pos
+    return decode
+
+def _decodeMetaEOT(data, pos, time):
+    if data[pos] != 0:
+        return None
+    return Container(time=time, command='meta-eot'), pos + 1
+
+def _decodeMetaTimeSig(data, pos, time):
+    if data[pos] != 4:
+        return None
+    value, pos = _take(data, pos + 1, 4)
+    if value[2] != 24 or value[3] != 8:
+        return None
+    return Container(time=time, command='meta-time', num=value[0], denom=value[1]), pos
+
+keySigModes = {0: 'major', 1: 'minor'}
+
+def _decodeMetaKeySig(data, pos, time):
+    if data[pos] != 2:
+        return None
+    value, pos = _take(data, pos + 1, 2)
+    if value[1] not in keySigModes:
+        return None
+    key = value[0] - 256 if value[0] & 0x80 else value[0]
+    return Container(time=time, command='meta-key', key=key, mode=keySigModes[value[1]]), pos
+
+metaDecoders = {
+    0x00: _decodeMetaFixedLen('meta-sequence', 2, lambda value: int.from_bytes(value, 'big')),
+    0x20: _decodeMetaFixedLen('meta-channel-prefix', 1, lambda value: value[0]),
+    0x21: _decodeMetaFixedLen('meta-port', 1, lambda value: value[0]),
+    0x2f: _decodeMetaEOT,
+    0x51: _decodeMetaFixedLen('meta-tempo', 3, lambda value: int.from_bytes(value, 'big')),
+    0x54: _decodeMetaFixedLen('meta-smpte-offset', 5, ListContainer),
+    0x58: _decodeMetaTimeSig,
+    0x59: _decodeMetaKeySig
+}
+
+for metaId, command in metaTextCommands.items():
+    metaDecoders[metaId] = _decodeMetaText(command)
+
+
+def _decodeMeta(data, pos, status, time):
+    metaId = data[pos]
+    pos += 1
+
+    if metaId in metaDecoders:
+        try:
+            result = metaDecoders[metaId](data, pos, time)
+        except (IndexError, MidiDecodeError):
+            result = None
+
+        if result is not None:
+            return result
+
+    length, pos = decodeVariableLength(data, pos)
+    payload, pos = _take(data, pos, length)
+    return Container(time=time, command='meta', id=metaId, data=ListContainer(payload)), pos
+
+
+statusDecoders = [None] * 256
+
+for channelNo in range(16):
+    statusDecoders[0x80 | channelNo] = _decodeNoteOff
+    statusDecoders[0x90 | channelNo] = _decodeNoteOn
+    statusDecoders[0xa0 | channelNo] = _decodeKeyPress
+    statusDecoders[0xb0 | channelNo] = _decodeCC
+    statusDecoders[0xc0 | channelNo] = _decodeProgramChange
+    statusDecoders[0xe0 | channelNo] = _decodePitchWheelChange
+
+statusDecoders[0xf0] = _decodeSysex
+statusDecoders[0xff] = _decodeMeta
+
+
+def iterDecodeEvents(data):
+    # Like FullRange(timestampedMidiEventCodec), decoding silently stops at the first event that cannot be decoded.
+    lastStatus = None
+    pos = 0
+    end = len(data)
+
+    while pos < end:
+        try:
+            time, eventPos = decodeVariableLength(data, pos)
+
+            status = data[eventPos]
+            if status & 0x80:
+                lastStatus = status
+                eventPos += 1
+            elif lastStatus is None:
+                break
+            else:
+                status = lastStatus
+
+            decoder = statusDecoders[status]
+            if decoder is None:
+                break
+
+            event, pos = decoder(data, eventPos, status, time)
+
+        except (IndexError, MidiDecodeError, UnicodeDecodeError):
+            break
+
+        yield event
+
+
+def decodeEvents(data):
+    events = ListContainer(iterDecodeEvents(data))
+    profiler.countEvents('decoded', events)
+    return events
+
+
+# Lengths of the data following the status byte, -1 for sysex and meta events (variable length), None for the
+# status bytes decodeEvents does not support
+statusLengths = [None] * 256
+
+for channelNo in range(16):
+    for statusBase in (0x80, 0x90, 0xa0, 0xb0, 0xe0):
+        statusLengths[statusBase | channelNo] = 2
+    statusLengths[0xc0 | channelNo] = 1
+
+statusLengths[0xf0] = -1
+statusLengths[0xff] = -1
+
+
+def scanMarkers(data):
+    # Walks the events like decodeEvents without building them. Returns the position where decodeEvents stops and
+    # the (position, absolute time, command, value) of all meta-marker and meta-eot events before it.
+    markers = []
+    lastStatus = None
+    time = 0
+    pos = 0
+    end = len(data)
+
+    while pos < end:
+        try:
+            delta, eventPos = decodeVariableLength(data, pos)
+
+            status = data[eventPos]
+            if status & 0x80:
+                lastStatus = status
+                eventPos += 1
+            elif lastStatus is None:
+                break
+            else:
+                status = lastStatus
+
+            length = statusLengths[status]
+            if length is None:
+                break
+
+            if length >= 0:
+                nextPos = eventPos + length
+
+            elif status == 0xf0:
+                length, eventPos = decodeVariableLength(data, eventPos)
+                nextPos = eventPos + length
+                if length < 1 or nextPos > end or data[nextPos - 1] != 0xf7:
+                    break
+
+            else:
+                metaId = data[eventPos]
+                length, eventPos = decodeVariableLength(data, eventPos + 1)
+                nextPos = eventPos + length
+                if nextPos > end:
+                    break
+
+                if metaId in metaTextCommands:
+                    value = bytes(data[eventPos:nextPos]).decode('utf8')
+                    if metaId == 0x06:
+                        markers.append((pos, time + delta, 'meta-marker', value))
+                elif metaId == 0x2f and length == 0:
+                    markers.append((pos, time + delta, 'meta-eot', None))
+
+            if nextPos > end:
+                break
+
+        except (IndexError, UnicodeDecodeError):
+            break
+
+        time += delta
+        pos = nextPos
+
+    return pos, markers
+
+
+# Direct encoder for the events produced by TrackSplitAdapter._encode. It writes the bytes straight into a single
+# bytearray and yields the same output as building via midiEventCodec. Running status is off by default because
+# the construct codecs always write the status byte.
+
+class MidiEncodeError(Exception):
+    pass
+
+
+def encodeVariableLength(out, value):
+    # Appends value as variable length quantity to the bytearray out. The quantities of MIDI files have up to 4 bytes
+    # (28 bits), other values cannot be stored.
+    if value < 0x80:
+        if value < 0:
+            raise MidiEncodeError('variable length value out of range: %r' % (value,))
+        out.append(value)
+    elif value < 0x4000:
+        out += bytes((0x80 | (value >> 7), value & 0x7f))
+    elif value < 0x200000:
+        out += bytes((0x80 | (value >> 14), 0x80 | ((value >> 7) & 0x7f), value & 0x7f))
+    elif value < 0x10000000:
+        out += bytes((0x80 | (value >> 21), 0x80 | ((value >> 14) & 0x7f), 0x80 | ((value >> 7) & 0x7f), value & 0x7f))
+    else:
+        raise MidiEncodeError('variable length value out of range: %r' % (value,))
+
+
+channelEncoders = {
+    'on': (0x90, lambda event: (event['note'], event['velocity'])),
+    'off': (0x80, lambda event: (event['note'], event['velocity'])),
+    'press': (0xa0, lambda event: (event['key'], event['velocity'])),
+    'cc': (0xb0, lambda event: (event['controller'], event['value'])),
+    'pc': (0xc0, lambda event: (event['program'],)),
+    'pitch': (0xe0, lambda event: (event['value'] & 0xff, event['value'] >> 8))
+}
+
+for controller, command in ccValueCommands.items():
+    channelEncoders[command] = (0xb0, lambda event, controller=controller: (controller, event['value']))
+
+for (controller, value), command in ccCommands.items():
+    channelEncoders[command] = (0xb0, lambda event, controller=controller, value=value: (controller, value))
+
+
+def _encodeSysex(out, event):
+    data = event['data']
+    out.append(0xf0)
+    encodeVariableLength(out, len(data) + 1)
+    out.extend(data)
+    out.append(0xf7)
+
+def _encodeMetaText(metaId):
+    def encode(out, event):
+        value = event['value'].encode('utf8')
+        out.append(0xff)
+        out.append(metaId)
+        encodeVariableLength(out, len(value))
+        out.extend(value)
+    return encode
+
+def _encodeMetaFixedLen(metaId, length, encodeValue):
+    def encode(out, event):
+        out.extend((0xff, metaId, length))
+        out.extend(encodeValue(event['value']))
+    return encode
+
+def _encodeSMPTEOffset(value):
+    if len(value) != 5:
+        raise MidiEncodeError('expected 5 bytes of smpte offset, got %d' % len(value))
+    return value
+
+def _encodeMetaEOT(out, event):
+    out.extend((0xff, 0x2f, 0))
+
+def _encodeMetaTimeSig(out, event):
+    out.extend((0xff, 0x58, 4, event['num'], event['denom'], 24, 8))
+
+keySigModeValues = {'major': 0, 'minor': 1, 0: 0, 1: 1}
+
+def _encodeMetaKeySig(out, event):
+    if not -128 <= event['key'] < 128:
+        raise MidiEncodeError('key out of range: %r' % (event['key'],))
+    out.extend((0xff, 0x59, 2, event['key'] & 0xff, keySigModeValues[event['mode']]))
+
+def _encodeMeta(out, event):
+    data = event['data']
+    out.append(0xff)
+    out.append(event['id'])
+    encodeVariableLength(out, len(data))
+    out.extend(data)
+
+otherEncoders = {
+    'sysex': _encodeSysex,
+    'meta-sequence': _encodeMetaFixedLen(0x00, 2, lambda value: value.to_bytes(2, 'big')),
+    'meta-channel-prefix': _encodeMetaFixedLen(0x20, 1, lambda value: (value,)),
+    'meta-port': _encodeMetaFixedLen(0x21, 1, lambda value: (value,)),
+    'meta-eot': _encodeMetaEOT,
+    'meta-tempo': _encodeMetaFixedLen(0x51, 3, lambda value: int(value).to_bytes(3, 'big')),
+    'meta-smpte-offset': _encodeMetaFixedLen(0x54, 5, _encodeSMPTEOffset),
+    'meta-time': _encodeMetaTimeSig,
+    'meta-key': _encodeMetaKeySig,
+    'meta': _encodeMeta
+}
+
+for metaId, command in metaTextCommands.items():
+    otherEncoders[command] = _encodeMetaText(metaId)
+
+
+def encodeEvent(out, event, time, lastStatus=None, runningStatus=False):
+    # Writes the event with the given delta time, returns the status to pass as lastStatus for the next event
+    command = event['command']
+    encodeVariableLength(out, time)
+
+    if command in channelEncoders:
+        statusBase, encodeData = channelEncoders[command]
+        channel = event['channel']
+        if not 0 <= channel < 16:
+            raise MidiEncodeError('channel out of range: %r' % (channel,))
+
+        status = statusBase | channel
+        if status != lastStatus or not runningStatus:
+            out.append(status)
+
+        out.extend(encodeData(event))
+        return status
+
+    elif command in otherEncoders:
+        otherEncoders[command](out, event)
+        return None
+
+    else:
+        raise MidiEncodeError('unknown command: %r' % (command,))
+
+
+def encodeEvents(events, out=None, runningStatus=False):
+    if out is None:
+        out = bytearray()
+
+    lastStatus = None
+
+    for event in events:
+        lastStatus = encodeEvent(out, event, event['time'], lastStatus, runningStatus)
+
+    return out
+
+
+def encodeTrack(events, runningStatus=False):
+    # The chunk header is reserved upfront and the length is backpatched once all events are written.
+    out = bytearray(b'MTrk\0\0\0\0')
+    encodeEvents(events, out, runningStatus)
+    profiler.countEvents('encoded', events)
+    out[4:8] = (len(out) - 8).to_bytes(4, 'big')
+    return out
+
+
+def encodeMessage(event):
+    # A single event as sent to a MIDI port, i.e. without the delta time. Sysex messages are framed by 0xf0 and
+    # 0xf7 without the length used in MIDI files, meta events cannot be sent.
+    command = event['command']
+
+    if command in channelEncoders:
+        statusBase, encodeData = channelEncoders[command]
+        channel = event['channel']
+        if not 0 <= channel < 16:
+            raise MidiEncodeError('channel out of range: %r' % (channel,))
+
+        return bytes((statusBase | channel,) + tuple(encodeData(event)))
+
+    if command == 'sysex':
+        return bytes([0xf0, *event['data'], 0xf7])
+
+    raise MidiEncodeError('cannot send command: %r' % (command,))
@@ -0,0 +1,290 @@
+from collections import OrderedDict, namedtuple
+import sys
+import threading
+import time
+
+from .codecs import beatResolution
+from .midi import encodeMessage, encodeVariableLength
+from .profiling import profiler
+from .transpose import transpositions, transpositionNotes
+
+
+allChannels = list(range(16))
+
+
+# Cache of the playback event streams of a style, one per (track section, key, chord). The streams are computed by
+# Style.getPlaybackEvents on first use (or upfront by precompute) and kept in LRU order, so that a chord change
+# during live playback is a dictionary lookup. The cached streams are shared, callers must not modify them. With
+# compiled=True the cache keeps PlaybackBuffers instead of event lists.
+
+def _eventsSize(events):
+    if isinstance(events, PlaybackBuffer):
+        return sys.getsizeof(events.messages) + sum(sys.getsizeof(entry) + sys.getsizeof(entry[1]) for entry in events.messages)
+    return sys.getsizeof(events) + sum(sys.getsizeof(event) for event in events)
+
+
+class TranspositionCache(object):
+    def __init__(self, style, channels=None, maxSize=512, eot=True, compiled=False):
+        self.style = style
+        self.channels = channels
+        self.maxSize = maxSize
+        self.eot = eot
+        self.compiled = compiled
+
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _compute(self, trackSection, key, chord):
+        kwargs = {} if self.channels is None else {'channels': self.channels}
+        if self.compiled:
+            return self.style.compilePlayback([trackSection], key=key, chord=chord, eot=self.eot, **kwargs)
+        return self.style.getPlaybackEvents([trackSection], key=key, chord=chord, eot=self.eot, **kwargs)
+
+    def get(self, trackSection, key, chord):
+        cacheKey = (trackSection, key, chord)
+
+        with self.lock:
+            if cacheKey in self.entries:
+                self.entries.move_to_end(cacheKey)
+                self.hits += 1
+                return self.entries[cacheKey]
+
+            self.misses += 1
+
+        events = self._compute(trackSection, key, chord)
+
+        with self.lock:
+            self.entries[cacheKey] = events
+            self.entries.move_to_end(cacheKey)
+            self.sizes[cacheKey] = _eventsSize(events)
+
+            while len(self.entries) > self.maxSize:
+                oldKey, _ = self.entries.popitem(last=False)
+                del self.sizes[oldKey]
+                self.evictions += 1
+
+        return events
+
+    def supportedChords(self, trackSection):
+        # Chords all transposed channels of the track section have a transposition table for. The chords are
+        # intersected per rule and source chord. Channels with a rule or source chord without any table are not
+        # transposed in any chord (see Style._transposeEvents), they do not restrict the chords of the others.
+        chords = None
+        casm = self.style.casm.get(trackSection, {})
+        rules = set()
+
+        for channel in (allChannels if self.channels is None else self.channels):
+            if channel not in casm or casm[channel]['type'] != 'ctb2':
+                continue
+
+            nttRule = casm[channel]['middle']['ntt']['rule']
+            if nttRule != 'bypass':
+                rules.add((nttRule, casm[channel]['source-chord-type']))
+
+        for nttRule, fromChord in rules:
+            ruleChords = {toChord for (tableFromChord, toChord) in transpositions.get(nttRule, {}) if tableFromChord == fromChord}
+            if ruleChords:
+                chords = ruleChords if chords is None else chords & ruleChords
+
+        if chords is None:
+            chords = {toChord for table in transpositions.values() for (_, toChord) in table}
+
+        return sorted(chords)
+
+    def precompute(self, trackSections=None, keys=None, chords=None):
+        # By default all track sections with a CASM entry, in all keys and all supported chords
+        for trackSection in (list(self.style.casm.keys()) if trackSections is None else trackSections):
+            for key in (transpositionNotes.keys() if keys is None else keys):
+                for chord in (self.supportedChords(trackSection) if chords is None else chords):
+                    self.get(trackSection, key, chord)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.sizes.clear()
+
+    def memorySize(self):
+        with self.lock:
+            return sum(self.sizes.values())
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hitRate': self.hits / lookups if lookups else 0.0,
+                'memory': sum(self.sizes.values())
+            }
+
+
+
+# Scheduling of pre-encoded MIDI messages against absolute deadlines. The deadline of every message is computed from
+# the start time and the number of ticks played so far, so neither the time spent sending nor the sleep overshoot
+# accumulates into tempo drift. The last spinNs before a deadline are busy waited for precision.
+
+LoopStats = namedtuple('LoopStats', ['events', 'maxLateness', 'meanLateness'])
+
+
+class PlaybackBuffer(object):
+    # Compiled playback representation: (absolute tick, message bytes) pairs ordered by tick and the length of the
+    # buffer in ticks. Meta events only contribute their time.
+    __slots__ = ['messages', 'length']
+
+    def __init__(self, messages=None, length=0):
+        self.messages = [] if messages is None else messages
+        self.length = length
+
+    @classmethod
+    def fromEvents(cls, events):
+        # Events with delta times, as returned by Style.getPlaybackEvents
+        messages = []
+        tick = 0
+
+        for event in events:
+            tick += event['time']
+            if event['command'][0:4] != 'meta':
+                messages.append((tick, encodeMessage(event)))
+
+        return cls(messages, tick)
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __iter__(self):
+        return iter(self.messages)
+
+    def extend(self, other):
+        # Appends other after the end of this buffer
+        offset = self.length
+        self.messages.extend((tick + offset, message) for tick, message in other.messages)
+        self.length += other.length
+
+    def repeat(self, count):
+        result = PlaybackBuffer()
+        for _ in range(count):
+            result.extend(self)
+        return result
+
+    def toTrack(self, tempo=None):
+        out = bytearray(b'MTrk\0\0\0\0')
+
+        if tempo is not None:
+            out.extend((0, 0xff, 0x51, 3))
+            out.extend(round(60e6 / tempo).to_bytes(3, 'big'))
+
+        lastTick = 0
+        for tick, message in self.messages:
+            encodeVariableLength(out, tick - lastTick)
+            lastTick = tick
+
+            if message[0] == 0xf0:
+                # Sysex in a MIDI file carries the length of the data following 0xf0
+                out.append(0xf0)
+                encodeVariableLength(out, len(message) - 1)
+                out.extend(message[1:])
+            else:
+                out.extend(message)
+
+        encodeVariableLength(out, self.length - lastTick)
+        out.extend((0xff, 0x2f, 0))
+
+        out[4:8] = (len(out) - 8).to_bytes(4, 'big')
+        return out
+
+    def toMidiFile(self, tempo=None):
+        # Standard MIDI file of format 0
+        return b'MThd' + (6).to_bytes(4, 'big') + (0).to_bytes(2, 'big') + (1).to_bytes(2, 'big') + \
+            beatResolution.to_bytes(2, 'big') + self.toTrack(tempo)
+
+    def saveAsMidi(self, fn, tempo=None):
+        data = self.toMidiFile(tempo)
+        with open(fn, 'wb') as f:
+            f.write(data)
+        profiler.count('bytes-written', len(data))
+
+
+class Scheduler(object):
+    def __init__(self, midiOut, tempo, clock=time.perf_counter_ns, sleep=time.sleep, spinNs=500000):
+        self.midiOut = midiOut
+        self.clock = clock
+        self.sleep = sleep
+        self.spinNs = spinNs
+
+        self.nsPerTick = 60e9 / tempo / beatResolution
+        self.startNs = None
+        self.tickOffset = 0
+        self.loopStats = []
+
+    def setTempo(self, tempo):
+        # Continues from the current position with the new tempo
+        if self.startNs is not None:
+            self.startNs += round(self.tickOffset * self.nsPerTick)
+            self.tickOffset = 0
+        self.nsPerTick = 60e9 / tempo / beatResolution
+
+    def wait(self, deadline):
+        now = self.clock()
+        if deadline - now > self.spinNs:
+            self.sleep((deadline - now - self.spinNs) / 1e9)
+            now = self.clock()
+
+        while now < deadline:
+            now = self.clock()
+
+        return now
+
+    def play(self, buffer):
+        # Plays one pass of the PlaybackBuffer, the next pass starts buffer.length ticks later
+        if self.startNs is None:
+            self.startNs = self.clock()
+
+        maxLateness = 0
+        totalLateness = 0
+
+        for tick, message in buffer.messages:
+            deadline = self.startNs + round((self.tickOffset + tick) * self.nsPerTick)
+            lateness = self.wait(deadline) - deadline
+            self.midiOut.send_message(message)
+
+            maxLateness = max(maxLateness, lateness)
+            totalLateness += lateness
+
+        self.tickOffset += buffer.length
+
+        count = len(buffer.messages)
+        stats = LoopStats(count, maxLateness, totalLateness / count if count else 0.0)
+        self.loopStats.append(stats)
+        return stats
+
+    def finish(self):
+        # Waits until the end of the last pass
+        if self.startNs is not None:
+            self.wait(self.startNs + round(self.tickOffset * self.nsPerTick))
+
+
+class RecordingMidiOut(object):
+    # Stand-in for rtmidi.MidiOut recording the messages together with the clock time they were sent at
+    def __init__(self, clock=time.perf_counter_ns):
+        self.clock = clock
+        self.messages = []
+        self.port = None
+
+    def get_ports(self):
+        return ['Recording']
+
+    def open_port(self, port=0):
+        self.port = port
+
+    def close_port(self):
+        self.port = None
+
+    def send_message(self, message):
+        self.messages.append((self.clock(), bytes(message)))
@@ -0,0 +1,140 @@
+import functools
+import json
+import sys
+import time
+from contextlib import contextmanager
+
+
+# Instrumentation of the conversion and playback paths. The module level profiler records the durations of named
+# stages (inclusive, nested stages are part of the enclosing one), counters like the bytes read and written and the
+# decoded and encoded events by command. It is disabled by default, then stage() and the timed functions only check
+# the enabled flag.
+
+class _NullStage(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        return False
+
+
+_nullStage = _NullStage()
+
+
+class _Stage(object):
+    __slots__ = ['profiler', 'name', 'start']
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.profiler.addStage(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Profiler(object):
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.clear()
+
+    def clear(self):
+        self.stages = {}
+        self.counters = {}
+        self.events = {}
+
+    def stage(self, name):
+        return _Stage(self, name) if self.enabled else _nullStage
+
+    def addStage(self, name, seconds):
+        calls, total = self.stages.get(name, (0, 0.0))
+        self.stages[name] = (calls + 1, total + seconds)
+
+    def timed(self, name):
+        # Decorator recording every call of the function as the stage
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Stage(self, name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def count(self, name, value=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def countEvents(self, kind, events):
+        # kind is 'decoded' or 'encoded'
+        if self.enabled:
+            commands = self.events.setdefault(kind, {})
+            for event in events:
+                command = event['command']
+                commands[command] = commands.get(command, 0) + 1
+
+    def report(self):
+        return {
+            'stages': {name: {'calls': calls, 'seconds': seconds} for name, (calls, seconds) in sorted(self.stages.items(), key=lambda item: -item[1][1])},
+            'counters': dict(sorted(self.counters.items())),
+            'events': {kind: dict(sorted(commands.items(), key=lambda item: -item[1])) for kind, commands in self.events.items()}
+        }
+
+    def saveJson(self, fn):
+        with open(fn, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+    def printSummary(self, out=None):
+        # Looked up on each call, sys.stderr may be replaced after the import
+        out = sys.stderr if out is None else out
+        report = self.report()
+
+        for name, stage in report['stages'].items():
+            print('{:<24} {:6} calls {:10.2f} ms'.format(name, stage['calls'], stage['seconds'] * 1000), file=out)
+        for name, value in report['counters'].items():
+            print('{:<24} {:>12}'.format(name, value), file=out)
+        for kind, commands in report['events'].items():
+            print('{:<24} {:>12} ({})'.format(f'events {kind}', sum(commands.values()), ', '.join(f'{command}: {count}' for command, count in commands.items())), file=out)
+
+
+profiler = Profiler()
+
+profileFormats = ['json', 'cprofile']
+
+
+@contextmanager
+def profileTo(fn, format='json', summary=True):
+    # Enables the profiler for the block and writes the recorded data as JSON or, with format='cprofile', a cProfile
+    # dump of the block (readable with pstats) to fn. Does nothing if fn is None.
+    if fn is None:
+        yield profiler
+        return
+
+    if format not in profileFormats:
+        raise ValueError(f'Unknown profile format "{format}", expected one of {profileFormats}')
+
+    profiler.clear()
+    profiler.enabled = True
+    cprofile = None
+    if format == 'cprofile':
+        import cProfile
+        cprofile = cProfile.Profile()
+        cprofile.enable()
+
+    try:
+        yield profiler
+    finally:
+        if cprofile is not None:
+            cprofile.disable()
+            cprofile.dump_stats(fn)
+        else:
+            profiler.saveJson(fn)
+
+        profiler.enabled = False
+        if summary:
+            profiler.printSummary()
@@ -0,0 +1,212 @@
+from construct import *
+
+from .codecs import StreamCommand, Type, OffsetIntAdapter, FullRange, RunningStatusScope, variableLengthCodec, \
+    buildMidiSectionCodec, buildOtsSectionCodec, buildMultiPadCodec, casmSectionCodec, mdbSectionCodec
+
+
+# Reference implementation of the track codecs decoding each event via midiEventCodec. Built on the first access
+# of one of the names through style_codec.codecs.
+
+midiNoteOffCodec = Struct(
+    StreamCommand(
+        Const(BitsInteger(4), 0x08),
+        "command" / Type("off"),
+        "channel" / BitsInteger(4)
+    ),
+    "note" / Byte,
+    "velocity" / Byte
+)
+
+midiNoteOnCodec = Struct(
+    StreamCommand(
+        Const(BitsInteger(4), 0x09),
+        "command" / Type("on"),
+        "channel" / BitsInteger(4)
+    ),
+    "note" / Byte,
+    "velocity" / Byte
+)
+
+midiKeyPressCodec = Struct(
+    StreamCommand(
+        Const(BitsInteger(4), 0x0a),
+        "command" / Type("press"),
+        "channel" / BitsInteger(4)
+    ),
+    "key" / Byte,
+    "velocity" / Byte
+)
+
+midiCCCodec = Struct(
+    StreamCommand(
+        Const(BitsInteger(4), 0x0b),
+        "command" / Type("cc"),
+        "channel" / BitsInteger(4)
+    ),
+    "controller" / Byte,
+    "value" / Byte
+)
+
+def buildMidiCCValueCodec(command, controller, valueCodec = Byte):
+    return Struct(
+        StreamCommand(
+            Const(BitsInteger(4), 0x0b),
+            "command" / Type(command),
+            "channel" / BitsInteger(4)
+        ),
+        Const(Byte, controller),
+        "value" / Byte
+    )
+
+midiCCVolumeCodec = buildMidiCCValueCodec("cc-volume", 7)
+midiCCBankSelectMSBCodec = buildMidiCCValueCodec("cc-bank-select-msb", 0)
+midiCCBankSelectLSBCodec = buildMidiCCValueCodec("cc-bank-select-lsb", 32)
+midiCCReverbLevelCodec = buildMidiCCValueCodec("cc-reverb-level", 91)
+midiCCChorusLevelCodec = buildMidiCCValueCodec("cc-chorus-level", 93)
+midiCCPanCodec = buildMidiCCValueCodec("cc-pan", 10)
+
+def buildMidiCCCommandCodec(command, controller, value):
+    return Struct(
+        StreamCommand(
+            Const(BitsInteger(4), 0x0b),
+            "command" / Type(command),
+            "channel" / BitsInteger(4)
+        ),
+        Const(Byte, controller),
+        Const(Byte, value)
+    )
+
+midiCCAllNotesOffCodec = buildMidiCCCommandCodec("cc-all-notes-off", 123, 0)
+
+midiProgramChangeCodec = Struct(
+    StreamCommand(
+        Const(BitsInteger(4), 0x0c),
+        "command" / Type("pc"),
+        "channel" / BitsInteger(4)
+    ),
+    "program" / Byte
+)
+
+midiPitchWheelChangeCodec = Struct(
+    StreamCommand(
+        Const(BitsInteger(4), 0x0e),
+        "command" / Type("pitch"),
+        "channel" / BitsInteger(4)
+    ),
+    "value" / Int16ul
+)
+
+midiSysexCodec = Struct(
+    StreamCommand(Const(BitsInteger(8), 0xf0)),
+    "command" / Type("sysex"),
+    "data" / PrefixedArray(OffsetIntAdapter(variableLengthCodec, -1), Byte),
+    Const(Byte, 0xf7)
+)
+
+def buildMetaFixedLenCodec(id, command, length, valueCodec):
+    return Struct(
+        StreamCommand(Const(BitsInteger(8), 0xff)),
+        Const(Byte, id),
+        "command" / Type(command),
+        Const(Byte, length),
+        "value" / valueCodec
+    )
+
+def buildMetaTextCodec(id, command):
+    return Struct(
+        StreamCommand(Const(BitsInteger(8), 0xff)),
+        Const(Byte, id),
+        "command" / Type(command),
+        "value" / PascalString(variableLengthCodec, encoding="utf8")
+    )
+
+midiMetaSequenceCodec = buildMetaFixedLenCodec(0x00, "meta-sequence", 2, Int16ub)
+midiMetaTextCodec = buildMetaTextCodec(0x01, "meta-text")
+midiMetaCopyrightCodec = buildMetaTextCodec(0x02, "meta-copyright")
+midiMetaTrackNameCodec = buildMetaTextCodec(0x03, "meta-track")
+midiMetaTrackInstrumentNameCodec = buildMetaTextCodec(0x04, "meta-instrument")
+midiMetaLyricCodec = buildMetaTextCodec(0x05, "meta-lyric")
+midiMetaMarkerCodec = buildMetaTextCodec(0x06, "meta-marker")
+midiMetaCueCodec = buildMetaTextCodec(0x07, "meta-cue")
+midiMetaChannelPrefixCodec = buildMetaFixedLenCodec(0x20, "meta-channel-prefix", 1, Byte)
+midiMetaPortCodec = buildMetaFixedLenCodec(0x21, "meta-port", 1, Byte)
+midiMetaTempoCodec = buildMetaFixedLenCodec(0x51, "meta-tempo", 3, Int24ub)
+midiMetaSMPTEOffsetCodec = buildMetaFixedLenCodec(0x54, "meta-smpte-offset", 5, Byte[5])
+
+midiMetaEOTCodec = Struct(
+    StreamCommand(Const(BitsInteger(8), 0xff)),
+    Const(Byte, 0x2f),
+    "command" / Type("meta-eot"),
+    Const(Byte, 0)
+)
+
+midiMetaTimeSigCodec = Struct(
+    StreamCommand(Const(BitsInteger(8), 0xff)),
+    Const(Byte, 0x58),
+    "command" / Type("meta-time"),
+    Const(Byte, 4),
+    "num" / Byte,
+    "denom" / Byte,
+    Const(Byte, 24),
+    Const(Byte, 8)
+)
+
+midiMetaKeySigCodec = Struct(
+    StreamCommand(Const(BitsInteger(8), 0xff)),
+    Const(Byte, 0x59),
+    "command" / Type("meta-key"),
+    Const(Byte, 2),
+    "key" / Int8sl,
+    "mode" / Enum(Byte, major=0, minor=1)
+)
+
+midiGenericMetaCodec = Struct(
+    StreamCommand(Const(BitsInteger(8), 0xff)),
+    "command" / Type("meta"),
+    "id" / Byte,
+    "data" / PrefixedArray(variableLengthCodec, Byte),
+)
+
+midiEventCodec = Select(
+    midiNoteOnCodec,
+    midiNoteOffCodec,
+    midiKeyPressCodec,
+    midiCCVolumeCodec,
+    midiCCBankSelectMSBCodec,
+    midiCCBankSelectLSBCodec,
+    midiCCReverbLevelCodec,
+    midiCCChorusLevelCodec,
+    midiCCPanCodec,
+    midiCCAllNotesOffCodec,
+    midiCCCodec,
+    midiProgramChangeCodec,
+    midiPitchWheelChangeCodec,
+    midiSysexCodec,
+    midiMetaSequenceCodec,
+    midiMetaTextCodec,
+    midiMetaCopyrightCodec,
+    midiMetaTrackNameCodec,
+    midiMetaTrackInstrumentNameCodec,
+    midiMetaLyricCodec,
+    midiMetaMarkerCodec,
+    midiMetaCueCodec,
+    midiMetaChannelPrefixCodec,
+    midiMetaPortCodec,
+    midiMetaEOTCodec,
+    midiMetaTempoCodec,
+    midiMetaSMPTEOffsetCodec,
+    midiMetaTimeSigCodec,
+    midiMetaKeySigCodec,
+    midiGenericMetaCodec
+)
+
+timestampedMidiEventCodec = Struct(
+    "time" / variableLengthCodec,
+    "data" / Embedded(midiEventCodec)
+)
+
+referenceMidiTrackCodec = FocusedSeq(1, Const(b"MTrk"), Prefixed(Int32ub, RunningStatusScope(FullRange(timestampedMidiEventCodec))))
+referenceMidiSectionCodec = buildMidiSectionCodec(referenceMidiTrackCodec)
+referenceOtsSectionCodec = buildOtsSectionCodec(referenceMidiTrackCodec)
+referenceStyleCodec = FullRange(Select(referenceMidiSectionCodec, casmSectionCodec, referenceOtsSectionCodec, mdbSectionCodec))
+referenceMultiPadCodec = buildMultiPadCodec(referenceMidiTrackCodec)
@@ -0,0 +1,246 @@
+import json
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from . import RawStyle, RawMultiPad
+from .batch import styleExtensions, padExtensions, ymlExtensions
+from .cache import parseCache
+from .profiling import profileTo
+
+
+# Resident conversion server. Requests and responses are JSON objects, one per line, exchanged over a Unix domain
+# socket. The connections are served by threads, the conversions run in a pool of worker processes which keep the
+# modules imported and the codecs built between requests (the parse cache on disk is shared by all of them). A
+# connection may send any number of requests.
+#
+# Request:  {"action": "sty2yml", "input": "/abs/in.sty", "output": "/abs/out.yml", "split": false, "profile": null, "profileFormat": "json"}
+# Response: {"ok": true, "seconds": 0.012} or {"ok": false, "error": "..."}
+#
+# With split sty2yml writes the split directory layout of sty2yml --split, yml2sty reads such a directory when the
+# input is one.
+#
+# metadata returns the result of index.extractMetadata as "metadata", stats the counters of the server, shutdown
+# stops the server after answering.
+
+conversionActions = ['sty2yml', 'yml2sty', 'pad2yml', 'yml2pad']
+fileActions = conversionActions + ['metadata']
+actions = fileActions + ['ping', 'stats', 'shutdown']
+
+
+def getDefaultSocketPath():
+    return os.environ.get('STYLE_CODEC_SOCKET') or os.path.join(tempfile.gettempdir(), f'style_codec-{os.getuid()}.sock')
+
+
+def getConversionAction(input, output):
+    # The conversion action for the file names, like sty2yml/yml2sty would be chosen for them, or None
+    inExt = os.path.splitext(input)[1].lower()
+    outExt = os.path.splitext(output)[1].lower()
+
+    if inExt in styleExtensions:
+        return 'sty2yml'
+    if inExt in padExtensions:
+        return 'pad2yml'
+    if inExt in ymlExtensions or os.path.isdir(input):
+        return 'yml2pad' if outExt in padExtensions else 'yml2sty'
+    return None
+
+
+def runRequest(action, input, output=None, profile=None, profileFormat='json', split=False):
+    # Runs a file action in the current process, returns the response
+    startTime = time.perf_counter()
+
+    try:
+        if split and action != 'sty2yml':
+            raise ValueError(f'The split directory layout is only written by sty2yml, not by {action}')
+        if action in ('pad2yml', 'yml2pad', 'metadata') and os.path.isdir(input):
+            raise ValueError(f'{action} does not accept a directory as input, split directories hold styles')
+
+        with profileTo(profile, profileFormat, summary=False):
+            if action == 'sty2yml':
+                style = RawStyle.fromSty(input)
+                if split:
+                    style.saveAsYmlDir(output)
+                else:
+                    style.saveAsYml(output)
+            elif action == 'yml2sty':
+                style = RawStyle.fromYmlDir(input) if os.path.isdir(input) else RawStyle.fromYml(input)
+                style.saveAsSty(output)
+            elif action == 'pad2yml':
+                RawMultiPad.fromPad(input).saveAsYml(output)
+            elif action == 'yml2pad':
+                RawMultiPad.fromYml(input).saveAsPad(output)
+            elif action == 'metadata':
+                from .index import extractMetadata
+                return {'ok': True, 'metadata': extractMetadata(input), 'seconds': time.perf_counter() - startTime}
+            else:
+                raise ValueError(f'Unknown action "{action}"')
+    except Exception as e:
+        return {'ok': False, 'error': f'{type(e).__name__}: {e}'}
+
+    return {'ok': True, 'seconds': time.perf_counter() - startTime}
+
+
+def _initWorker(cache):
+    parseCache.enabled = cache
+
+
+def _warmUp():
+    # Imports what the conversions need, so that the first request does not pay for it
+    from . import yamlex, index
+    return os.getpid()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError('expected a JSON object')
+                response = self.server.conversionServer.handle(request)
+            except ValueError as e:
+                response = {'ok': False, 'error': f'Invalid request: {e}'}
+
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+            self.wfile.flush()
+
+            if response.get('shutdown'):
+                # shutdown() waits for serve_forever() to return, so it cannot be called from the serving thread
+                threading.Thread(target=self.server.shutdown).start()
+                return
+
+
+class _ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class ConversionServer(object):
+    def __init__(self, socketPath=None, workers=None, verbose=False, cache=False):
+        self.socketPath = socketPath or getDefaultSocketPath()
+        self.workers = workers or os.cpu_count() or 1
+        self.verbose = verbose
+        self.cache = cache
+
+        self.executor = None
+        self.server = None
+        self.lock = threading.Lock()
+        self.startTime = time.time()
+        self.requests = {}
+        self.failures = 0
+
+    def handle(self, request):
+        action = request.get('action')
+
+        if action == 'ping':
+            return {'ok': True, 'pid': os.getpid()}
+
+        if action == 'stats':
+            with self.lock:
+                return {'ok': True, 'uptime': time.time() - self.startTime, 'workers': self.workers, 'requests': dict(self.requests), 'failures': self.failures}
+
+        if action == 'shutdown':
+            return {'ok': True, 'shutdown': True}
+
+        if action not in fileActions:
+            return {'ok': False, 'error': f'Unknown action "{action}", expected one of {actions}'}
+
+        if not request.get('input') or (action in conversionActions and not request.get('output')):
+            return {'ok': False, 'error': f'Action "{action}" requires an input' + (' and an output' if action in conversionActions else '')}
+
+        response = self.executor.submit(runRequest, action, request['input'], request.get('output'), request.get('profile'), request.get('profileFormat', 'json'),
+                                        bool(request.get('split'))).result()
+
+        with self.lock:
+            self.requests[action] = self.requests.get(action, 0) + 1
+            if not response['ok']:
+                self.failures += 1
+
+        if self.verbose:
+            print('{} {} -> {}: {}'.format(action, request['input'], request.get('output'), 'ok' if response['ok'] else response['error']))
+
+        return response
+
+    def serve(self):
+        # Blocks until a shutdown request or KeyboardInterrupt
+        if os.path.exists(self.socketPath):
+            # A socket nobody listens on is left over from a server that did not exit cleanly
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socketPath)
+            except OSError:
+                os.remove(self.socketPath)
+            else:
+                raise Exception(f'A server is already listening on "{self.socketPath}"')
+            finally:
+                probe.close()
+
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_initWorker, initargs=(self.cache,))
+        try:
+            # Starts the worker processes before any thread is running
+            for future in [self.executor.submit(_warmUp) for _ in range(self.workers)]:
+                future.result()
+
+            self.server = _ThreadingUnixServer(self.socketPath, _RequestHandler)
+            self.server.conversionServer = self
+
+            try:
+                self.server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                self.server.server_close()
+                os.remove(self.socketPath)
+
+        finally:
+            self.executor.shutdown()
+
+
+class ConversionClient(object):
+    def __init__(self, socketPath=None, timeout=None):
+        self.socketPath = socketPath or getDefaultSocketPath()
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        try:
+            self.sock.connect(self.socketPath)
+        except OSError:
+            self.sock.close()
+            raise
+        self.rfile = self.sock.makefile('rb')
+
+    def request(self, action, input=None, output=None, profile=None, profileFormat='json', split=False):
+        # Paths are sent as absolute paths, the server does not share the working directory of the client
+        request = {'action': action}
+        if input is not None:
+            request['input'] = os.path.abspath(input)
+        if output is not None:
+            request['output'] = os.path.abspath(output)
+        if split:
+            request['split'] = True
+        if profile is not None:
+            request['profile'] = os.path.abspath(profile)
+            request['profileFormat'] = profileFormat
+
+        self.sock.sendall(json.dumps(request).encode() + b'\n')
+        line = self.rfile.readline()
+        if not line:
+            raise ConnectionError('The server closed the connection')
+        return json.loads(line)
+
+    def close(self):
+        self.rfile.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+        return False
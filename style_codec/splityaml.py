@@ -0,0 +1,224 @@
+import hashlib
+import os
+import re
+
+from .binary import dumpBinary, loadBinary, BinaryFormatError
+from .cache import parseCache
+from .columns import peekEvents
+from .profiling import profiler
+
+
+# Style stored as a directory of YAML files: one file per track section channel, one per other section (CASM, OTS,
+# MDB) and manifest.yml holding the order of the sections, track sections and channels. For every file the manifest
+# records the SHA-256, size and modification time of the file as written and a fingerprint of the data it was written
+# from (SHA-256 of its binary representation, much cheaper to compute than the YAML). parts.bin holds the binary
+# representations of all parts, the manifest their offsets and lengths in it.
+#
+# Loading takes a part from parts.bin if the SHA-256 of its file is the one in the manifest and the bytes in parts.bin
+# have the fingerprint of the manifest, so only files edited since the last save are parsed (through the parse cache
+# when it is enabled). Saving skips the YAML dump and the write of a part whose fingerprint did not change, as long as
+# the file was not modified since. Files of parts that no longer exist are removed.
+
+manifestName = 'manifest.yml'
+partsName = 'parts.bin'
+
+# Has to be increased whenever the layout changes
+splitVersion = 1
+
+
+class SplitYamlError(Exception):
+    pass
+
+
+def _slug(name):
+    return re.sub(r'[^A-Za-z0-9]+', '-', name).strip('-').lower() or 'section'
+
+
+def _loadManifest(directory):
+    from .yamlex import loadYaml
+
+    fn = os.path.join(directory, manifestName)
+    if not os.path.exists(fn):
+        return None
+
+    with open(fn, 'rb') as f:
+        manifest = loadYaml(f)
+
+    if not isinstance(manifest, dict) or manifest.get('version') != splitVersion:
+        raise SplitYamlError(f'Unsupported manifest "{fn}"')
+    return manifest
+
+
+def _manifestFiles(manifest):
+    # All file entries of the manifest by file name
+    files = {}
+    for section in manifest['sections']:
+        if 'track-sections' in section:
+            for trackSection in section['track-sections']:
+                for entry in trackSection['channels']:
+                    files[entry['file']] = entry
+        else:
+            files[section['file']] = section
+    return files
+
+
+class _Writer(object):
+    def __init__(self, directory, manifest):
+        self.directory = directory
+        self.previous = _manifestFiles(manifest) if manifest is not None else {}
+        self.parts = bytearray()
+        self.written = 0
+        self.skipped = 0
+
+    def _unchanged(self, path, previous, fingerprint):
+        if previous is None or previous.get('fingerprint') != fingerprint:
+            return False
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        return st.st_size == previous['size'] and st.st_mtime_ns == previous['mtime']
+
+    def write(self, name, data, entry):
+        # Writes data to the file name (relative to the directory) unless unchanged, fills in the file keys of entry
+        from .yamlex import dumpYaml
+
+        path = os.path.join(self.directory, name)
+        binary = dumpBinary(data)
+        fingerprint = hashlib.sha256(binary).hexdigest()
+        previous = self.previous.get(name)
+
+        entry.update(offset=len(self.parts), length=len(binary))
+        self.parts += binary
+
+        if self._unchanged(path, previous, fingerprint):
+            self.skipped += 1
+            entry.update((key, previous[key]) for key in ('file', 'sha256', 'size', 'mtime', 'fingerprint'))
+            return entry
+
+        content = dumpYaml(data).encode('utf8')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        profiler.count('bytes-written', len(content))
+
+        st = os.stat(path)
+        self.written += 1
+        entry.update(file=name, sha256=hashlib.sha256(content).hexdigest(), size=st.st_size, mtime=st.st_mtime_ns, fingerprint=fingerprint)
+        return entry
+
+
+@profiler.timed('split-yaml-save')
+def saveSplitYaml(style, directory):
+    # Returns the number of written and skipped files
+    from .yamlex import dumpYaml
+
+    writer = _Writer(directory, _loadManifest(directory))
+    sections = []
+
+    for sectionNo, section in enumerate(style):
+        if section['section'] == 'midi':
+            trackSections = []
+            for trackSectionNo, trackSection in enumerate(section['track-sections']):
+                sectionDir = 'midi/{:02}-{}'.format(trackSectionNo, _slug(trackSection['name']))
+                channels = trackSection['channels']
+                trackSections.append({
+                    'name': trackSection['name'],
+                    'length': trackSection['length'],
+                    'channels': [writer.write(f'{sectionDir}/{channelId}.yml', peekEvents(channels, channelId), {'channel': channelId})
+                                 for channelId in channels.keys()]
+                })
+
+            header = {key: value for key, value in section.items() if key != 'track-sections'}
+            sections.append({'header': header, 'track-sections': trackSections})
+
+        else:
+            sections.append(writer.write('{:02}-{}.yml'.format(sectionNo, _slug(section['section'])), section, {'section': section['section']}))
+
+    # Files of parts that no longer exist
+    current = _manifestFiles({'sections': sections})
+    for name in writer.previous:
+        if name not in current:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+    # Written before the manifest, the fingerprints guard against a parts.bin not matching the manifest
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, partsName), 'wb') as f:
+        f.write(writer.parts)
+    profiler.count('bytes-written', len(writer.parts))
+
+    with open(os.path.join(directory, manifestName), 'w') as f:
+        f.write(dumpYaml({'version': splitVersion, 'sections': sections}))
+
+    return writer.written, writer.skipped
+
+
+class _Reader(object):
+    def __init__(self, directory):
+        self.directory = directory
+        self.reused = 0
+        self.parsed = 0
+
+        try:
+            with open(os.path.join(directory, partsName), 'rb') as f:
+                self.parts = f.read()
+            profiler.count('bytes-read', len(self.parts))
+        except OSError:
+            self.parts = None
+
+    def _part(self, entry):
+        # The data the file was written from, None if not available
+        if self.parts is None or 'offset' not in entry:
+            return None
+
+        binary = self.parts[entry['offset']:entry['offset'] + entry['length']]
+        if hashlib.sha256(binary).hexdigest() != entry['fingerprint']:
+            return None
+        try:
+            return loadBinary(binary)
+        except BinaryFormatError:
+            return None
+
+    def load(self, entry):
+        from .yamlex import loadYaml
+
+        with open(os.path.join(self.directory, entry['file']), 'rb') as f:
+            content = f.read()
+        profiler.count('bytes-read', len(content))
+
+        if hashlib.sha256(content).hexdigest() == entry.get('sha256'):
+            data = self._part(entry)
+            if data is not None:
+                self.reused += 1
+                profiler.count('split-yaml-reused')
+                return data
+
+        self.parsed += 1
+        profiler.count('split-yaml-parsed')
+        return parseCache.parse(content, 'yml', loadYaml)
+
+
+@profiler.timed('split-yaml-load')
+def loadSplitYaml(directory):
+    manifest = _loadManifest(directory)
+    if manifest is None:
+        raise SplitYamlError(f'No {manifestName} in "{directory}"')
+
+    reader = _Reader(directory)
+    style = []
+    for entry in manifest['sections']:
+        if 'track-sections' in entry:
+            section = dict(entry['header'])
+            section['track-sections'] = [{
+                'name': trackSection['name'],
+                'length': trackSection['length'],
+                'channels': {channel['channel']: reader.load(channel) for channel in trackSection['channels']}
+            } for trackSection in entry['track-sections']]
+            style.append(section)
+        else:
+            style.append(reader.load(entry))
+
+    return style
@@ -0,0 +1,116 @@
+from .codecs import beatResolution
+from .lazy import scanTrackSections
+from .mapped import mapFile
+from .midi import iterDecodeEvents, encodeEvent, MidiEncodeError
+
+
+# Streaming access to the events of MIDI files (styles, pads, SMF). The readers walk the memory mapped file and yield
+# one event at a time, the writer encodes each event as it comes and backpatches the MTrk length at the end, so
+# neither side ever holds all events in memory.
+
+def _iterTracks(data):
+    # (start, end) of the data of the MTrk chunks following the MThd chunk
+    if bytes(data[0:4]) != b'MThd':
+        raise ValueError('Not a MIDI file (MThd chunk expected)')
+
+    pos = 8 + int.from_bytes(data[4:8], 'big')
+
+    while pos + 8 <= len(data) and bytes(data[pos:pos + 4]) == b'MTrk':
+        end = min(pos + 8 + int.from_bytes(data[pos + 4:pos + 8], 'big'), len(data))
+        yield pos + 8, end
+        pos = end
+
+
+def iterEvents(fn):
+    # Events of all tracks with absolute times (counted from the start of each track)
+    data = mapFile(fn)
+
+    for start, end in _iterTracks(data):
+        time = 0
+        for event in iterDecodeEvents(data[start:end]):
+            time += event.time
+            event.time = time
+            yield event
+
+
+def iterSectionEvents(fn, section):
+    # Events of a track section of a style with times relative to the start of the section, like in
+    # Style.trackSections but with the channel kept in the events
+    data = mapFile(fn)
+
+    for start, end in _iterTracks(data):
+        found = None
+        for name, sectionStart, sectionStop, length in scanTrackSections(data, start, end):
+            if name == section:
+                found = (sectionStart, sectionStop)
+
+        if found is None:
+            raise KeyError(f'Track section "{section}" not found')
+
+        time = 0
+        for idx, event in enumerate(iterDecodeEvents(data[found[0]:found[1]])):
+            if idx > 0 or section == 'Prologue':
+                time += event.time
+            event.time = time
+            yield event
+
+        return
+
+
+class TrackWriter(object):
+    # Writes a MTrk chunk from events with absolute times, appending meta-eot unless the events end with it. With
+    # header=True a MThd chunk is written first, which yields a complete MIDI file of format 0. The file has to be
+    # seekable for the length to be backpatched.
+    def __init__(self, f, header=False, runningStatus=False):
+        self.f = f
+        self.runningStatus = runningStatus
+        self.lastStatus = None
+        self.lastTime = 0
+        self.lastCommand = None
+        self.size = 0
+
+        if header:
+            f.write(b'MThd' + (6).to_bytes(4, 'big') + (0).to_bytes(2, 'big') + (1).to_bytes(2, 'big') + beatResolution.to_bytes(2, 'big'))
+
+        f.write(b'MTrk')
+        self.lengthPos = f.tell()
+        f.write(b'\0\0\0\0')
+
+    def write(self, event):
+        time = event['time']
+        if time < self.lastTime:
+            raise MidiEncodeError(f'events not ordered by time: {time} after {self.lastTime}')
+
+        out = bytearray()
+        self.lastStatus = encodeEvent(out, event, time - self.lastTime, self.lastStatus, self.runningStatus)
+        self.f.write(out)
+
+        self.size += len(out)
+        self.lastTime = time
+        self.lastCommand = event['command']
+
+    def writeAll(self, events):
+        for event in events:
+            self.write(event)
+
+    def close(self):
+        if self.lastCommand != 'meta-eot':
+            self.write({'time': self.lastTime, 'command': 'meta-eot'})
+
+        end = self.f.tell()
+        self.f.seek(self.lengthPos)
+        self.f.write(self.size.to_bytes(4, 'big'))
+        self.f.seek(end)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is None:
+            self.close()
+
+
+def writeTrack(fn, events, header=True, runningStatus=False):
+    with open(fn, 'wb') as f:
+        with TrackWriter(f, header, runningStatus) as writer:
+            writer.writeAll(events)
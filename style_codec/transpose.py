@@ -0,0 +1,140 @@
+from array import array
+import functools
+
+from .columns import NOTE_ON, NOTE_OFF
+
+
+transpositions = {
+    'chord': {
+        ('Maj7', 'Maj7'): [0, None, None, None, 0, None, None, 0, None, None, None, 0],
+        ('Maj7', 'Maj'): [0, None, None, None, 0, None, None, 0, None, None, None, None],
+        ('min7(11)', 'Maj7'): [0, None, None, +1, None, +2, None, 0, None, None, +1, None],
+        ('min7(11)', 'Maj'): [0, None, None, +1, None, +2, None, 0, None, None, None, None],
+        ('Maj7', 'min'): [0, None, None, None, -1, None, None, 0, None, None, None, None],
+    },
+    'melody': {
+        ('Maj7', 'Maj7'): [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        ('Maj7', 'Maj'): [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        ('Maj', 'Maj7'): [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        ('Maj7', 'min'): [0, 0, 0, 0, -1, 0, 0, 0, 0, 0, 0, 0],
+    }
+}
+
+transpositionNotes = {
+    'a': 0,
+    'a#': 1,
+    'b': 2,
+    'c': 3,
+    'c#': 4,
+    'd': 5,
+    'd#': 6,
+    'e': 7,
+    'f': 8,
+    'f#': 9,
+    'g': 10,
+    'g#': 11
+}
+
+
+# Batched transposition. A Transposition precomputes for all 256 possible note values the transposed note, or None
+# if notes of that pitch class are dropped. Note on and note off events go through the same table, so the pairs
+# stay consistent. Event lists are transposed with a single table lookup per event, EventColumns are transposed as
+# a whole with bytes.translate and bitwise masks over the note column.
+#
+# Notes transposed beyond the MIDI range are moved by octaves into 0..127, like a keyboard does with notes beyond
+# the note limits, so every path yields valid notes.
+
+noteCommandMask = bytes(0xff if code in (NOTE_ON, NOTE_OFF) else 0 for code in range(256))
+
+
+def _select(mask, a, b):
+    # Bytewise mask ? a : b for bytes of equal length, mask bytes being 0xff or 0x00
+    m = int.from_bytes(mask, 'little')
+    result = (int.from_bytes(a, 'little') & m) | (int.from_bytes(b, 'little') & ~m)
+    return result.to_bytes(len(a), 'little')
+
+
+def foldNote(note):
+    # Moves the note by octaves into the MIDI range
+    if note < 0:
+        return note + 12 * -(note // 12)
+    if note > 127:
+        return note - 12 * ((note - 116) // 12)
+    return note
+
+
+def transposeEventsReference(events, transTable, transBase):
+    # Reference implementation transposing event by event
+    newEvents = []
+    for event in events:
+        if event['command'] == 'on' or event['command'] == 'off':
+            chordTrans = transTable[event['note'] % 12]
+            if chordTrans is not None:
+                event['note'] = foldNote(event['note'] + transBase + chordTrans)
+                newEvents.append(event)
+
+        else:
+            newEvents.append(event)
+
+    return newEvents
+
+
+class Transposition(object):
+    def __init__(self, transTable, transBase):
+        self.transTable = transTable
+        self.transBase = transBase
+
+        self.noteMap = [self._mapNote(note) for note in range(256)]
+
+        self.noteTable = bytes(0 if note is None else note for note in self.noteMap)
+        self.keepTable = bytes(0x00 if note is None else 0xff for note in self.noteMap)
+
+    def _mapNote(self, note):
+        chordTrans = self.transTable[note % 12]
+        return None if chordTrans is None else foldNote(note + self.transBase + chordTrans)
+
+    def transposeEvents(self, events):
+        # Same semantics as transposeEventsReference, i.e. the events are modified in place
+        noteMap = self.noteMap
+        newEvents = []
+
+        for event in events:
+            command = event['command']
+            if command == 'on' or command == 'off':
+                note = event['note']
+                newNote = noteMap[note] if 0 <= note < 256 else self._mapNote(note)
+                if newNote is not None:
+                    event['note'] = newNote
+                    newEvents.append(event)
+
+            else:
+                newEvents.append(event)
+
+        return newEvents
+
+    def transposeColumns(self, columns):
+        # Returns new EventColumns, the given ones are not modified
+        count = len(columns)
+        isNote = bytes(columns.commands).translate(noteCommandMask)
+        data1 = bytes(columns.data1)
+        keep = _select(isNote, data1.translate(self.keepTable), b'\xff' * count)
+
+        out = columns.derive()
+        out.times = array('q', columns.times)
+        out.commands = array('B', columns.commands)
+        out.channels = array('b', columns.channels)
+        out.data1 = array('B', _select(isNote, data1.translate(self.noteTable), data1))
+        out.data2 = array('l', columns.data2)
+
+        if keep.count(0):
+            out = out.compress(keep)
+
+        return out
+
+
+@functools.lru_cache(maxsize=256)
+def _getTransposition(transTable, transBase):
+    return Transposition(transTable, transBase)
+
+def getTransposition(transTable, transBase):
+    return _getTransposition(tuple(transTable), transBase)
@@ -1,6 +1,9 @@
 import yaml
 from construct import *
 
+from .columns import CompactChannels, EventColumns
+from .profiling import profiler
+
 class HexInt(int): pass
 def hexIntRepresenter(dumper, data):
     return yaml.ScalarNode('tag:yaml.org,2002:int', hex(data))
@@ -34,9 +37,29 @@ def containerRepresenter(dumper, data, flow_style = None):
 def listContainerRepresenter(dumper, data):
     return dumper.represent_sequence(u'tag:yaml.org,2002:seq', list(data))
 
-yaml.add_representer(dict, containerRepresenter, Dumper=yaml.SafeDumper)
-yaml.add_representer(list, listContainerRepresenter, Dumper=yaml.SafeDumper)
-yaml.add_representer(Container, containerRepresenter, Dumper=yaml.SafeDumper)
-yaml.add_representer(ListContainer, listContainerRepresenter, Dumper=yaml.SafeDumper)
-yaml.add_representer(HexInt, hexIntRepresenter, Dumper=yaml.SafeDumper)
+def compactChannelsRepresenter(dumper, data):
+    # Represents the event columns without converting them to dicts in the style itself
+    return containerRepresenter(dumper, Container(data.peekItems()))
+
+# The libyaml based loader/dumper is used when available, falling back to the pure python implementation otherwise.
+# The representers are registered on both dumpers, which produce identical output.
+Loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+Dumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+for dumper in {yaml.SafeDumper, Dumper}:
+    yaml.add_representer(dict, containerRepresenter, Dumper=dumper)
+    yaml.add_representer(list, listContainerRepresenter, Dumper=dumper)
+    yaml.add_representer(Container, containerRepresenter, Dumper=dumper)
+    yaml.add_representer(ListContainer, listContainerRepresenter, Dumper=dumper)
+    yaml.add_representer(HexInt, hexIntRepresenter, Dumper=dumper)
+    yaml.add_representer(CompactChannels, compactChannelsRepresenter, Dumper=dumper)
+    yaml.add_representer(EventColumns, listContainerRepresenter, Dumper=dumper)
+
+@profiler.timed('yaml-load')
+def loadYaml(stream, loader=Loader):
+    return yaml.load(stream, Loader=loader)
+
+@profiler.timed('yaml-dump')
+def dumpYaml(data, dumper=Dumper):
+    return yaml.dump(data, Dumper=dumper, width=65536)
 
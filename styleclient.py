@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+from style_codec.server import ConversionClient, runRequest, actions, conversionActions, fileActions, getConversionAction, getDefaultSocketPath
+from style_codec.profiling import profileFormats
+from style_codec.cache import parseCache
+import argparse
+
+# A drop-in replacement for sty2yml.py / yml2sty.py taking the same arguments, e.g. "styleclient.py XXXXX.sty XXXXX.yml",
+# the conversion is chosen by the extensions of the files. An action may be given first instead, e.g.
+# "styleclient.py pad2yml XXXXX.pad XXXXX.yml" or "styleclient.py shutdown".
+# Without a running server the file is converted in this process.
+
+parser = argparse.ArgumentParser(description='Style Conversion Client', usage='%(prog)s [options] [action] [input] [output]')
+parser.add_argument('arguments', type=str, nargs='+', help='input and output of the conversion, optionally preceded by an action: {}'.format(', '.join(actions)))
+parser.add_argument('--split', action='store_true', help='writes a directory with a YAML file per track section channel (sty2yml)')
+parser.add_argument('--cache', action='store_true', help='keeps parsed styles in the parse cache (~/.cache/style_codec) when converting locally')
+parser.add_argument('--profile', type=str, default=None, help='records stage timings and counters to the file')
+parser.add_argument('--profile-format', type=str, choices=profileFormats, default='json', help='format of the profile: json or cprofile (pstats dump)')
+parser.add_argument('-s', '--socket', type=str, default=None, help='Unix domain socket of the server (default: $STYLE_CODEC_SOCKET or {})'.format(getDefaultSocketPath()))
+parser.add_argument('--no-fallback', action='store_true', help='fails instead of converting locally when no server is running')
+
+args = parser.parse_args()
+parseCache.enabled = args.cache
+
+if args.arguments[0] in actions:
+    action, paths = args.arguments[0], args.arguments[1:]
+    noOfPaths = 2 if action in conversionActions else 1 if action in fileActions else 0
+    if len(paths) != noOfPaths:
+        parser.error(f'{action} takes {noOfPaths} file argument(s), got {len(paths)}')
+else:
+    paths = args.arguments
+    if len(paths) != 2:
+        parser.error('the arguments are an input and an output file, or an action with its arguments')
+    action = getConversionAction(*paths)
+    if action is None:
+        parser.error(f'cannot tell the conversion from the extension of {paths[0]} (.sty, .prs, .bcs, .sst, .pad, .yml, .yaml or a directory)')
+
+if args.split and action != 'sty2yml':
+    parser.error(f'--split is only supported when converting a style to YAML, not by {action}')
+
+if __name__ == '__main__':
+    request = {'input': paths[0] if paths else None, 'output': paths[1] if len(paths) > 1 else None,
+               'profile': args.profile, 'profileFormat': args.profile_format, 'split': args.split}
+
+    try:
+        with ConversionClient(args.socket) as client:
+            response = client.request(action, **request)
+    except (FileNotFoundError, ConnectionRefusedError):
+        if args.no_fallback or request['input'] is None:
+            print('Error: No server is running')
+            exit(1)
+        response = runRequest(action, **request)
+
+    if not response['ok']:
+        print('Error: {}'.format(response['error']))
+        exit(1)
+
+    if action == 'metadata':
+        for key, value in response['metadata'].items():
+            print(f'{key}: {value}')
+    elif action in ('ping', 'stats'):
+        for key, value in response.items():
+            if key != 'ok':
+                print(f'{key}: {value}')
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+from style_codec.index import StyleIndex
+import argparse
+
+
+def parseVoice(value):
+    # bankMsb:bankLsb:program, empty parts match any value
+    parts = value.split(':')
+    if len(parts) != 3:
+        raise argparse.ArgumentTypeError('voice expected as bankMsb:bankLsb:program')
+    return tuple(int(part) if part else None for part in parts)
+
+
+def parseTimeSignature(value):
+    num, _, denom = value.partition('/')
+    return int(num), int(denom)
+
+
+parser = argparse.ArgumentParser(description='Style Library Index')
+parser.add_argument('-d', '--database', type=str, default='styles.db', help='index database (default: styles.db)')
+subparsers = parser.add_subparsers(dest='action', required=True)
+
+update = subparsers.add_parser('update', help='indexes new and changed files, removes deleted ones')
+update.add_argument('inputs', type=str, nargs='+', help='input files, directories or glob patterns')
+update.add_argument('-j', '--jobs', type=int, default=None, help='number of worker processes (default: number of CPUs)')
+update.add_argument('-v', '--verbose', action='store_true', help='prints each indexed file')
+
+query = subparsers.add_parser('query', help='lists the indexed files matching all given criteria')
+query.add_argument('--tempo', type=float, nargs=2, metavar=('MIN', 'MAX'), help='tempo range in bpm')
+query.add_argument('--time', type=parseTimeSignature, help='time signature, e.g. 3/4')
+query.add_argument('--section', type=str, action='append', default=[], help='track section the style has to contain (repeatable)')
+query.add_argument('--voice', type=parseVoice, help='voice in SInt or OTS as bankMsb:bankLsb:program, e.g. 0:112:5 or ::5')
+query.add_argument('--ntt', type=str, help='CASM note transposition rule, e.g. melodic-minor')
+query.add_argument('--text', type=str, help='substring of the style name or the MDB song, genre or keywords')
+
+show = subparsers.add_parser('show', help='prints the indexed metadata of files')
+show.add_argument('files', type=str, nargs='+', help='style files')
+
+args = parser.parse_args()
+
+if __name__ == '__main__':
+    with StyleIndex(args.database) as index:
+        if args.action == 'update':
+            indexed, unchanged, removed, failures, duration = index.refresh(args.inputs, workers=args.jobs, verbose=args.verbose)
+            print('Indexed {} files, {} unchanged, {} removed in {:.2f} s'.format(indexed, unchanged, removed, duration))
+
+            if failures:
+                print('{} files failed'.format(len(failures)))
+                exit(1)
+
+        elif args.action == 'query':
+            results = index.query(tempo=args.tempo, timeSignature=args.time, sections=args.section, voice=args.voice, nttRule=args.ntt, text=args.text)
+            for path, name, tempo, (num, denom) in results:
+                print('{}\t{}\t{}\t{}/{}'.format(path, name, tempo, num, denom))
+
+        else:
+            for fn in args.files:
+                info = index.describe(fn)
+                if info is None:
+                    print(f'{fn}: not indexed')
+                    continue
+
+                print(f'{fn}:')
+                for key, value in info.items():
+                    print(f'  {key}: {value}')
@@ -0,0 +1,17 @@
+#!/usr/bin/env python3
+
+from style_codec.server import ConversionServer, getDefaultSocketPath
+import argparse
+
+parser = argparse.ArgumentParser(description='Style Conversion Server')
+parser.add_argument('-s', '--socket', type=str, default=None, help='Unix domain socket to listen on (default: $STYLE_CODEC_SOCKET or {})'.format(getDefaultSocketPath()))
+parser.add_argument('-j', '--jobs', type=int, default=None, help='number of worker processes (default: number of CPUs)')
+parser.add_argument('--cache', action='store_true', help='keeps parsed styles and multi pads in the parse cache (~/.cache/style_codec)')
+parser.add_argument('-v', '--verbose', action='store_true', help='prints each request')
+
+args = parser.parse_args()
+
+if __name__ == '__main__':
+    server = ConversionServer(args.socket, workers=args.jobs, verbose=args.verbose, cache=args.cache)
+    print(f'Listening on {server.socketPath} with {server.workers} workers')
+    server.serve()
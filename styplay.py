@@ -2,6 +2,7 @@
 
 from style_codec import *
 import argparse
+import rtmidi
 
 parser = argparse.ArgumentParser(description='STY MIDI Player')
 parser.add_argument('input', type=str, help='input sty')
@@ -12,6 +13,11 @@ parser.add_argument('-s', '--section', type=str, default='Main A', help='name of
 parser.add_argument('-t', '--tempo', type=int, default=120, help='tempo in beats per minute')
 parser.add_argument('-k', '--key', type=str, default='c', help='key to play the style in')
 parser.add_argument('-r', '--chord', type=str, default='Maj7', help='chord to play the style in')
+parser.add_argument('-e', '--export', type=str, default=None, help='writes a MIDI file instead of playing')
+parser.add_argument('-n', '--loops', type=int, default=None, help='number of loops to play or export (default: until stopped, 1 for export)')
+parser.add_argument('--stats', action='store_true', help='prints timing statistics of each loop when stopped')
+parser.add_argument('--profile', type=str, default=None, help='records stage timings and counters to the file')
+parser.add_argument('--profile-format', type=str, choices=profileFormats, default='json', help='format of the profile: json or cprofile (pstats dump)')
 
 args = parser.parse_args()
 
@@ -30,8 +36,17 @@ if (args.list_midi_ports):
     exit(0)
 
 
-channels = [int(x) for x in args.channels.split(',')]
+with profileTo(args.profile, args.profile_format):
+    channels = [int(x) for x in args.channels.split(',')]
 
-style = Style.fromSty(args.input)
+    style = Style.fromSty(args.input, lazy=True)
 
-style.play(channels=channels, trackSections=[args.section], tempo=args.tempo, midiPort=args.midi_port, key=args.key, chord=args.chord)
\ No newline at end of file
+    if args.export:
+        style.saveAsMidi(args.export, channels=channels, trackSections=[args.section], tempo=args.tempo, key=args.key, chord=args.chord, loops=args.loops or 1)
+        exit(0)
+
+    loopStats = style.play(channels=channels, trackSections=[args.section], tempo=args.tempo, midiPort=args.midi_port, key=args.key, chord=args.chord, loops=args.loops)
+
+    if args.stats:
+        for loop, stats in enumerate(loopStats):
+            print('Loop {}: {} events, max lateness {:.3f} ms, mean lateness {:.3f} ms'.format(loop, stats.events, stats.maxLateness / 1e6, stats.meanLateness / 1e6))
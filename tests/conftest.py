@@ -0,0 +1,146 @@
+import os
+import random
+import sys
+
+# The tests use the sources of this checkout and must not write to the parse cache of the user
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['STYLE_CODEC_CACHE'] = '0'
+
+import pytest
+
+from style_codec import getEmptyMultipad
+from style_codec.benchmark import getSyntheticStyle
+from style_codec.codecs import styleCodec, multiPadCodec
+
+
+# Tests marked slow (minutes in pure Python) only run with --slow
+
+def pytest_addoption(parser):
+    parser.addoption('--slow', action='store_true', help='also runs the tests marked slow')
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'slow: runs for minutes, skipped unless --slow is given')
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--slow'):
+        return
+    skip = pytest.mark.skip(reason='slow, run with --slow')
+    for item in items:
+        if 'slow' in item.keywords:
+            item.add_marker(skip)
+
+
+def vlq(value):
+    out = [value & 0x7f]
+    value >>= 7
+    while value:
+        out.insert(0, (value & 0x7f) | 0x80)
+        value >>= 7
+    return out
+
+
+def randomEventBytes(rnd):
+    # One encoded event with its delta time, including the special cases of the decoder
+    time = vlq(rnd.choice([0, 1, 127, 128, 300, 20000]))
+    kind = rnd.randint(0, 12)
+    channel = rnd.randint(0, 15)
+
+    if kind == 0:
+        return time + [0x90 | channel, rnd.randint(0, 127), rnd.randint(0, 127)]
+    if kind == 1:
+        return time + [0x80 | channel, rnd.randint(0, 127), 0]
+    if kind == 2:
+        # Every CC with a command of its own, all notes off with and without its fixed value and a generic CC
+        return time + [0xb0 | channel, rnd.choice([0, 7, 10, 32, 91, 93, 123, 1, 64]), rnd.choice([0, 1, 127])]
+    if kind == 3:
+        return time + [0xc0 | channel, rnd.randint(0, 127)]
+    if kind == 4:
+        return time + [0xe0 | channel, rnd.randint(0, 127), rnd.randint(0, 127)]
+    if kind == 5:
+        return time + [0xa0 | channel, rnd.randint(0, 127), rnd.randint(0, 127)]
+    if kind == 6:
+        data = [rnd.randint(0, 127) for _ in range(rnd.randint(0, 200))]
+        return time + [0xf0] + vlq(len(data) + 1) + data + [0xf7]
+    if kind == 7:
+        # Known meta events with valid and invalid lengths (SMPTE offset, time and key signature among them) and
+        # unknown ones decoded as generic meta events
+        metaId = rnd.choice([0x00, 0x01, 0x02, 0x03, 0x04, 0x05, 0x06, 0x07, 0x20, 0x21, 0x2f, 0x51, 0x54, 0x58, 0x59, 0x7f, 0x10])
+        length = rnd.choice([0, 1, 2, 3, 4, 5, rnd.randint(0, 150)])
+        data = [rnd.randint(0, 127) for _ in range(length)]
+        if metaId == 0x58 and length == 4 and rnd.random() < 0.7:
+            data[2:] = [24, 8]
+        if metaId == 0x59 and length == 2:
+            data[0] = rnd.randint(0, 255)
+            data[1] = rnd.choice([0, 1, 2])
+        return time + [0xff, metaId] + vlq(length) + data
+    if kind == 8:
+        # Running status
+        return time + [rnd.randint(0, 127), rnd.randint(0, 127)]
+    if kind == 9:
+        # Channel pressure has no codec, the status byte is unknown
+        return time + [0xd0 | channel, rnd.randint(0, 127)]
+    if kind == 10:
+        return time + [0xff, 0x03, 3] + list('héx'.encode()[:3])
+    if kind == 11:
+        return time + [0xf0, 0]
+    return time + [0x90 | channel, 60, 100] + vlq(5) + [61, 0]
+
+
+def randomTrackData(rnd, noOfEvents=30, truncate=0.3):
+    data = []
+    for _ in range(rnd.randint(1, noOfEvents)):
+        data += randomEventBytes(rnd)
+    if rnd.random() < truncate:
+        data = data[:rnd.randint(0, len(data))]
+    return bytes(data)
+
+
+def getSampleStyle(seed=0):
+    # A small style with all kinds of events besides the notes of a synthetic style
+    style = getSyntheticStyle(density=2, noOfBeats=4, sections=3, sysexSize=32, ots=2, seed=seed)
+    sint = style.trackSections['SInt']['channels']
+    sint['channel9'] = [
+        {'time': 5, 'command': 'cc', 'controller': 1, 'value': 3},
+        {'time': 6, 'command': 'cc-all-notes-off'},
+        {'time': 7, 'command': 'press', 'key': 3, 'velocity': 4},
+        {'time': 8, 'command': 'pitch', 'value': 8192 + seed}
+    ]
+    sint['common'].extend([
+        {'time': 8, 'command': 'meta-key', 'key': -2, 'mode': 'minor'},
+        {'time': 9, 'command': 'meta', 'id': 0x7f, 'data': [1, 2, 3]},
+        {'time': 10, 'command': 'meta-smpte-offset', 'value': [1, 2, 3, 4, 5]},
+        {'time': 11, 'command': 'meta-text', 'value': 'héllo'},
+        {'time': 12, 'command': 'sysex', 'data': list(range(0x7f)) * 3}
+    ])
+    sint['common'].sort(key=lambda event: event['time'])
+    style._implodeAll()
+    return style
+
+
+def getSampleStyleData(seed=0):
+    return styleCodec.build(getSampleStyle(seed)._style)
+
+
+def getSamplePadData(seed=0):
+    rnd = random.Random(seed)
+    pad = getEmptyMultipad()
+    for channel, track in enumerate(pad['tracks'][1:]):
+        for time in range(0, 1920 * 4, 240):
+            note = rnd.randint(36, 95)
+            track.insert(-1, {'time': 0 if time == 0 else 120, 'command': 'on', 'channel': channel, 'note': note, 'velocity': rnd.randint(1, 127)})
+            track.insert(-1, {'time': 120, 'command': 'off', 'channel': channel, 'note': note, 'velocity': 0})
+    return multiPadCodec.build(pad)
+
+
+@pytest.fixture(scope='session')
+def sampleStyleData():
+    return [getSampleStyleData(seed) for seed in range(4)]
+
+
+@pytest.fixture
+def tmpStyle(tmp_path):
+    fn = tmp_path / 'sample.sty'
+    fn.write_bytes(getSampleStyleData())
+    return str(fn)
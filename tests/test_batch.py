@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+from style_codec.batch import findInputFiles, findOutputCollisions, convertFiles, getOutputBase
+
+from conftest import getSampleStyleData, getSamplePadData
+
+
+def testGetOutputBase():
+    assert getOutputBase('out', 'a/b.sty') == os.path.join('out', 'a', 'b.sty')
+    assert getOutputBase('out', 'b.sty.yml') == os.path.join('out', 'b.sty')
+    assert getOutputBase('out', 'b.yaml') == os.path.join('out', 'b')
+
+
+def testSameStem(tmp_path):
+    # A style, a registration and a multi pad with the same name are converted to different files and back
+    inDir = tmp_path / 'in'
+    inDir.mkdir()
+    (inDir / 'x.sty').write_bytes(getSampleStyleData(0))
+    (inDir / 'x.prs').write_bytes(getSampleStyleData(1))
+    (inDir / 'x.pad').write_bytes(getSamplePadData())
+
+    ymlDir = str(tmp_path / 'yml')
+    converted, failures, _, _ = convertFiles(findInputFiles([str(inDir)]), ymlDir, workers=1)
+    assert (converted, failures) == (3, [])
+    assert sorted(os.listdir(ymlDir)) == ['x.pad.yml', 'x.prs.yml', 'x.sty.yml']
+
+    outDir = tmp_path / 'out'
+    converted, failures, _, _ = convertFiles(findInputFiles([ymlDir]), str(outDir), workers=1)
+    assert (converted, failures) == (3, [])
+    for fn in ['x.sty', 'x.prs', 'x.pad']:
+        assert (outDir / fn).read_bytes() == (inDir / fn).read_bytes()
+
+
+@pytest.mark.parametrize('names', [['x.yml', 'x.yaml'], ['x.yml', 'x.sty.yml'], ['x.pad.yml', 'x.yml']])
+def testCollisions(tmp_path, names):
+    inDir = tmp_path / 'in'
+    inDir.mkdir()
+    for name in names:
+        (inDir / name).write_text('[]')
+
+    files = findInputFiles([str(inDir)])
+    assert len(findOutputCollisions(files, str(tmp_path / 'out'))) == 1
+    with pytest.raises(ValueError, match='same file'):
+        convertFiles(files, str(tmp_path / 'out'), workers=1)
+    assert not (tmp_path / 'out').exists()
+
+
+def testNoCollisions(tmp_path):
+    files = [('a/x.sty', 'x.sty'), ('a/x.prs', 'x.prs'), ('a/x.pad', 'x.pad'), ('b/x.sty.yml', 'x.sty.yml'), ('b/x.pad.yml', 'x.pad.yml')]
+    assert findOutputCollisions(files, 'out') == []
+    assert findOutputCollisions(files + [('c/x.sty', 'x.sty')], 'out') == [['a/x.sty', 'c/x.sty']]
@@ -0,0 +1,101 @@
+import struct
+
+import pytest
+
+from style_codec import Style, MultiPad, RawStyle
+from style_codec.binary import dumpBinary, loadBinary, BinaryFormatError, magic, binaryVersion
+from style_codec.codecs import styleCodec, multiPadCodec
+from style_codec.columns import EventColumns
+from style_codec.yamlex import dumpYaml, loadYaml
+
+from conftest import getSampleStyleData, getSamplePadData
+
+
+def yamlRoundTrip(data):
+    return loadYaml(dumpYaml(data))
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def testStyleMatchesYaml(compact):
+    style = Style(style=styleCodec.parse(getSampleStyleData()), compact=compact)
+    style._implodeAll()
+
+    assert loadBinary(dumpBinary(style._style)) == yamlRoundTrip(style._style)
+
+
+def testRawStyleMatchesYaml():
+    data = styleCodec.parse(getSampleStyleData(1))
+    assert loadBinary(dumpBinary(data)) == yamlRoundTrip(data)
+
+
+def testMultiPadMatchesYaml():
+    pad = MultiPad(multiPadCodec.parse(getSamplePadData()))
+    assert loadBinary(dumpBinary(pad._data)) == yamlRoundTrip(pad._data)
+
+
+def testFiles(tmp_path):
+    binFn = str(tmp_path / 'sample.bin')
+    ymlFn = str(tmp_path / 'sample.yml')
+    style = RawStyle(style=styleCodec.parse(getSampleStyleData()))
+    style.saveAsBin(binFn)
+    style.saveAsYml(ymlFn)
+
+    assert RawStyle.fromBin(binFn)._style == RawStyle.fromYml(ymlFn)._style
+    assert styleCodec.build(Style.fromBin(binFn)._style) == getSampleStyleData()
+
+
+def testSharedPayloads():
+    # Looping repeats the rows of the sysex event, all of them refer to the same payload
+    events = [
+        {'time': 0, 'command': 'sysex', 'data': [0x43, 0x10, 0x4c]},
+        {'time': 10, 'command': 'on', 'channel': 1, 'note': 60, 'velocity': 100},
+        {'time': 20, 'command': 'meta-text', 'value': 'x'}
+    ]
+    columns = EventColumns.fromEvents(events).loop(100, 400)
+    assert len(columns) == 12 and len(columns.payloads) == 2
+
+    loaded = loadBinary(dumpBinary({'events': columns}))['events']
+    assert loaded == yamlRoundTrip(columns.toEvents())
+
+    # Every event has its own copy of the payload
+    loaded[0]['data'][0] = 0
+    assert [event['data'][0] for event in loaded if event['command'] == 'sysex'] == [0, 0x43, 0x43, 0x43]
+
+
+def testTimesBeyondInt32():
+    events = [{'time': 0, 'command': 'on', 'note': 60, 'velocity': 100}, {'time': 1 << 33, 'command': 'off', 'note': 60, 'velocity': 0}]
+    columns = EventColumns.fromEvents(events)
+
+    assert loadBinary(dumpBinary(columns)) == events
+    assert loadBinary(dumpBinary(events)) == events
+
+
+def testBadMagic():
+    data = bytearray(dumpBinary({'a': 1}))
+    data[0:4] = b'XXXX'
+    with pytest.raises(BinaryFormatError, match='Not a binary style file'):
+        loadBinary(bytes(data))
+
+
+def testWrongVersion():
+    data = bytearray(dumpBinary({'a': 1}))
+    data[4:6] = struct.pack('<H', binaryVersion + 1)
+    with pytest.raises(BinaryFormatError, match='Unsupported binary format version'):
+        loadBinary(bytes(data))
+
+
+def testTruncated():
+    data = dumpBinary(styleCodec.parse(getSampleStyleData()))
+    for length in [0, 3, len(magic) + 1, 10, len(data) // 2, len(data) - 1]:
+        with pytest.raises(BinaryFormatError):
+            loadBinary(data[:length])
+
+
+def testTrailingData():
+    with pytest.raises(BinaryFormatError, match='Unexpected data after the end'):
+        loadBinary(dumpBinary({'a': 1}) + b'\0')
+
+
+def testUnsupportedValue():
+    with pytest.raises(BinaryFormatError):
+        dumpBinary({'a': object()})
@@ -0,0 +1,145 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from style_codec import cache as cacheModule
+from style_codec import RawStyle, parseCache
+from style_codec.cache import ParseCache
+from style_codec.codecs import styleCodec
+
+from conftest import getSampleStyleData
+
+
+class CountingParse(object):
+    def __init__(self, parse=styleCodec.parse):
+        self.parse = parse
+        self.calls = 0
+
+    def __call__(self, data):
+        self.calls += 1
+        return self.parse(data)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ParseCache(directory=str(tmp_path / 'cache'), enabled=True)
+
+
+@pytest.mark.parametrize('value, enabled', [(None, 'False'), ('0', 'False'), ('1', 'True')])
+def testDefaultCache(value, enabled):
+    env = {key: val for key, val in os.environ.items() if key != 'STYLE_CODEC_CACHE'}
+    if value is not None:
+        env['STYLE_CODEC_CACHE'] = value
+    result = subprocess.run([sys.executable, '-c', 'import style_codec; print(style_codec.parseCache.enabled)'],
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(cacheModule.__file__))), env=env, capture_output=True, text=True, check=True)
+
+    assert result.stdout.strip() == enabled
+
+
+def testMissThenHit(cache):
+    data = getSampleStyleData()
+    parse = CountingParse()
+
+    first = cache.parse(data, 'style', parse)
+    second = cache.parse(data, 'style', parse)
+
+    assert parse.calls == 1
+    assert second == first == styleCodec.parse(data)
+    assert cache.stats()['entries'] == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def testDisabled(tmp_path):
+    cache = ParseCache(directory=str(tmp_path / 'cache'), enabled=False)
+    parse = CountingParse()
+    cache.parse(getSampleStyleData(), 'style', parse)
+    cache.parse(getSampleStyleData(), 'style', parse)
+
+    assert parse.calls == 2
+    assert not os.path.exists(cache.directory)
+
+
+def testContentChange(cache):
+    parse = CountingParse()
+    cache.parse(getSampleStyleData(0), 'style', parse)
+
+    assert cache.parse(getSampleStyleData(1), 'style', parse) == styleCodec.parse(getSampleStyleData(1))
+    assert parse.calls == 2
+
+
+def testKindAndVersionChange(cache, monkeypatch):
+    data = getSampleStyleData()
+    parse = CountingParse()
+    cache.parse(data, 'style', parse)
+    cache.parse(data, 'other', parse)
+    assert parse.calls == 2
+
+    monkeypatch.setattr(cacheModule, 'codecVersion', cacheModule.codecVersion + 1)
+    cache.parse(data, 'style', parse)
+    assert parse.calls == 3
+
+
+@pytest.mark.parametrize('content', [b'', b'garbage', b'\x80\x05\x95'])
+def testCorruptEntry(cache, content):
+    data = getSampleStyleData()
+    parse = CountingParse()
+    cache.parse(data, 'style', parse)
+
+    path = cache._path(cache.key(data, 'style'))
+    with open(path, 'wb') as f:
+        f.write(content)
+
+    # The entry is dropped and the data parsed again
+    assert cache.parse(data, 'style', parse) == styleCodec.parse(data)
+    assert parse.calls == 2
+    assert cache.parse(data, 'style', parse) == styleCodec.parse(data)
+    assert parse.calls == 2
+
+
+def testEviction(tmp_path):
+    styles = [getSampleStyleData(seed) for seed in range(6)]
+    probe = ParseCache(directory=str(tmp_path / 'probe'), enabled=True)
+    probe.parse(styles[0], 'style', styleCodec.parse)
+    entrySize = probe.size()
+
+    cache = ParseCache(directory=str(tmp_path / 'cache'), maxSize=int(entrySize * 3.5), enabled=True)
+    for data in styles[:3]:
+        cache.parse(data, 'style', styleCodec.parse)
+    # Used recently, so it survives the eviction
+    os.utime(cache._path(cache.key(styles[0], 'style')), ns=(2 ** 62, 2 ** 62))
+
+    for data in styles[3:]:
+        cache.parse(data, 'style', styleCodec.parse)
+
+    assert cache.size() <= cache.maxSize
+    assert cache._size == cache.size()
+    remaining = {path for _, _, path in cache._entries()}
+    assert cache._path(cache.key(styles[0], 'style')) in remaining
+    assert cache._path(cache.key(styles[5], 'style')) in remaining
+    assert cache._path(cache.key(styles[1], 'style')) not in remaining
+
+
+def testDirectoryScannedRarely(cache, monkeypatch):
+    # Writing entries below the size limit scans the directory once, not on every write
+    scans = []
+    entries = ParseCache._entries
+    monkeypatch.setattr(ParseCache, '_entries', lambda self: scans.append(1) or entries(self))
+
+    for seed in range(20):
+        cache.parse(getSampleStyleData(seed), 'style', styleCodec.parse)
+
+    assert len(scans) == 1
+    assert cache._size == cache.size()
+
+
+def testRawStyleUsesCache(tmpStyle, monkeypatch, tmp_path):
+    monkeypatch.setattr(parseCache, 'enabled', True)
+    monkeypatch.setattr(parseCache, 'directory', str(tmp_path / 'cache'))
+    monkeypatch.setattr(parseCache, '_size', None)
+
+    first = RawStyle.fromSty(tmpStyle)._style
+    hits = parseCache.hits
+    assert RawStyle.fromSty(tmpStyle)._style == first
+    assert parseCache.hits == hits + 1
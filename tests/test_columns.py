@@ -0,0 +1,110 @@
+import os
+
+import pytest
+
+from style_codec import Style, clone
+from style_codec.columns import EventColumns, CompactChannels, peekEvents
+
+from conftest import getSampleStyle
+
+
+def editStyle(style):
+    # The operations with code paths of their own for EventColumns
+    style.createEnding('Main A', 'Ending A', sourceLength=1920, sourceStartBeat=0, endStartBeat=1, destNoOfBeats=2)
+    style.transposeChannel(3, 'e', 'min')
+    style.setEvents(5, 2, [{'time': 0, 'command': 'on', 'note': 60, 'velocity': 100}, {'time': 900, 'command': 'off', 'note': 60, 'velocity': 0}], trackSections=['Main B'])
+    style.deleteChannels([7], trackSections=['Main C'])
+
+
+def saveAll(style, directory):
+    outputs = {}
+    for ext, save in [('sty', style.saveAsSty), ('yml', style.saveAsYml), ('json', style.saveAsJson), ('bin', style.saveAsBin)]:
+        fn = os.path.join(directory, 'style.' + ext)
+        save(fn)
+        with open(fn, 'rb') as f:
+            outputs[ext] = f.read()
+    return outputs
+
+
+@pytest.mark.parametrize('edit', [False, True])
+def testCompactOutput(tmpStyle, tmp_path, edit):
+    outputs = []
+    for compact in (False, True):
+        style = Style.fromSty(tmpStyle, compact=compact)
+        assert isinstance(style.trackSections['Main A']['channels'], CompactChannels) == compact
+        if edit:
+            editStyle(style)
+
+        directory = tmp_path / str(compact)
+        directory.mkdir()
+        outputs.append(saveAll(style, str(directory)))
+
+    assert outputs[0] == outputs[1]
+    if not edit:
+        assert outputs[0]['sty'] == open(tmpStyle, 'rb').read()
+
+
+def testLazyConversion(tmpStyle):
+    style = Style.fromSty(tmpStyle, compact=True)
+    channels = style.trackSections['Main A']['channels']
+    columns = peekEvents(channels, 'channel3')
+    assert isinstance(columns, EventColumns)
+    assert all(isinstance(peekEvents(channels, channelId), EventColumns) for channelId in channels.keys() if channelId != 'common')
+
+    # Indexing converts the channel to a list once, which is kept and can be modified, the other channels stay columns
+    events = channels['channel3']
+    assert isinstance(events, list) and events == columns.toEvents()
+    assert channels['channel3'] is events and peekEvents(channels, 'channel3') is events
+    assert isinstance(peekEvents(channels, 'channel4'), EventColumns)
+
+    events[0]['velocity'] = 1
+    assert style.trackSections['Main A']['channels']['channel3'][0]['velocity'] == 1
+
+
+def testRoundTrip():
+    style = getSampleStyle()
+    for trackSection in style.trackSections.values():
+        for channelId, events in trackSection['channels'].items():
+            columns = EventColumns.fromEvents(events)
+            assert columns is not None and len(columns) == len(events)
+            assert columns.toEvents() == events == list(columns)
+
+
+def testPayloadsAreCopied():
+    columns = EventColumns.fromEvents([{'time': 0, 'command': 'sysex', 'data': [1, 2, 3]}])
+    event = columns.event(0)
+    event['data'].append(4)
+    assert columns.event(0)['data'] == [1, 2, 3]
+
+
+@pytest.mark.parametrize('events', [
+    [{'time': 0, 'command': 'on', 'note': 300, 'velocity': 1}],
+    [{'command': 'sysex', 'data': [1]}]
+])
+def testUnrepresentable(events):
+    assert EventColumns.fromEvents(events) is None
+    assert CompactChannels.fromChannels({'channel0': events}).peek('channel0') is events
+
+
+def testUnusualKeys():
+    # Kept as a payload row with the keys in their order
+    events = [{'time': 0, 'command': 'on', 'note': 60, 'velocity': 1, 'extra': 1}, {'time': 1, 'command': 'text', 'text': 'x'}]
+    assert EventColumns.fromEvents(events).toEvents() == events
+
+
+def testLoopLikeLists():
+    events = [{'time': time, 'command': 'on', 'note': 60, 'velocity': 100} for time in (0, 100, 250)]
+    events.append({'time': 260, 'command': 'sysex', 'data': [1]})
+    columns = EventColumns.fromEvents(events)
+    listStyle = Style()
+    compactStyle = Style(compact=True)
+
+    for loopLength, targetLength in [(300, 1000), (300, 300), (300, 100), (400, 1300)]:
+        expected = listStyle._loopEvents(clone(events), loopLength, targetLength)
+        assert columns.loop(loopLength, targetLength).toEvents() == expected
+        assert compactStyle._loopEvents(events, loopLength, targetLength).toEvents() == expected
+
+
+def testSortedByTimeIsStable():
+    events = [{'time': time, 'command': 'on', 'note': note, 'velocity': 1} for time, note in [(5, 1), (0, 2), (5, 3), (0, 4)]]
+    assert EventColumns.fromEvents(events).sortedByTime().toEvents() == sorted(events, key=lambda event: event['time'])
@@ -0,0 +1,229 @@
+import asyncio
+import math
+
+import pytest
+
+from style_codec.codecs import beatResolution
+from style_codec.engine import PlaybackEngine
+from style_codec.playback import RecordingMidiOut
+
+from conftest import getSampleStyle
+
+# 120 bpm, one bar of the sample style is 2 s
+ticksPerSecond = 120 / 60 * beatResolution
+barLength = 4 * beatResolution
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    # Event loop whose time jumps to the next timer instead of waiting for it, the tests run instantly and always
+    # see the same times
+    def __init__(self):
+        super().__init__()
+        self.now = 0.0
+        select = self._selector.select
+
+        def virtualSelect(timeout=None):
+            if timeout:
+                self.now += timeout
+            return select(None if timeout is None else 0)
+
+        self._selector.select = virtualSelect
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def loop():
+    loop = VirtualTimeLoop()
+    yield loop
+    loop.close()
+
+
+def createEngine(loop, **kwargs):
+    clock = lambda: round(loop.time() * 1e9)
+    return PlaybackEngine(getSampleStyle(), midiOut=RecordingMidiOut(clock), clock=clock, **kwargs)
+
+
+def play(loop, engine, actions):
+    # Runs the engine without the Prologue/SInt and calls the actions at their times in seconds, the last one has to
+    # end the playback
+    async def drive():
+        task = asyncio.ensure_future(engine.run(init=False))
+        for seconds, action in actions:
+            await asyncio.sleep(seconds - loop.time())
+            action(task)
+        return await task
+
+    return loop.run_until_complete(drive())
+
+
+def getTick(ns):
+    return round(ns * ticksPerSecond / 1e9)
+
+
+def getMessages(engine):
+    return [(getTick(ns), message) for ns, message in engine.midiOut.messages]
+
+
+def getExpected(engine, passes, stopTick):
+    # The messages of the (track section, key, chord) passes played one after another, up to stopTick
+    expected = []
+    start = 0
+    for trackSection, key, chord, fromTick in passes:
+        buffer = engine.style.compilePlayback([trackSection], key=key, chord=chord)
+        expected += [(start + tick, message) for tick, message in buffer.messages if fromTick <= start + tick < stopTick]
+        start += buffer.length
+    return expected
+
+
+def splitFinal(engine, messages):
+    # Separates the messages sent when playback ends: note offs and all notes off on every channel
+    end = len(messages) - 16
+    assert [message for _, message in messages[end:]] == [bytes((0xb0 | channel, 123, 0)) for channel in range(16)]
+    while end and messages[end - 1][1][0] & 0xf0 == 0x80 and messages[end - 1][0] == messages[-1][0]:
+        end -= 1
+    return messages[:end], messages[end:]
+
+
+def getSounding(messages):
+    sounding = set()
+    for _, message in messages:
+        kind, channel = message[0] & 0xf0, message[0] & 0x0f
+        if kind == 0x90 and message[2]:
+            sounding.add((channel, message[1]))
+        elif kind in (0x80, 0x90):
+            sounding.discard((channel, message[1]))
+        elif kind == 0xb0 and message[1] == 123:
+            sounding = {note for note in sounding if note[0] != channel}
+    return sounding
+
+
+def assertNoHangingNotes(engine):
+    assert not getSounding(engine.midiOut.messages)
+    assert not engine.activeNotes
+
+
+def stop(engine):
+    return lambda task: engine.stop()
+
+
+def testPlaysInLoop(loop):
+    engine = createEngine(loop)
+    stats = play(loop, engine, [(5.01, stop(engine))])
+
+    stopTick = math.ceil(5.01 * ticksPerSecond)
+    played, _ = splitFinal(engine, getMessages(engine))
+    assert played == getExpected(engine, [('Main A', 'c', 'Maj7', 0)] * 3, stopTick)
+    assert [stat.events for stat in stats[:2]] == [len(engine.style.compilePlayback(['Main A']).messages)] * 2
+    assertNoHangingNotes(engine)
+
+
+def testSwitchSectionAtBar(loop):
+    engine = createEngine(loop)
+    play(loop, engine, [(1.0, lambda task: engine.switchSection('Main B')), (5.01, stop(engine))])
+
+    played, _ = splitFinal(engine, getMessages(engine))
+    assert played == getExpected(engine, [('Main A', 'c', 'Maj7', 0), ('Main B', 'c', 'Maj7', 0), ('Main B', 'c', 'Maj7', 0)], math.ceil(5.01 * ticksPerSecond))
+    assertNoHangingNotes(engine)
+
+
+def testSwitchToEmptySection(loop):
+    # Rejected in the caller, the engine keeps playing
+    engine = createEngine(loop)
+
+    def switch(task):
+        with pytest.raises(ValueError, match='empty'):
+            engine.switchSection('Epilogue')
+        with pytest.raises(KeyError):
+            engine.switchSection('Main D')
+
+    play(loop, engine, [(1.0, switch), (3.01, stop(engine))])
+
+    played, _ = splitFinal(engine, getMessages(engine))
+    assert played == getExpected(engine, [('Main A', 'c', 'Maj7', 0)] * 2, math.ceil(3.01 * ticksPerSecond))
+
+
+def testSetChordAtBeat(loop):
+    engine = createEngine(loop)
+    play(loop, engine, [(0.3, lambda task: engine.setChord('c', 'min')), (2.51, stop(engine))])
+
+    # The notes of the first beat end before it, the rest of the bar and the next one are played in C minor
+    beat = beatResolution
+    played, _ = splitFinal(engine, getMessages(engine))
+    assert played == getExpected(engine, [('Main A', 'c', 'Maj7', 0)], beat) + \
+        getExpected(engine, [('Main A', 'c', 'min', beat), ('Main A', 'c', 'min', 0)], math.ceil(2.51 * ticksPerSecond))
+    assert played != getExpected(engine, [('Main A', 'c', 'Maj7', 0)] * 2, math.ceil(2.51 * ticksPerSecond))
+    assertNoHangingNotes(engine)
+
+
+def getTimes(engine, fromNs, toNs):
+    return sorted({ns for ns, _ in engine.midiOut.messages if fromNs <= ns < toNs})
+
+
+def testSetTempoAtBeat(loop):
+    engine = createEngine(loop)
+    play(loop, engine, [(0.3, lambda task: engine.setTempo(240)), (1.01, stop(engine))])
+
+    # The first beat at 120 bpm, the rest at 240 bpm from 0.5 s on
+    beat = beatResolution
+    stopTick = beat + math.ceil(0.51 * 2 * ticksPerSecond)
+    ticks = sorted({tick for tick, _ in getExpected(engine, [('Main A', 'c', 'Maj7', 0)], stopTick)})
+    expected = [round(tick / ticksPerSecond * 1e9) if tick <= beat else 500000000 + round((tick - beat) / ticksPerSecond / 2 * 1e9) for tick in ticks]
+    assert getTimes(engine, 0, 1010000000) == expected
+    assert engine.tempo == 240
+
+
+def testSetTempoNowAfterPause(loop):
+    # Rebased at the time of the command rather than at the last event sent before it
+    engine = createEngine(loop)
+    play(loop, engine, [(0.13, lambda task: engine.setTempo(240, at='now')), (0.51, stop(engine))])
+
+    tick = math.ceil(0.13 * ticksPerSecond)
+    nextTick = min(entry[0] for entry in getExpected(engine, [('Main A', 'c', 'Maj7', 0)], barLength) if entry[0] >= tick)
+    assert nextTick - tick > 100
+    assert getTimes(engine, 130000000, 510000000)[0] == round(tick / ticksPerSecond * 1e9) + round((nextTick - tick) / ticksPerSecond / 2 * 1e9)
+
+
+def testMute(loop):
+    # A channel with a note sounding when it is muted at 0.3 s
+    engine = createEngine(loop)
+    muteTick, unmuteTick, stopTick = (math.ceil(seconds * ticksPerSecond) for seconds in (0.3, 1.2, 1.51))
+    expected = getExpected(engine, [('Main A', 'c', 'Maj7', 0)], stopTick)
+    channel, note = min(getSounding(entry for entry in expected if entry[0] < muteTick))
+
+    play(loop, engine, [(0.3, lambda task: engine.mute(channel)), (1.2, lambda task: engine.unmute(channel)), (1.51, stop(engine))])
+
+    played, _ = splitFinal(engine, getMessages(engine))
+    assert [entry for entry in played if entry[1][0] & 0x0f != channel] == [entry for entry in expected if entry[1][0] & 0x0f != channel]
+
+    # The sounding note is turned off when muting, nothing is sent until unmuting
+    assert [entry for entry in played if entry[1][0] & 0x0f == channel] == \
+        [entry for entry in expected if entry[1][0] & 0x0f == channel and entry[0] < muteTick] + [(muteTick, bytes((0x80 | channel, note, 0)))] + \
+        [entry for entry in expected if entry[1][0] & 0x0f == channel and entry[0] >= unmuteTick]
+    assertNoHangingNotes(engine)
+
+
+def testStopWhileNotesSound(loop):
+    engine = createEngine(loop)
+    play(loop, engine, [(0.3, stop(engine))])
+
+    played, final = splitFinal(engine, getMessages(engine))
+    assert played == getExpected(engine, [('Main A', 'c', 'Maj7', 0)], math.ceil(0.3 * ticksPerSecond))
+    sounding = getSounding(played)
+    assert len(sounding) > 8
+    assert [(message[0] & 0x0f, message[1]) for _, message in final[:-16]] == sorted(sounding)
+    assert not engine.running
+    assertNoHangingNotes(engine)
+
+
+def testCancel(loop):
+    engine = createEngine(loop)
+    with pytest.raises(asyncio.CancelledError):
+        play(loop, engine, [(1.3, lambda task: task.cancel())])
+
+    played, final = splitFinal(engine, getMessages(engine))
+    assert played == getExpected(engine, [('Main A', 'c', 'Maj7', 0)], math.ceil(1.3 * ticksPerSecond))
+    assert len(final) > 16
+    assert not engine.running and engine.commands is None
+    assertNoHangingNotes(engine)
@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import style_codec
+from style_codec.benchmark import measureImportTime, importTimeBudget
+
+
+def testImportTimeBudget():
+    seconds, imports = measureImportTime(repeat=5)
+    slowest = ', '.join(f'{name} {cumulative * 1000:.1f} ms' for name, _, cumulative in imports[:5])
+
+    assert seconds <= importTimeBudget, f'import style_codec took {seconds * 1000:.1f} ms (budget {importTimeBudget * 1000:.0f} ms): {slowest}'
+
+
+def testBareImportSkipsPlaybackAndYaml():
+    code = 'import sys, style_codec; print(" ".join(name for name in ("rtmidi", "style_codec.playback", "style_codec.engine", "yaml", "style_codec.referencecodecs") if name in sys.modules))'
+    result = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.dirname(os.path.abspath(style_codec.__file__))), capture_output=True, text=True, check=True)
+
+    assert result.stdout.split() == []
+
+
+@pytest.mark.parametrize('name', sorted(style_codec._lazyAttributes))
+def testLazyAttributes(name):
+    assert getattr(style_codec, name) is not None
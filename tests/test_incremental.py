@@ -0,0 +1,153 @@
+import pytest
+
+from style_codec import Style, clone
+from style_codec.codecs import styleCodec
+
+from conftest import getSampleStyle, getSampleStyleData
+
+
+def loadIncremental(tmp_path, data, compact=False):
+    fn = tmp_path / 'input.sty'
+    fn.write_bytes(data)
+    style = Style.fromSty(str(fn), compact=compact, incremental=True)
+    assert style._chunkCache is not None
+    return style
+
+
+def assertSavedLikeFullBuild(style, tmp_path):
+    # Saves twice (the second save reuses what the first one encoded) and compares with styleCodec.build
+    cache = style._chunkCache
+    assert cache.build(style) is not None, 'fell back to the full build'
+
+    saved = []
+    for idx in range(2):
+        fn = tmp_path / f'saved{idx}.sty'
+        style.saveAsSty(str(fn))
+        saved.append(fn.read_bytes())
+
+    style._chunkCache = None
+    style._implodeAll()
+    expected = styleCodec.build(style._style)
+    style._chunkCache = cache
+
+    assert saved == [expected, expected]
+    return expected
+
+
+@pytest.fixture(params=[False, True], ids=['lists', 'compact'])
+def style(request, tmp_path):
+    return loadIncremental(tmp_path, getSampleStyleData(), compact=request.param)
+
+
+def testUnchanged(style, tmp_path):
+    assert assertSavedLikeFullBuild(style, tmp_path) == getSampleStyleData()
+
+
+def testDefaultIsNotIncremental(tmpStyle):
+    assert Style.fromSty(tmpStyle)._chunkCache is None
+
+
+def testEditedTrackSection(style, tmp_path):
+    channels = style.trackSections['Main B']['channels']
+    channels['channel3'][0]['velocity'] = 1
+    channels['channel4'] = channels['channel4'][:-1]
+    original = assertSavedLikeFullBuild(style, tmp_path)
+
+    style.transposeChannel(5, 'd', 'min')
+    assert assertSavedLikeFullBuild(style, tmp_path) != original
+
+
+def testEditedTrackSectionLength(style, tmp_path):
+    style.trackSections['Main A']['length'] += 480
+    assertSavedLikeFullBuild(style, tmp_path)
+
+
+def testStyleMethods(style, tmp_path):
+    style.setupChannel(9, 'Bass', 0, 0, 33, bass=True)
+    style.deleteChannels([10])
+    style.createEnding('Main A', 'Ending C')
+    style.deleteTrackSections(['Main C'])
+    assertSavedLikeFullBuild(style, tmp_path)
+
+
+def testEditedCasm(style, tmp_path):
+    style.casm['Main A'][2]['name'] = 'Edited'
+    assertSavedLikeFullBuild(style, tmp_path)
+
+
+def testEditedOts(style, tmp_path):
+    style.addOTS(right1={'enabled': True, 'program': 5})
+    assertSavedLikeFullBuild(style, tmp_path)
+
+    style.ots[0][1]['program'] = 7
+    assertSavedLikeFullBuild(style, tmp_path)
+
+
+@pytest.mark.parametrize('key, index', [('meta-smpte-offset', 0), ('sysex', 3), ('meta', 1)])
+def testInPlaceNestedEdit(style, tmp_path, key, index):
+    original = assertSavedLikeFullBuild(style, tmp_path)
+
+    event = next(event for event in style.trackSections['SInt']['channels']['common'] if event['command'] == key)
+    values = event['value'] if key == 'meta-smpte-offset' else event['data']
+    values[index] ^= 1
+
+    assert assertSavedLikeFullBuild(style, tmp_path) != original
+
+
+def getDuplicateMainA(structure):
+    midi = structure[0]
+    duplicate = clone(next(trackSection for trackSection in midi['track-sections'] if trackSection['name'] == 'Main B'))
+    duplicate['name'] = 'Main A'
+    duplicate['channels']['common'][0]['value'] = 'Main A'
+    return duplicate
+
+
+def testDuplicateTrackSections(tmp_path):
+    # Two Main A sections, the style keeps the second one
+    structure = getSampleStyle()._style
+    structure[0]['track-sections'].insert(-1, getDuplicateMainA(structure))
+
+    style = loadIncremental(tmp_path, styleCodec.build(structure))
+    assertSavedLikeFullBuild(style, tmp_path)
+
+    style.trackSections['Main A']['channels']['channel1'][0]['note'] += 1
+    assertSavedLikeFullBuild(style, tmp_path)
+
+
+def testSectionAfterEndOfTrack(tmp_path):
+    # The second Main A follows the end of track, it has no length and its events do not fit, so the style needs the
+    # full build. The first Main A must not be reused for it.
+    structure = getSampleStyle()._style
+    structure[0]['track-sections'].append(getDuplicateMainA(structure))
+
+    style = loadIncremental(tmp_path, styleCodec.build(structure))
+    assert 'Main A' not in style._chunkCache.spans
+    assert style._chunkCache.build(style) is None
+
+    fn = tmp_path / 'saved.sty'
+    style.saveAsSty(str(fn))
+    style._chunkCache = None
+    style._implodeAll()
+    assert fn.read_bytes() == styleCodec.build(style._style)
+
+
+def testDuplicateChunks(tmp_path):
+    # Styles with two CASM and two OTS chunks are merged, both are encoded anew
+    structure = getSampleStyle()._style
+    data = styleCodec.build(structure + [clone(structure[1]), clone(structure[2])])
+
+    style = loadIncremental(tmp_path, data)
+    assert style._chunkCache.casm is None and style._chunkCache.ots is None
+    assertSavedLikeFullBuild(style, tmp_path)
+
+
+def testEventsOutsideOfSection(style, tmp_path):
+    # Events after the end of a modified track section need the full build
+    trackSection = style.trackSections['Main A']
+    trackSection['channels']['channel1'].append({'time': trackSection['length'] + 10, 'command': 'off', 'note': 60, 'velocity': 0})
+
+    assert style._chunkCache.build(style) is None
+    style.saveAsSty(str(tmp_path / 'saved.sty'))
+    style._chunkCache = None
+    style._implodeAll()
+    assert (tmp_path / 'saved.sty').read_bytes() == styleCodec.build(style._style)
@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+from style_codec import Style
+from style_codec.index import StyleIndex, extractMetadata
+
+
+def saveStyle(fn, name, tempo, sections=('Main A',), program=33, ntt='chord', mtime=None):
+    style = Style(name, tempo)
+    for section in sections:
+        style.createTrackSection(section, 4)
+    style.setupChannel(10, 'Bass', 0, 0, program, ntt=ntt)
+    style.setupChannel(11, 'Piano', 0, 112, 1)
+    style.saveAsSty(fn)
+
+    # The index compares size and mtime, a rewrite within the timer resolution must still count as a change
+    if mtime is not None:
+        os.utime(fn, ns=(mtime, mtime))
+
+
+@pytest.fixture
+def library(tmp_path):
+    directory = tmp_path / 'styles'
+    directory.mkdir()
+    saveStyle(str(directory / 'alpha.sty'), 'Alpha', 100)
+    saveStyle(str(directory / 'beta.prs'), 'Beta', 140, sections=('Main A', 'Main B'), program=5, ntt='melody')
+    (directory / 'notes.txt').write_text('not a style')
+    return directory
+
+
+def paths(rows):
+    return [os.path.basename(row[0]) for row in rows]
+
+
+def testExtractMetadata(library):
+    meta = extractMetadata(str(library / 'beta.prs'))
+    assert (meta['name'], meta['tempo'], meta['timeNum'], meta['timeDenom']) == ('Beta', 140, 4, 4)
+    assert meta['sections'] == [('Prologue', 0), ('SInt', 7680), ('Main A', 7680), ('Main B', 7680), ('Epilogue', 0)]
+    assert meta['voices'] == [('sint', 0, 10, 0, 0, 5), ('sint', 0, 11, 0, 112, 1)]
+    assert ('Main B', 10, 'ctb2', 'melody') in meta['nttRules']
+
+
+def testRefresh(library, tmp_path):
+    with StyleIndex(str(tmp_path / 'index.db')) as index:
+        indexed, unchanged, removed, failures, seconds = index.refresh([str(library)], workers=1)
+        assert (indexed, unchanged, removed, failures) == (2, 0, 0, [])
+        assert index.stats() == {'files': 2, 'errors': 0}
+
+        # Nothing to do the second time
+        assert index.refresh([str(library)], workers=1)[:4] == (0, 2, 0, [])
+
+        # Added, changed and deleted files
+        saveStyle(str(library / 'gamma.sty'), 'Gamma', 90)
+        saveStyle(str(library / 'alpha.sty'), 'Alpha', 120, mtime=os.stat(str(library / 'alpha.sty')).st_mtime_ns + 10 ** 9)
+        os.remove(str(library / 'beta.prs'))
+
+        assert index.refresh([str(library)], workers=1)[:4] == (2, 0, 1, [])
+        assert paths(index.query()) == ['alpha.sty', 'gamma.sty']
+        assert index.describe(str(library / 'alpha.sty'))['tempo'] == 120
+        assert index.describe(str(library / 'beta.prs')) is None
+
+        # The rows of the child tables of the replaced and removed files are gone
+        for table in ['sections', 'voices', 'nttRules']:
+            rows = index.db.execute(f'SELECT path, COUNT(*) FROM {table} GROUP BY path').fetchall()
+            assert sorted(os.path.basename(path) for path, count in rows) == ['alpha.sty', 'gamma.sty']
+        assert index.db.execute('SELECT COUNT(*) FROM sections').fetchone()[0] == 8
+
+
+def testFailures(library, tmp_path):
+    (library / 'broken.sty').write_bytes(b'MThd broken')
+
+    with StyleIndex(str(tmp_path / 'index.db')) as index:
+        indexed, unchanged, removed, failures, seconds = index.refresh([str(library)], workers=1)
+        assert indexed == 2 and len(failures) == 1 and failures[0][0].endswith('broken.sty')
+        assert index.stats() == {'files': 2, 'errors': 1}
+        assert index.describe(str(library / 'broken.sty'))['error'] is not None
+        assert 'broken.sty' not in paths(index.query())
+
+
+def testQuery(library, tmp_path):
+    with StyleIndex(str(tmp_path / 'index.db')) as index:
+        index.refresh([str(library)], workers=1)
+
+        assert index.query() == [(str(library / 'alpha.sty'), 'Alpha', 100, (4, 4)), (str(library / 'beta.prs'), 'Beta', 140, (4, 4))]
+        assert paths(index.query(tempo=(90, 110))) == ['alpha.sty']
+        assert paths(index.query(timeSignature=(4, 4))) == ['alpha.sty', 'beta.prs']
+        assert paths(index.query(timeSignature=(3, 4))) == []
+        assert paths(index.query(sections=['Main A', 'Main B'])) == ['beta.prs']
+        assert paths(index.query(voice=(0, 0, 33))) == ['alpha.sty']
+        assert paths(index.query(voice=(None, 112, None))) == ['alpha.sty', 'beta.prs']
+        assert paths(index.query(nttRule='melody')) == ['beta.prs']
+        assert paths(index.query(text='alp')) == ['alpha.sty']
+        assert paths(index.query(tempo=(90, 120), nttRule='chord')) == ['alpha.sty']
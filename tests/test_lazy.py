@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from style_codec import Style, LazyStyle
+
+from conftest import getSampleStyle
+
+
+def saveAll(style, directory):
+    outputs = {}
+    for ext, save in [('sty', style.saveAsSty), ('yml', style.saveAsYml), ('bin', style.saveAsBin)]:
+        fn = os.path.join(directory, 'style.' + ext)
+        save(fn)
+        with open(fn, 'rb') as f:
+            outputs[ext] = f.read()
+    return outputs
+
+
+@pytest.mark.parametrize('mapped', [False, True])
+def testMatchesFullParse(tmpStyle, mapped):
+    style = Style.fromSty(tmpStyle, cached=False)
+    lazy = Style.fromSty(tmpStyle, lazy=True, mapped=mapped)
+    assert isinstance(lazy, LazyStyle)
+
+    assert list(lazy.trackSections.keys()) == list(style.trackSections.keys())
+    assert not any(lazy.trackSections.isDecoded(name) for name in lazy.trackSections.keys())
+    for name in style.trackSections:
+        assert lazy.trackSections[name] == style.trackSections[name]
+    assert lazy.casm == style.casm
+    assert lazy.ots == style.ots
+
+
+@pytest.mark.parametrize('mapped', [False, True])
+def testDecodesOnFirstAccess(tmpStyle, mapped):
+    lazy = Style.fromSty(tmpStyle, lazy=True, mapped=mapped)
+    assert lazy._casm is None and lazy._ots is None
+
+    lazy.trackSections['Main B']
+    assert lazy.trackSections.isDecoded('Main B') and not lazy.trackSections.isDecoded('Main A')
+
+    # The parsed chunks are not kept once exploded
+    lazy.casm, lazy.ots
+    assert lazy._casm is not None and lazy._ots is not None
+    assert '_style' not in vars(lazy)
+
+
+@pytest.mark.parametrize('mapped', [False, True])
+@pytest.mark.parametrize('compact', [False, True])
+def testSavesSameBytes(tmpStyle, tmp_path, mapped, compact):
+    (tmp_path / 'full').mkdir()
+    (tmp_path / 'lazy').mkdir()
+
+    full = saveAll(Style.fromSty(tmpStyle, cached=False), str(tmp_path / 'full'))
+    lazy = saveAll(Style.fromSty(tmpStyle, lazy=True, mapped=mapped, compact=compact), str(tmp_path / 'lazy'))
+
+    assert lazy == full
+    assert lazy['sty'] == open(tmpStyle, 'rb').read()
+
+
+@pytest.mark.parametrize('mapped', [False, True])
+def testSavesSameBytesAfterEdits(tmpStyle, tmp_path, mapped):
+    outputs = []
+    for lazy in (False, True):
+        style = Style.fromSty(tmpStyle, lazy=lazy, mapped=mapped, cached=False)
+        style.transposeChannel(4, 'g', 'Maj7', trackSections=['Main A'])
+        style.deleteTrackSections(['Main C'])
+        style.ots = []
+
+        directory = tmp_path / str(lazy)
+        directory.mkdir()
+        outputs.append(saveAll(style, str(directory)))
+
+    assert outputs[0] == outputs[1]
+
+
+def testSampleStyle(tmp_path):
+    fn = str(tmp_path / 'sample.sty')
+    getSampleStyle(3).saveAsSty(fn)
+    lazy = Style.fromSty(fn, lazy=True)
+    lazy.saveAsSty(str(tmp_path / 'lazy.sty'))
+    assert open(str(tmp_path / 'lazy.sty'), 'rb').read() == open(fn, 'rb').read()
@@ -0,0 +1,55 @@
+import pytest
+
+from style_codec import Style, MultiPad
+from style_codec.codecs import styleCodec, multiPadCodec
+from style_codec.mapped import mapFile, parseStyle, parsePad
+
+from conftest import getSampleStyleData, getSamplePadData
+
+
+@pytest.mark.parametrize('seed', range(5))
+def testParseStyle(seed):
+    data = getSampleStyleData(seed)
+    assert parseStyle(memoryview(data)) == styleCodec.parse(data)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def testParsePad(seed):
+    data = getSamplePadData(seed)
+    assert parsePad(memoryview(data)) == multiPadCodec.parse(data)
+
+
+def testIncompleteTrack():
+    # Like construct, the tracks end at the first chunk that is not a complete MTrk
+    data = getSamplePadData() + b'MTrk' + (100).to_bytes(4, 'big') + bytes(10)
+    assert parsePad(memoryview(data)) == multiPadCodec.parse(data)
+    assert len(parsePad(memoryview(data))['tracks']) == len(multiPadCodec.parse(getSamplePadData())['tracks'])
+
+
+def testInvalidPad():
+    with pytest.raises(Exception) as expected:
+        multiPadCodec.parse(b'MThd' + bytes(10))
+    with pytest.raises(type(expected.value)):
+        parsePad(memoryview(b'MThd' + bytes(10)))
+
+
+def testMapFile(tmp_path):
+    fn = tmp_path / 'style.sty'
+    fn.write_bytes(getSampleStyleData(1))
+    assert parseStyle(mapFile(str(fn))) == styleCodec.parse(fn.read_bytes())
+
+    empty = tmp_path / 'empty.sty'
+    empty.write_bytes(b'')
+    assert len(mapFile(str(empty))) == 0
+
+
+def testFromFile(tmp_path):
+    styleFn = str(tmp_path / 'style.sty')
+    padFn = str(tmp_path / 'pad.pad')
+    with open(styleFn, 'wb') as f:
+        f.write(getSampleStyleData(2))
+    with open(padFn, 'wb') as f:
+        f.write(getSamplePadData(2))
+
+    assert Style.fromSty(styleFn, mapped=True, cached=False)._style == Style.fromSty(styleFn, cached=False)._style
+    assert MultiPad.fromPad(padFn, mapped=True, cached=False)._data == MultiPad.fromPad(padFn, cached=False)._data
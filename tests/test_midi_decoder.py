@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+from style_codec.codecs import midiTrackCodec, referenceMidiTrackCodec
+
+from conftest import vlq, randomTrackData
+
+
+def track(data):
+    data = bytes(data)
+    return b'MTrk' + len(data).to_bytes(4, 'big') + data
+
+
+def parseBoth(data):
+    # The events of both codecs with the types of the values (Container equality ignores e.g. enum strings), or the
+    # exception types if they fail
+    results = []
+    for codec in (referenceMidiTrackCodec, midiTrackCodec):
+        try:
+            events = codec.parse(track(data))
+        except Exception as e:
+            results.append(type(e))
+        else:
+            results.append([(type(event), [(key, type(value), value) for key, value in event.items()]) for event in events])
+    return results
+
+
+cases = {
+    'notes': [0, 0x90, 60, 100, 10, 0x80, 60, 0, 0, 0xa3, 61, 5],
+    'running-status': [0, 0x91, 60, 100, 10, 62, 100, 10, 60, 0, 0, 0xb1, 7, 100, 5, 10, 64],
+    'running-status-after-meta': [0, 0x90, 60, 100, 0, 0xff, 0x06, 1, 0x41, 10, 60, 0],
+    'running-status-without-status': [0, 60, 100],
+    'cc-volume': [0, 0xb2, 7, 100],
+    'cc-bank-select-msb': [0, 0xb2, 0, 8],
+    'cc-bank-select-lsb': [0, 0xb2, 32, 1],
+    'cc-pan': [0, 0xb2, 10, 64],
+    'cc-reverb-level': [0, 0xb2, 91, 40],
+    'cc-chorus-level': [0, 0xb2, 93, 20],
+    'cc-all-notes-off': [0, 0xb2, 123, 0],
+    'cc-all-notes-off-with-value': [0, 0xb2, 123, 5],
+    'cc-generic': [0, 0xb2, 1, 5],
+    'program-change': [0, 0xc4, 33],
+    'pitch': [0, 0xe5, 0x00, 0x40],
+    'sysex': [0, 0xf0] + vlq(5) + [0x43, 0x10, 0x4c, 0x00, 0xf7],
+    'sysex-empty': [0, 0xf0, 1, 0xf7],
+    'sysex-long': [0, 0xf0] + vlq(301) + [0x11] * 300 + [0xf7],
+    'sysex-without-end': [0, 0xf0, 3, 0x43, 0x10, 0x4c],
+    'meta-sequence': [0, 0xff, 0x00, 2, 0, 1],
+    'meta-texts': [0, 0xff, 0x01, 2, 0x68, 0x69, 0, 0xff, 0x02, 1, 0x63, 0, 0xff, 0x03, 3] + list('héx'.encode()[:3]),
+    'meta-marker': [0, 0xff, 0x06, 6] + list(b'Main A'),
+    'meta-channel-prefix-port': [0, 0xff, 0x20, 1, 3, 0, 0xff, 0x21, 1, 0],
+    'meta-tempo': [0, 0xff, 0x51, 3, 0x07, 0xa1, 0x20],
+    'meta-smpte-offset': [0, 0xff, 0x54, 5, 1, 2, 3, 4, 5],
+    'meta-smpte-offset-bad-length': [0, 0xff, 0x54, 4, 1, 2, 3, 4],
+    'meta-time': [0, 0xff, 0x58, 4, 4, 2, 24, 8],
+    'meta-time-other-clocks': [0, 0xff, 0x58, 4, 4, 2, 12, 8],
+    'meta-key': [0, 0xff, 0x59, 2, 0xfe, 1],
+    'meta-key-bad-mode': [0, 0xff, 0x59, 2, 0xfe, 2],
+    'meta-eot': [0, 0xff, 0x2f, 0],
+    'meta-generic': [0, 0xff, 0x7f, 3, 1, 2, 3],
+    'meta-generic-empty': [0, 0xff, 0x10, 0],
+    'unknown-channel-pressure': [0, 0x90, 60, 100, 0, 0xd0, 5, 0, 0x80, 60, 0],
+    'unknown-system': [0, 0xf1, 1],
+    'truncated': [0, 0x90, 60],
+    'large-delta': vlq(0x0fffffff) + [0x90, 60, 100],
+}
+
+
+@pytest.mark.parametrize('name', sorted(cases))
+def testCase(name):
+    reference, fast = parseBoth(cases[name])
+    assert fast == reference
+
+
+def testFuzz():
+    rnd = random.Random(0)
+    mismatches = []
+    noOfEvents = 0
+
+    for _ in range(20000):
+        data = randomTrackData(rnd)
+        reference, fast = parseBoth(data)
+        if fast != reference:
+            mismatches.append(data.hex())
+        elif isinstance(reference, list):
+            noOfEvents += len(reference)
+
+    assert mismatches == []
+    assert noOfEvents > 50000
@@ -0,0 +1,271 @@
+from style_codec.codecs import beatResolution
+from style_codec.stream import iterEvents
+from style_codec.playback import TranspositionCache, PlaybackBuffer, Scheduler, RecordingMidiOut, LoopStats
+
+from conftest import getSampleStyle
+
+
+def setRule(style, channel, rule, fromChord='Maj7'):
+    for casm in style.casm.values():
+        casm[channel]['middle']['ntt']['rule'] = rule
+        casm[channel]['source-chord-type'] = fromChord
+
+
+def testSupportedChords():
+    style = getSampleStyle()
+    assert TranspositionCache(style).supportedChords('Main A') == ['Maj', 'Maj7', 'min']
+
+    # Melody tables from Maj only lead to Maj7
+    setRule(style, 0, 'melody', 'Maj')
+    assert TranspositionCache(style).supportedChords('Main A') == ['Maj7']
+    assert TranspositionCache(style, channels=[1, 2]).supportedChords('Main A') == ['Maj', 'Maj7', 'min']
+
+
+def testSupportedChordsUnsupportedRule():
+    # Channels without any table are not transposed, they do not empty the chords of the other channels
+    style = getSampleStyle()
+    setRule(style, 0, 'guitar')
+    setRule(style, 1, 'chord', 'dim')
+    setRule(style, 2, 'bypass')
+    cache = TranspositionCache(style)
+    assert cache.supportedChords('Main A') == ['Maj', 'Maj7', 'min']
+
+    cache.precompute(trackSections=['Main A'], keys=['c'])
+    assert len(cache.entries) == 3
+
+    setRule(style, 3, 'guitar')
+    assert TranspositionCache(style, channels=[0, 3]).supportedChords('Main A') == TranspositionCache(style, channels=[]).supportedChords('Main A')
+
+
+def testCachedStreams():
+    style = getSampleStyle()
+    cache = TranspositionCache(style)
+
+    for trackSection, key, chord in [('Main A', 'c', 'Maj7'), ('Main B', 'd', 'min'), ('Main A', 'f#', 'Maj')]:
+        assert cache.get(trackSection, key, chord) == style.getPlaybackEvents([trackSection], key=key, chord=chord)
+
+    compiled = TranspositionCache(style, channels=[0, 1], compiled=True, eot=False).get('Main A', 'd', 'min')
+    assert compiled.messages == style.compilePlayback(['Main A'], [0, 1], key='d', chord='min', eot=False).messages
+
+
+def testHitsAndMisses():
+    cache = TranspositionCache(getSampleStyle())
+    first = cache.get('Main A', 'c', 'min')
+    assert cache.get('Main A', 'c', 'min') is first
+    cache.get('Main A', 'd', 'min')
+    cache.get('Main A', 'c', 'min')
+
+    stats = cache.stats()
+    assert (stats['entries'], stats['hits'], stats['misses'], stats['evictions']) == (2, 2, 2, 0)
+    assert stats['hitRate'] == 0.5
+
+
+def testLeastRecentlyUsedEviction():
+    cache = TranspositionCache(getSampleStyle(), maxSize=2)
+    cache.get('Main A', 'c', 'Maj7')
+    cache.get('Main A', 'd', 'Maj7')
+    cache.get('Main A', 'c', 'Maj7')
+    cache.get('Main A', 'e', 'Maj7')
+
+    # d was used least recently
+    assert list(cache.entries) == [('Main A', 'c', 'Maj7'), ('Main A', 'e', 'Maj7')]
+    assert set(cache.sizes) == set(cache.entries)
+    assert cache.stats()['evictions'] == 1
+
+    cache.get('Main A', 'd', 'Maj7')
+    assert len(cache.entries) == 2
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 4, 2)
+
+
+def testMemorySize():
+    cache = TranspositionCache(getSampleStyle())
+    assert cache.memorySize() == 0
+
+    cache.get('Main A', 'c', 'Maj7')
+    single = cache.memorySize()
+    assert single > 0
+
+    cache.get('Main B', 'c', 'Maj7')
+    assert cache.memorySize() > single
+    assert cache.memorySize() == cache.stats()['memory'] == sum(cache.sizes.values())
+
+    cache.clear()
+    assert cache.memorySize() == 0 and not cache.entries
+
+
+def testPrecompute():
+    style = getSampleStyle()
+    cache = TranspositionCache(style, compiled=True)
+    cache.precompute(trackSections=['Main A'], keys=['c', 'g'])
+
+    assert len(cache.entries) == 2 * len(cache.supportedChords('Main A'))
+    assert cache.misses == len(cache.entries) and cache.hits == 0
+
+
+class FakeClock(object):
+    # Every reading advances the time by step ns, sleeping overshoots by overshoot ns
+    def __init__(self, step=1000, overshoot=2000000):
+        self.now = 10 ** 9
+        self.step = step
+        self.overshoot = overshoot
+        self.sleeps = []
+
+    def clock(self):
+        self.now += self.step
+        return self.now - self.step
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += round(seconds * 1e9) + self.overshoot
+
+
+def createScheduler(tempo=120):
+    fake = FakeClock()
+    # The recording reads the time without advancing it, so it sees the time the wait returned plus one step
+    midiOut = RecordingMidiOut(lambda: fake.now)
+    return fake, midiOut, Scheduler(midiOut, tempo, clock=fake.clock, sleep=fake.sleep)
+
+
+def getBuffer():
+    return PlaybackBuffer([(0, b'\x90\x3c\x40'), (0, b'\x91\x40\x40'), (960, b'\x80\x3c\x00'), (1900, b'\x81\x40\x00')], 2 * beatResolution)
+
+
+def getLateness(fake, midiOut, deadlines):
+    return [sent - fake.step - deadline for (sent, _), deadline in zip(midiOut.messages, deadlines)]
+
+
+def testSchedulerAbsoluteDeadlines():
+    fake, midiOut, scheduler = createScheduler()
+    buffer = getBuffer()
+    passes = [scheduler.play(buffer) for _ in range(3)]
+
+    nsPerTick = 60e9 / 120 / beatResolution
+    deadlines = [scheduler.startNs + round((loop * buffer.length + tick) * nsPerTick) for loop in range(3) for tick, _ in buffer.messages]
+    lateness = getLateness(fake, midiOut, deadlines)
+
+    # The sleep overshoot is never carried into the next deadline, the passes after the first one (which starts
+    # without sleeping) are equally late
+    assert all(0 <= value < fake.overshoot for value in lateness)
+    assert lateness[2:4] == lateness[6:8] == lateness[10:12]
+    assert lateness[4:8] == lateness[8:12]
+    assert [message for _, message in midiOut.messages] == [message for _, message in buffer.messages] * 3
+
+    for loop, stats in enumerate(passes):
+        values = lateness[loop * 4:loop * 4 + 4]
+        assert stats == LoopStats(4, max(values), sum(values) / 4)
+    assert scheduler.loopStats == passes
+
+    scheduler.finish()
+    assert fake.now >= scheduler.startNs + round(3 * buffer.length * nsPerTick)
+
+
+def testSchedulerSetTempo():
+    fake, midiOut, scheduler = createScheduler()
+    buffer = getBuffer()
+    scheduler.play(buffer)
+    scheduler.setTempo(240)
+    scheduler.play(buffer)
+
+    # The second pass starts where the first one ended at 120 bpm and runs twice as fast
+    passStart = scheduler.startNs
+    firstPass = [passStart - round(buffer.length * 60e9 / 120 / beatResolution) + round(tick * 60e9 / 120 / beatResolution) for tick, _ in buffer.messages]
+    secondPass = [passStart + round(tick * 60e9 / 240 / beatResolution) for tick, _ in buffer.messages]
+    lateness = getLateness(fake, midiOut, firstPass + secondPass)
+    assert all(0 <= value < fake.overshoot for value in lateness)
+    assert scheduler.tickOffset == buffer.length
+
+
+def testSchedulerSpinsShortWaits():
+    fake, midiOut, scheduler = createScheduler()
+    scheduler.play(PlaybackBuffer([(0, b'\x90\x3c\x40'), (1, b'\x80\x3c\x00')], 2))
+
+    # One tick is shorter than spinNs, it is busy waited
+    assert fake.sleeps == []
+    lateness = getLateness(fake, midiOut, [scheduler.startNs, scheduler.startNs + round(60e9 / 120 / beatResolution)])
+    assert all(0 <= value <= 2 * fake.step for value in lateness)
+
+
+def testSchedulerSysex():
+    fake, midiOut, scheduler = createScheduler()
+    buffer = PlaybackBuffer.fromEvents([
+        {'time': 0, 'command': 'sysex', 'data': [0x43, 0x10, 0x4c, 0, 0, 0x7e, 0]},
+        {'time': 10, 'command': 'on', 'channel': 0, 'note': 60, 'velocity': 100},
+        {'time': 10, 'command': 'meta-eot'}
+    ])
+    scheduler.play(buffer)
+
+    assert [message for _, message in midiOut.messages] == [bytes([0xf0, 0x43, 0x10, 0x4c, 0, 0, 0x7e, 0, 0xf7]), bytes([0x90, 60, 100])]
+    assert buffer.length == 20
+
+
+def getAbsoluteEvents(events, offset=0):
+    # Non-meta events with absolute times, as the compiled buffers keep them
+    absolute = []
+    time = offset
+    for event in events:
+        time += event['time']
+        if not event['command'].startswith('meta'):
+            absolute.append(dict(event, time=time))
+    return absolute, time
+
+
+def testSaveAsMidi(tmp_path):
+    style = getSampleStyle()
+    fn = str(tmp_path / 'sample.mid')
+    style.saveAsMidi(fn, trackSections=['Main A', 'Main B'], tempo=100, key='d', chord='min', loops=2)
+
+    events = [dict(event) for event in iterEvents(fn)]
+    assert events[0] == {'time': 0, 'command': 'meta-tempo', 'value': 600000}
+    assert events[-1]['command'] == 'meta-eot'
+
+    expected, time = getAbsoluteEvents(style.getPlaybackEvents(['Prologue', 'SInt'], eot=False, transpose=False))
+    for _ in range(2):
+        loopEvents, time = getAbsoluteEvents(style.getPlaybackEvents(['Main A', 'Main B'], key='d', chord='min'), time)
+        expected += loopEvents
+
+    assert events[1:-1] == expected
+    assert events[-1]['time'] == time
+    assert any(event['command'] == 'sysex' for event in expected)
+
+
+def testCompilePlayback():
+    style = getSampleStyle()
+    buffer = style.compilePlayback(['Main A'], [0, 3], key='g', chord='Maj')
+    expected, length = getAbsoluteEvents(style.getPlaybackEvents(['Main A'], [0, 3], key='g', chord='Maj'))
+
+    assert [tick for tick, _ in buffer.messages] == [event['time'] for event in expected]
+    assert buffer.length == length == style.trackSections['Main A']['length']
+    assert {message[0] & 0x0f for _, message in buffer.messages if message[0] < 0xf0} == {0, 3}
+
+
+def testSysexLength():
+    data = [0x43] + [n % 128 for n in range(200)]
+    buffer = PlaybackBuffer.fromEvents([{'time': 5, 'command': 'sysex', 'data': data}, {'time': 7, 'command': 'meta-eot'}])
+    track = bytes(buffer.toTrack())
+
+    # The length prefix (two bytes for 202) counts the data and 0xf7 but not 0xf0
+    assert track[8:] == bytes([5, 0xf0, 0x81, 0x4a] + data + [0xf7, 7, 0xff, 0x2f, 0])
+    assert int.from_bytes(track[4:8], 'big') == len(track) - 8
+
+
+def testTempo():
+    track = bytes(PlaybackBuffer([], 10).toTrack(tempo=90))
+    assert track[8:] == bytes([0, 0xff, 0x51, 3]) + (666667).to_bytes(3, 'big') + bytes([10, 0xff, 0x2f, 0])
+    assert bytes(PlaybackBuffer([], 10).toTrack())[8:] == bytes([10, 0xff, 0x2f, 0])
+
+
+def testRepeatAndExtend():
+    first = PlaybackBuffer([(0, b'\x90\x3c\x40'), (5, b'\x80\x3c\x00')], 8)
+    second = PlaybackBuffer([(1, b'\xc0\x01')], 3)
+
+    repeated = first.repeat(3)
+    assert repeated.messages == [(0, b'\x90\x3c\x40'), (5, b'\x80\x3c\x00'), (8, b'\x90\x3c\x40'), (13, b'\x80\x3c\x00'),
+                                 (16, b'\x90\x3c\x40'), (21, b'\x80\x3c\x00')]
+    assert repeated.length == 24
+    assert first.length == 8 and len(first) == 2
+
+    repeated.extend(second)
+    assert repeated.messages[-1] == (25, b'\xc0\x01')
+    assert repeated.length == 27
+    assert second.messages == [(1, b'\xc0\x01')]
+    assert PlaybackBuffer().repeat(2).length == 0
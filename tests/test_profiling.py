@@ -0,0 +1,90 @@
+import io
+import json
+import os
+import pstats
+
+import pytest
+
+from style_codec import Style
+from style_codec.profiling import Profiler, profiler, profileTo
+
+
+def convert(tmpStyle, tmp_path):
+    style = Style.fromSty(tmpStyle, cached=False)
+    style.saveAsSty(str(tmp_path / 'out.sty'))
+
+
+def testJson(tmpStyle, tmp_path, capsys):
+    fn = str(tmp_path / 'profile.json')
+    with profileTo(fn) as active:
+        assert active is profiler and profiler.enabled
+        convert(tmpStyle, tmp_path)
+    assert not profiler.enabled
+
+    with open(fn) as f:
+        report = json.load(f)
+
+    size = os.path.getsize(tmpStyle)
+    assert {'read', 'parse', 'build', 'write', 'casm-explode', 'track-sections-explode'} <= set(report['stages'])
+    assert all(stage['calls'] >= 1 and stage['seconds'] >= 0 for stage in report['stages'].values())
+    assert report['counters']['bytes-read'] == size
+    assert report['counters']['bytes-written'] == os.path.getsize(str(tmp_path / 'out.sty'))
+
+    # The summary goes to stderr
+    assert 'bytes-read' in capsys.readouterr().err
+
+
+def testCProfile(tmpStyle, tmp_path, capsys):
+    fn = str(tmp_path / 'profile.prof')
+    with profileTo(fn, format='cprofile', summary=False):
+        convert(tmpStyle, tmp_path)
+
+    out = io.StringIO()
+    pstats.Stats(fn, stream=out).print_stats('fromSty')
+    assert 'fromSty' in out.getvalue()
+    assert capsys.readouterr().err == ''
+
+
+def testDisabled(tmpStyle, tmp_path):
+    files = set(os.listdir(str(tmp_path)))
+    with profileTo(None) as active:
+        assert not active.enabled
+        convert(tmpStyle, tmp_path)
+    assert set(os.listdir(str(tmp_path))) - files <= {'out.sty'}
+
+    with pytest.raises(ValueError):
+        with profileTo(str(tmp_path / 'profile.txt'), format='text'):
+            pass
+
+
+def testWrittenOnError(tmp_path):
+    fn = str(tmp_path / 'profile.json')
+    with pytest.raises(RuntimeError):
+        with profileTo(fn, summary=False):
+            profiler.count('before-error', 2)
+            raise RuntimeError()
+
+    with open(fn) as f:
+        assert json.load(f)['counters'] == {'before-error': 2}
+    assert not profiler.enabled
+
+
+def testProfiler():
+    local = Profiler()
+    local.count('ignored')
+    with local.stage('ignored'):
+        pass
+    assert local.report() == {'stages': {}, 'counters': {}, 'events': {}}
+
+    local.enabled = True
+    timed = local.timed('double')(lambda value: 2 * value)
+    assert timed(3) == 6 and timed(4) == 8
+    local.countEvents('decoded', [{'command': 'on'}, {'command': 'off'}, {'command': 'on'}])
+    local.count('bytes', 5)
+    local.count('bytes', 6)
+
+    report = local.report()
+    assert report['stages']['double']['calls'] == 2
+    assert report['counters'] == {'bytes': 11}
+    assert report['events'] == {'decoded': {'on': 2, 'off': 1}}
+    assert list(report['events']['decoded']) == ['on', 'off']
@@ -0,0 +1,62 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from style_codec.codecs import styleCodec, multiPadCodec, midiTrackCodec, referenceStyleCodec, referenceMultiPadCodec, referenceMidiTrackCodec
+from style_codec.midi import encodeTrack
+
+from conftest import getSampleStyleData, getSamplePadData
+
+
+def getTrackData(seed):
+    # Notes and controllers on alternating channels, encoded with running status, so that a status leaking from one
+    # track into another changes the result
+    rnd = random.Random(seed)
+    events = []
+    for _ in range(rnd.randint(50, 200)):
+        command = rnd.choice(['on', 'off', 'cc', 'pitch'])
+        event = {'time': rnd.randint(0, 300), 'command': command, 'channel': rnd.choice([seed % 16, (seed + 1) % 16])}
+        if command in ('on', 'off'):
+            event.update(note=rnd.randint(0, 127), velocity=rnd.randint(0, 127))
+        elif command == 'cc':
+            event.update(controller=rnd.choice([1, 64, 71]), value=rnd.randint(0, 127))
+        else:
+            event.update(value=rnd.randint(0, 16383))
+        events.append(event)
+    events.append({'time': 0, 'command': 'meta-eot'})
+    return bytes(encodeTrack(events, runningStatus=True))
+
+
+def parseConcurrently(codec, inputs, rounds=5, workers=16):
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(codec.parse, inputs * rounds))
+
+
+@pytest.mark.parametrize('codec', [midiTrackCodec, referenceMidiTrackCodec], ids=['fast', 'reference'])
+def testTracksInThreads(codec):
+    tracks = [getTrackData(seed) for seed in range(40)]
+    serial = [codec.parse(data) for data in tracks]
+
+    assert parseConcurrently(codec, tracks) == serial * 5
+
+
+@pytest.mark.parametrize('codec', [styleCodec, referenceStyleCodec], ids=['fast', 'reference'])
+def testStylesInThreads(codec):
+    styles = [getSampleStyleData(seed) for seed in range(8)]
+    serial = [codec.parse(data) for data in styles]
+
+    assert parseConcurrently(codec, styles, rounds=3) == serial * 3
+
+
+@pytest.mark.parametrize('codec', [multiPadCodec, referenceMultiPadCodec], ids=['fast', 'reference'])
+def testPadsInThreads(codec):
+    pads = [getSamplePadData(seed) for seed in range(8)]
+    serial = [codec.parse(data) for data in pads]
+
+    assert parseConcurrently(codec, pads) == serial * 5
+
+
+def testFastEqualsReference():
+    tracks = [getTrackData(seed) for seed in range(40)]
+    assert parseConcurrently(midiTrackCodec, tracks, rounds=1) == [referenceMidiTrackCodec.parse(data) for data in tracks]
@@ -0,0 +1,83 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from style_codec import RawStyle
+from style_codec.server import getConversionAction, runRequest
+
+from conftest import getSamplePadData
+
+repoDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize('input, output, action', [
+    ('a.sty', 'a.yml', 'sty2yml'),
+    ('a.PRS', 'a', 'sty2yml'),
+    ('a.pad', 'a.yml', 'pad2yml'),
+    ('a.yml', 'a.sty', 'yml2sty'),
+    ('a.yaml', 'a.pad', 'yml2pad'),
+    ('a.txt', 'a.yml', None)
+])
+def testGetConversionAction(input, output, action):
+    assert getConversionAction(input, output) == action
+
+
+def testGetConversionActionDirectory(tmp_path):
+    assert getConversionAction(str(tmp_path), 'a.sty') == 'yml2sty'
+
+
+def testRunRequestSplit(tmpStyle, tmp_path):
+    directory = str(tmp_path / 'split')
+    assert runRequest('sty2yml', tmpStyle, directory, split=True)['ok']
+    assert os.path.isdir(directory)
+
+    output = str(tmp_path / 'out.sty')
+    assert runRequest('yml2sty', directory, output)['ok']
+    assert RawStyle.fromSty(output)._style == RawStyle.fromSty(tmpStyle)._style
+
+
+@pytest.mark.parametrize('action', ['yml2sty', 'pad2yml', 'yml2pad', 'metadata'])
+def testRunRequestSplitRejected(tmp_path, action):
+    response = runRequest(action, str(tmp_path / 'in'), str(tmp_path / 'out'), split=True)
+    assert not response['ok'] and 'split' in response['error']
+
+
+@pytest.mark.parametrize('action', ['yml2pad', 'metadata'])
+def testRunRequestDirectoryRejected(tmp_path, action):
+    response = runRequest(action, str(tmp_path), str(tmp_path / 'out.pad'))
+    assert not response['ok'] and 'directory' in response['error']
+
+
+def runClient(*arguments):
+    # Converts locally, no server listens on the socket
+    return subprocess.run([sys.executable, os.path.join(repoDir, 'styleclient.py'), '-s', os.devnull + '.sock', *arguments],
+                          capture_output=True, text=True)
+
+
+def testClientArguments(tmpStyle, tmp_path):
+    yml = str(tmp_path / 'sample.yml')
+    directory = str(tmp_path / 'split')
+    output = str(tmp_path / 'out.sty')
+
+    for arguments in [(tmpStyle, yml), (tmpStyle, directory, '--split'), (directory, output)]:
+        result = runClient(*arguments)
+        assert result.returncode == 0, result.stdout + result.stderr
+
+    assert os.path.exists(yml)
+    assert RawStyle.fromSty(output)._style == RawStyle.fromSty(tmpStyle)._style
+
+
+def testClientExplicitAction(tmp_path):
+    pad = tmp_path / 'sample.pad'
+    pad.write_bytes(getSamplePadData())
+    result = runClient('pad2yml', str(pad), str(tmp_path / 'sample.yml'))
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert (tmp_path / 'sample.yml').exists()
+
+
+@pytest.mark.parametrize('arguments', [('a.txt', 'a.yml'), ('a.sty',), ('a.pad', 'a.yml', '--split'), ('sty2yml', 'a.sty')])
+def testClientArgumentErrors(arguments):
+    result = runClient(*arguments)
+    assert result.returncode == 2 and 'error' in result.stderr
@@ -0,0 +1,115 @@
+import os
+
+import pytest
+
+from style_codec import Style, RawStyle, yamlex
+from style_codec.splityaml import manifestName, partsName
+
+from conftest import getSampleStyleData
+
+
+@pytest.fixture
+def countParses(monkeypatch):
+    # Number of YAML files parsed, besides the manifest
+    calls = []
+    loadYaml = yamlex.loadYaml
+
+    def countingLoadYaml(f):
+        calls.append(f)
+        return loadYaml(f)
+
+    monkeypatch.setattr(yamlex, 'loadYaml', countingLoadYaml)
+    return lambda: len(calls) - sum(1 for f in calls if getattr(f, 'name', '').endswith(manifestName))
+
+
+def getFiles(directory):
+    return sorted(os.path.relpath(os.path.join(root, fn), directory) for root, _, fns in os.walk(directory) for fn in fns if fn.endswith('.yml'))
+
+
+def getChannelFile(directory, trackSection, channelId):
+    for fn in getFiles(directory):
+        if fn.endswith(trackSection.lower().replace(' ', '-') + os.sep + channelId + '.yml'):
+            return os.path.join(directory, fn)
+
+
+@pytest.fixture
+def splitDir(tmpStyle, tmp_path):
+    directory = str(tmp_path / 'split')
+    written, skipped = Style.fromSty(tmpStyle).saveAsYmlDir(directory)
+    assert skipped == 0 and written == len(getFiles(directory)) - 1
+    return directory
+
+
+@pytest.mark.parametrize('cls', [Style, RawStyle])
+def testRoundTrip(cls, splitDir, tmpStyle, tmp_path, countParses):
+    out = str(tmp_path / 'out.sty')
+    cls.fromYmlDir(splitDir).saveAsSty(out)
+
+    assert open(out, 'rb').read() == open(tmpStyle, 'rb').read()
+    assert countParses() == 0
+
+
+def testResaveUnchanged(splitDir):
+    noOfFiles = len(getFiles(splitDir)) - 1
+    assert Style.fromYmlDir(splitDir).saveAsYmlDir(splitDir) == (0, noOfFiles)
+    assert RawStyle.fromYmlDir(splitDir).saveAsYmlDir(splitDir) == (0, noOfFiles)
+
+
+def testEditOneChannel(splitDir, countParses):
+    noOfFiles = len(getFiles(splitDir)) - 1
+    fn = getChannelFile(splitDir, 'Main A', 'channel3')
+    before = open(fn, 'rb').read()
+
+    style = Style.fromYmlDir(splitDir)
+    style.trackSections['Main A']['channels']['channel3'][0]['velocity'] = 1
+    assert style.saveAsYmlDir(splitDir) == (1, noOfFiles - 1)
+    assert open(fn, 'rb').read() != before
+
+    # The rewritten file is read from parts.bin as well
+    assert Style.fromYmlDir(splitDir).trackSections['Main A']['channels']['channel3'][0]['velocity'] == 1
+    assert countParses() == 0
+
+
+def testHandEditedFile(splitDir, countParses):
+    fn = getChannelFile(splitDir, 'Main B', 'channel5')
+    with open(fn, 'r') as f:
+        content = f.read()
+    velocity = Style.fromYmlDir(splitDir).trackSections['Main B']['channels']['channel5'][0]['velocity']
+    with open(fn, 'w') as f:
+        f.write(content.replace(f'velocity: {velocity}', 'velocity: 2', 1))
+
+    style = Style.fromYmlDir(splitDir)
+    assert style.trackSections['Main B']['channels']['channel5'][0]['velocity'] == 2
+    assert countParses() == 1
+
+
+def testCorruptParts(splitDir, tmpStyle, tmp_path, countParses):
+    noOfFiles = len(getFiles(splitDir)) - 1
+    fn = os.path.join(splitDir, partsName)
+    data = bytearray(open(fn, 'rb').read())
+    data[len(data) // 2] ^= 0xff
+    open(fn, 'wb').write(data)
+
+    out = str(tmp_path / 'out.sty')
+    Style.fromYmlDir(splitDir).saveAsSty(out)
+    assert open(out, 'rb').read() == open(tmpStyle, 'rb').read()
+    assert 0 < countParses() < noOfFiles
+
+    os.remove(fn)
+    Style.fromYmlDir(splitDir).saveAsSty(out)
+    assert open(out, 'rb').read() == open(tmpStyle, 'rb').read()
+
+
+def testStaleFilesRemoved(splitDir):
+    style = Style.fromYmlDir(splitDir)
+    files = getFiles(splitDir)
+    mainC = [fn for fn in files if 'main-c' in fn]
+    assert mainC
+
+    style.deleteTrackSections(['Main C'])
+    # Deleting the track section changes the CASM and the numbering of the Epilogue directory
+    written, skipped = style.saveAsYmlDir(splitDir)
+    assert written + skipped == len(files) - 1 - len(mainC)
+    assert len(getFiles(splitDir)) == len(files) - len(mainC)
+    assert not [fn for fn in getFiles(splitDir) if 'main-c' in fn]
+    assert 'Main C' not in Style.fromYmlDir(splitDir).trackSections
@@ -0,0 +1,83 @@
+import io
+
+import pytest
+
+from style_codec import Style, allTrackSections
+from style_codec.codecs import multiPadCodec, TrackSplitAdapter
+from style_codec.midi import decodeEvents, encodeTrack, MidiEncodeError
+from style_codec.stream import iterEvents, iterSectionEvents, TrackWriter, writeTrack
+
+from conftest import getSamplePadData
+
+
+def getPadTrack(seed=0):
+    # Events with delta times of a track of a sample pad
+    return [dict(event) for event in multiPadCodec.parse(getSamplePadData(seed))['tracks'][1]]
+
+
+def toAbsolute(events):
+    time = 0
+    for event in events:
+        time += event['time']
+        yield dict(event, time=time)
+
+
+@pytest.mark.parametrize('name', allTrackSections)
+def testSectionEvents(tmpStyle, name):
+    style = Style.fromSty(tmpStyle, cached=False)
+    if name not in style.trackSections:
+        with pytest.raises(KeyError):
+            next(iterSectionEvents(tmpStyle, name))
+        return
+
+    channels = {}
+    for event in iterSectionEvents(tmpStyle, name):
+        event = dict(event)
+        channelId = TrackSplitAdapter.getChannelId(event.pop('channel')) if 'channel' in event else TrackSplitAdapter.getChannelId()
+        channels.setdefault(channelId, []).append(event)
+
+    assert channels == style.trackSections[name]['channels']
+
+
+@pytest.mark.parametrize('runningStatus', [False, True])
+@pytest.mark.parametrize('seed', range(3))
+def testTrackWriter(seed, runningStatus):
+    events = getPadTrack(seed)
+    assert events[-1]['command'] == 'meta-eot'
+
+    f = io.BytesIO()
+    with TrackWriter(f, runningStatus=runningStatus) as writer:
+        writer.writeAll(toAbsolute(events))
+    assert f.getvalue() == encodeTrack(events, runningStatus)
+
+    # meta-eot is appended when missing
+    f = io.BytesIO()
+    with TrackWriter(f, runningStatus=runningStatus) as writer:
+        writer.writeAll(toAbsolute(events[:-1]))
+    assert f.getvalue() == encodeTrack(events[:-1] + [{'time': 0, 'command': 'meta-eot'}], runningStatus)
+
+
+def testWriteTrack(tmp_path):
+    fn = str(tmp_path / 'track.mid')
+    events = getPadTrack()
+    writeTrack(fn, list(toAbsolute(events)))
+
+    with open(fn, 'rb') as f:
+        data = f.read()
+    assert data[:8] == b'MThd' + (6).to_bytes(4, 'big')
+    assert data[14:] == encodeTrack(events)
+    assert [dict(event) for event in iterEvents(fn)] == list(toAbsolute(decodeEvents(encodeTrack(events)[8:])))
+
+
+def testUnorderedEvents():
+    writer = TrackWriter(io.BytesIO())
+    writer.write({'time': 10, 'command': 'meta-eot'})
+    with pytest.raises(MidiEncodeError):
+        writer.write({'time': 5, 'command': 'meta-eot'})
+
+
+def testNotMidi(tmp_path):
+    fn = tmp_path / 'text.mid'
+    fn.write_bytes(b'not a midi file')
+    with pytest.raises(ValueError):
+        list(iterEvents(str(fn)))
@@ -0,0 +1,26 @@
+import warnings
+
+import pytest
+
+from style_codec.codecs import TrackSplitAdapter, midiTrackCodec
+
+
+def getTrackSection(times):
+    return {'name': 'Main A', 'length': 1920, 'channels': {
+        'channel0': [{'time': time, 'command': 'on', 'note': 60, 'velocity': 100} for time in times]
+    }}
+
+
+def testUnsortedEventsWarning(capsys):
+    with pytest.warns(UserWarning, match='channel "channel0" in track section "Main A" are not ordered by time'):
+        events = TrackSplitAdapter(midiTrackCodec)._encode([getTrackSection([0, 240, 120])], None)
+
+    # Reordered, and nothing is printed to stdout, which may be the output of a tool
+    assert [event['time'] for event in events] == [0, 120, 120]
+    assert capsys.readouterr().out == ''
+
+
+def testSortedEventsNoWarning():
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        TrackSplitAdapter(midiTrackCodec)._encode([getTrackSection([0, 120, 120, 240])], None)
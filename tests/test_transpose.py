@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+from style_codec import clone, Style
+from style_codec.columns import EventColumns
+from style_codec.transpose import Transposition, transpositions, transposeEventsReference, foldNote
+
+from conftest import getSampleStyle
+
+
+def getRandomEvents(rnd, noOfEvents=200):
+    # Notes over the whole MIDI range between other channel events and sysex/meta events
+    events = []
+    for time in sorted(rnd.randint(0, 7680) for _ in range(noOfEvents)):
+        kind = rnd.randint(0, 9)
+        if kind < 4:
+            events.append({'time': time, 'command': 'on', 'note': rnd.choice([rnd.randint(0, 127), 0, 1, 126, 127]), 'velocity': rnd.randint(1, 127)})
+        elif kind < 7:
+            events.append({'time': time, 'command': 'off', 'note': rnd.randint(0, 127), 'velocity': 0})
+        elif kind == 7:
+            events.append({'time': time, 'command': 'pitch', 'value': rnd.randint(0, 16383)})
+        elif kind == 8:
+            events.append({'time': time, 'command': 'cc', 'controller': rnd.randint(0, 127), 'value': rnd.randint(0, 127)})
+        else:
+            events.append({'time': time, 'command': 'sysex', 'data': [rnd.randint(0, 127) for _ in range(rnd.randint(1, 8))]})
+    return events
+
+
+def getRandomTable(rnd):
+    # Some pitch classes dropped, the others moved by up to two semitones
+    return [None if rnd.random() < 0.3 else rnd.randint(-2, 2) for _ in range(12)]
+
+
+def transposeAll(events, table, transBase):
+    transposition = Transposition(table, transBase)
+    reference = transposeEventsReference(clone(events), table, transBase)
+    batched = transposition.transposeEvents(clone(events))
+    columns = transposition.transposeColumns(EventColumns.fromEvents(events))
+    return reference, batched, [dict(event) for event in columns.toEvents()]
+
+
+def testRandomized():
+    rnd = random.Random(0)
+
+    for _ in range(300):
+        events = getRandomEvents(rnd)
+        table = rnd.choice([getRandomTable(rnd)] + [list(table) for rule in transpositions.values() for table in rule.values()])
+        # Includes bases moving notes beyond both ends of the MIDI range
+        transBase = rnd.choice([rnd.randint(-11, 11), -40, 40])
+
+        reference, batched, columns = transposeAll(events, table, transBase)
+        assert batched == reference
+        assert columns == reference
+        assert all(0 <= event['note'] <= 127 for event in reference if event['command'] in ('on', 'off'))
+
+
+def testDroppedPitchClasses():
+    events = [{'time': time, 'command': 'on', 'note': 60 + time, 'velocity': 100} for time in range(12)]
+    table = [0, None] * 6
+
+    for result in transposeAll(events, table, 2):
+        assert [event['note'] for event in result] == [62 + time for time in range(0, 12, 2)]
+
+
+@pytest.mark.parametrize('note, transBase, expected', [(127, 5, 120), (120, 12, 120), (2, -5, 9), (0, -24, 0), (127, 0, 127)])
+def testOutOfRange(note, transBase, expected):
+    events = [{'time': 0, 'command': 'on', 'note': note, 'velocity': 100}, {'time': 1, 'command': 'off', 'note': note, 'velocity': 0}]
+
+    for result in transposeAll(events, [0] * 12, transBase):
+        assert [event['note'] for event in result] == [expected, expected]
+
+
+def testFoldNote():
+    for note in range(-300, 400):
+        folded = foldNote(note)
+        assert 0 <= folded <= 127 and (folded - note) % 12 == 0
+        assert folded == note or not 0 <= folded + (12 if note > 127 else -12) <= 127
+
+
+@pytest.mark.parametrize('key, chord', [('e', 'min'), ('g#', 'Maj'), ('c', 'Maj7')])
+def testCompactPlayback(key, chord):
+    # The columnar and the list representation of a style transpose alike
+    style = getSampleStyle()
+    compactStyle = Style(style=clone(style._style), compact=True)
+    assert compactStyle.getPlaybackEvents(['Main A', 'Main B'], key=key, chord=chord) == style.getPlaybackEvents(['Main A', 'Main B'], key=key, chord=chord)
@@ -0,0 +1,85 @@
+import io
+from itertools import repeat
+
+import pytest
+
+from style_codec.codecs import variableLengthCodec
+from style_codec.midi import encodeVariableLength, decodeVariableLength, MidiEncodeError
+
+from conftest import vlq
+
+maxValue = (1 << 28) - 1
+
+# The first and last values of each encoded length
+boundaries = [0, 0x7f, 0x80, 0x3fff, 0x4000, 0x1fffff, 0x200000, maxValue]
+
+
+def encodedLength(value):
+    return 1 if value < 0x80 else 2 if value < 0x4000 else 3 if value < 0x200000 else 4
+
+
+def assertRoundTrip(values):
+    # The values encoded into one buffer and decoded back to back, so that the returned offsets are checked as well
+    out = bytearray()
+    for _ in map(encodeVariableLength, repeat(out), values):
+        pass
+
+    assert len(out) == sum(map(encodedLength, values))
+
+    decoded = []
+    append = decoded.append
+    pos = 0
+    for _ in values:
+        value, pos = decodeVariableLength(out, pos)
+        append(value)
+
+    assert pos == len(out)
+    assert decoded == list(values), f'values starting at {values[0]}'
+
+
+@pytest.mark.slow
+def testRoundTripFullRange():
+    # All 2**28 values in blocks (about 3 minutes)
+    blockSize = 1 << 20
+    for blockStart in range(0, maxValue + 1, blockSize):
+        assertRoundTrip(range(blockStart, blockStart + blockSize))
+
+
+def testRoundTripAroundBoundaries():
+    for boundary in boundaries:
+        assertRoundTrip(range(max(0, boundary - 4096), min(maxValue + 1, boundary + 4096)))
+
+
+def testRoundTripStrided():
+    assertRoundTrip(list(range(0, maxValue + 1, 997)))
+
+
+@pytest.mark.parametrize('value', boundaries)
+def testBoundaries(value):
+    out = bytearray(b'\xaa')
+    encodeVariableLength(out, value)
+
+    assert bytes(out[1:]) == bytes(vlq(value))
+    assert len(out) - 1 == encodedLength(value)
+    assert decodeVariableLength(out + b'\x55', 1) == (value, len(out))
+
+
+def testCodecMatchesPrimitives():
+    values = sorted(set(range(0, maxValue + 1, 9973)) | set(boundaries))
+
+    for value in values:
+        out = bytearray()
+        encodeVariableLength(out, value)
+
+        assert variableLengthCodec.build(value) == out == bytes(vlq(value))
+        stream = io.BytesIO(bytes(out) + b'\x00')
+        assert variableLengthCodec.parse_stream(stream) == value
+        assert stream.tell() == len(out)
+
+
+@pytest.mark.parametrize('value', [-1, -0x80, maxValue + 1, 1 << 32])
+def testOutOfRange(value):
+    with pytest.raises(MidiEncodeError):
+        encodeVariableLength(bytearray(), value)
+    with pytest.raises(MidiEncodeError):
+        variableLengthCodec.build(value)
@@ -0,0 +1,61 @@
+import importlib
+
+import pytest
+import yaml
+
+from style_codec import Style, MultiPad
+from style_codec import yamlex
+from style_codec.codecs import styleCodec, multiPadCodec
+
+from conftest import getSampleStyleData, getSamplePadData
+
+
+@pytest.fixture(scope='module')
+def samples():
+    # Parsed styles and pads (Containers), a compact style (EventColumns) and an exploded style (dicts)
+    samples = [styleCodec.parse(getSampleStyleData(seed)) for seed in range(3)]
+    samples.append(multiPadCodec.parse(getSamplePadData()))
+
+    compact = Style(style=styleCodec.parse(getSampleStyleData(3)), compact=True)
+    compact._implodeAll()
+    samples.append(compact._style)
+
+    pad = MultiPad(multiPadCodec.parse(getSamplePadData(1)))
+    samples.append(pad._data)
+    return samples
+
+
+@pytest.mark.skipif(not hasattr(yaml, 'CSafeDumper'), reason='libyaml is not available')
+def testDumpersIdentical(samples):
+    for data in samples:
+        text = yamlex.dumpYaml(data, yaml.SafeDumper)
+
+        assert yamlex.dumpYaml(data, yaml.CSafeDumper) == text
+        assert yamlex.loadYaml(text, yaml.CSafeLoader) == yamlex.loadYaml(text, yaml.SafeLoader)
+
+
+@pytest.fixture
+def withoutLibyaml(monkeypatch):
+    monkeypatch.delattr(yaml, 'CSafeDumper', raising=False)
+    monkeypatch.delattr(yaml, 'CSafeLoader', raising=False)
+    yield importlib.reload(yamlex)
+    monkeypatch.undo()
+    importlib.reload(yamlex)
+
+
+def testFallback(samples, withoutLibyaml):
+    assert withoutLibyaml.Dumper is yaml.SafeDumper
+    assert withoutLibyaml.Loader is yaml.SafeLoader
+
+    for data in samples:
+        text = withoutLibyaml.dumpYaml(data)
+        assert text == withoutLibyaml.dumpYaml(data, yaml.SafeDumper)
+        assert withoutLibyaml.dumpYaml(withoutLibyaml.loadYaml(text)) == text
+
+
+def testStyleYamlRoundTrip(tmp_path):
+    fn = str(tmp_path / 'sample.yml')
+    style = Style(style=styleCodec.parse(getSampleStyleData()))
+    style.saveAsYml(fn)
+
+    assert styleCodec.build(Style.fromYml(fn)._style) == styleCodec.build(style._style)
@@ -2,12 +2,18 @@
 
 from style_codec import *
 import argparse
+import os
 
 parser = argparse.ArgumentParser(description='YML -> STY Converter')
-parser.add_argument('input', type=str, help='input yaml')
+parser.add_argument('input', type=str, help='input yaml or directory written by sty2yml --split')
 parser.add_argument('output', type=str, help='output style')
+parser.add_argument('--cache', action='store_true', help='keeps parsed YAML files of split directories in the parse cache (~/.cache/style_codec), so converting them again skips parsing')
+parser.add_argument('--profile', type=str, default=None, help='records stage timings and counters to the file')
+parser.add_argument('--profile-format', type=str, choices=profileFormats, default='json', help='format of the profile: json or cprofile (pstats dump)')
 
 args = parser.parse_args()
+parseCache.enabled = args.cache
 
-style = RawStyle.fromYml(args.input)
-style.saveAsSty(args.output)
+with profileTo(args.profile, args.profile_format):
+    style = RawStyle.fromYmlDir(args.input) if os.path.isdir(args.input) else RawStyle.fromYml(args.input)
+    style.saveAsSty(args.output)